@@ -0,0 +1,145 @@
+import os
+import queue
+import threading
+import time
+import logging
+from concurrent.futures import Future
+
+# --- 요청 간 동적 마이크로 배칭 스케줄러 ---
+# 여러 요청(스레드)이 동시에 넣은 입력을 잠깐(max_wait_ms) 모았다가
+# 한 번의 배치 추론으로 처리하고, 결과를 각 호출자에게 돌려줍니다.
+
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_MAX_SIZE", "8"))
+DEFAULT_MAX_WAIT_MS = float(os.getenv("INFERENCE_BATCH_MAX_WAIT_MS", "5"))
+
+
+class MicroBatcher:
+    """
+    batch_fn(list_of_inputs) -> list_of_outputs 형태의 함수를 감싸는 배칭 스케줄러.
+
+    - max_batch_size: 한 번에 묶을 최대 입력 개수
+    - max_wait_ms: 첫 입력이 들어온 뒤 추가 입력을 기다리는 최대 시간(ms)
+
+    작업 스레드는 첫 submit 시점에 시작되므로, Celery prefork처럼 fork 이후에도 안전하게 사용할 수 있습니다.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS, name="batcher"):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size는 1 이상이어야 합니다.")
+        self.batch_fn = batch_fn
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._reset_stats()
+
+    # --- 호출자 API ---
+    def submit(self, item):
+        """ 입력 하나를 큐에 넣고, 결과를 받을 Future를 반환합니다. """
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future, time.monotonic()))
+        return future
+
+    def infer(self, item, timeout=None):
+        """ 입력 하나를 제출하고 배치 추론 결과가 나올 때까지 기다립니다. """
+        return self.submit(item).result(timeout=timeout)
+
+    def infer_many(self, items, timeout=None):
+        """ 한 요청 안의 여러 입력을 모두 제출한 뒤 결과를 순서대로 반환합니다. """
+        futures = [self.submit(item) for item in items]
+        return [f.result(timeout=timeout) for f in futures]
+
+    # --- 지표 ---
+    def _reset_stats(self):
+        self._batches = 0
+        self._items = 0
+        self._max_seen_batch = 0
+        self._batch_size_hist = {}
+        self._total_wait = 0.0
+        self._total_infer = 0.0
+        self._errors = 0
+
+    def stats(self):
+        """ 튜닝을 위한 큐 길이/배치 크기 지표를 반환합니다. """
+        with self._stats_lock:
+            return {
+                'name': self.name,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'avg_batch_size': (self._items / self._batches) if self._batches else 0.0,
+                'max_observed_batch_size': self._max_seen_batch,
+                'batch_size_histogram': dict(sorted(self._batch_size_hist.items())),
+                'avg_queue_wait_ms': (self._total_wait / self._items * 1000.0) if self._items else 0.0,
+                'avg_batch_infer_ms': (self._total_infer / self._batches * 1000.0) if self._batches else 0.0,
+                'errors': self._errors,
+            }
+
+    # --- 내부 구현 ---
+    def _ensure_worker(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == pid:
+                return
+            if self._pid is not None and self._pid != pid:
+                # fork된 자식 프로세스: 부모의 큐/스레드 상태는 사용할 수 없으므로 새로 만듦
+                self._queue = queue.Queue()
+                self._reset_stats()
+            self._pid = pid
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-worker", daemon=True)
+            self._thread.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # 대기 시간이 끝났더라도 이미 쌓여 있는 입력은 함께 처리
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            started = time.monotonic()
+            inputs = [item for item, _, _ in batch]
+            try:
+                outputs = self.batch_fn(inputs)
+                if len(outputs) != len(inputs):
+                    raise RuntimeError(f"배치 결과 개수({len(outputs)})가 입력 개수({len(inputs)})와 다릅니다.")
+            except Exception as e:
+                logging.error(f"[{self.name}] 배치 추론 중 오류: {e}", exc_info=True)
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                with self._stats_lock:
+                    self._errors += 1
+                continue
+
+            finished = time.monotonic()
+            for (_, future, _), output in zip(batch, outputs):
+                future.set_result(output)
+
+            with self._stats_lock:
+                size = len(batch)
+                self._batches += 1
+                self._items += size
+                self._max_seen_batch = max(self._max_seen_batch, size)
+                self._batch_size_hist[size] = self._batch_size_hist.get(size, 0) + 1
+                self._total_wait += sum(started - enqueued for _, _, enqueued in batch)
+                self._total_infer += finished - started
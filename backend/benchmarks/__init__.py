@@ -0,0 +1 @@
+# 오프라인 성능 측정 스크립트 모음 (backend/ 폴더에서 python -m benchmarks.<이름> 으로 실행)
@@ -0,0 +1,85 @@
+"""
+색상 분석 픽셀 샘플링 마이크로 벤치마크.
+기존 파이썬 리스트 컴프리헨션 방식과 NumPy 벡터화 방식(sample_pill_pixels)을 서버와 같은 입력
+(test_image/의 각 이미지를 알약 크롭으로 본 PillPyramid 작업 레벨 이미지 + 배경 분리 마스크)으로 비교합니다.
+선택된 픽셀이나 최종 색상 결과가 하나라도 다르거나 색상 분석이 실패하면 0이 아닌 코드로 종료합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.bench_color_sampling [--image-dir test_image] [--repeat 5]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from color_analysis import analyze_pill_colors, sample_pill_pixels
+from pill_pyramid import PillPyramid, STAGE_LEVELS
+
+# analyze_pill_colors가 예외를 삼키고 돌려주는 색상 이름 (이 값이 나오면 비교가 무의미하므로 실패로 처리)
+ANALYSIS_FAILED = "알 수 없음"
+
+
+def legacy_non_black_pixels(image_rgb, brightness_threshold=30):
+    """ 변경 전 analyze_pill_colors의 픽셀 필터 (배경을 검게 칠한 이미지 입력, 비교 기준) """
+    pixels = image_rgb.reshape(-1, 3)
+    return np.array([p for p in pixels if np.mean(p) > brightness_threshold])
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="색상 픽셀 샘플링 벤치마크")
+    parser.add_argument('--image-dir', default="test_image")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    level = STAGE_LEVELS['color']
+    checked = mismatches = 0
+    print(f"{'image':<20} {'pixels':>9} {'legacy(ms)':>11} {'vector(ms)':>11} {'speedup':>8}  same  colors(full / budget)")
+    for image_path in sorted(glob.glob(os.path.join(args.image_dir, "*"))):
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        pyramid = PillPyramid(image)
+        work_image, mask = pyramid.image(level), pyramid.mask(level)
+        work_rgb = cv2.cvtColor(work_image, cv2.COLOR_BGR2RGB)
+        legacy_rgb = cv2.cvtColor(pyramid.without_background(level), cv2.COLOR_BGR2RGB)
+
+        legacy_time, legacy_pixels = _best_of(lambda: legacy_non_black_pixels(legacy_rgb), 1)
+        vector_time, vector_pixels = _best_of(lambda: sample_pill_pixels(work_rgb, mask, max_pixels=None), args.repeat)
+        same_pixels = np.array_equal(legacy_pixels.reshape(-1, 3), vector_pixels)
+
+        # 샘플 예산을 적용해도 최종 색상 결과가 같은지 확인
+        full_colors = analyze_pill_colors(work_image, mask=mask, max_pixels=None)
+        budget_colors = analyze_pill_colors(work_image, mask=mask)
+        same_colors = (full_colors == budget_colors
+                       and ANALYSIS_FAILED not in full_colors[1] and ANALYSIS_FAILED not in budget_colors[1])
+
+        checked += 1
+        if not (same_pixels and same_colors):
+            mismatches += 1
+        print(f"{os.path.basename(image_path):<20} {work_rgb.shape[0] * work_rgb.shape[1]:>9} "
+              f"{legacy_time * 1000:>11.1f} {vector_time * 1000:>11.2f} {legacy_time / max(vector_time, 1e-9):>7.0f}x  "
+              f"{'yes' if same_pixels and same_colors else 'NO ':<4}  {full_colors[1]} / {budget_colors[1]}")
+
+    if not checked:
+        print(f"'{args.image_dir}'에 이미지가 없습니다.")
+        sys.exit(1)
+    print(f"\n작업 레벨 크롭 {checked}개: 결과 불일치 {mismatches}개")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+DB 매칭 규모 확장성 벤치마크.
+합성 DB(benchmarks.synthetic_catalogue) 크기별로 인덱스 생성 시간/메모리와 매칭 방식별 질의 지연(p50/p99),
+정확 계산(exact) 대비 상위 10개 일치율을 측정하고 결과를 JSON으로 저장합니다. (네트워크 불필요)
+--baseline에 이전 결과 JSON을 주면 지연 변화를 함께 보고합니다.
+
+매칭 방식 (MATCHERS에 추가하면 함께 측정):
+  - linear: 행마다 calculate_score를 호출하는 기존 방식 (--linear-max-rows보다 큰 DB에서는 생략)
+  - exact: PillIndex, 각인 색인/정규 키 없이 전체 계산 (linear와 같은 결과, 일치율 기준)
+  - indexed: PillIndex 기본 설정 (각인 n-gram 색인 + 정규 키)
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.bench_matcher_scaling [--sizes 1000 10000 50000 200000] [--queries 200]
+        [--output cache/bench_matcher_scaling.json] [--baseline 이전결과.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.check_matcher_parity import make_queries
+from benchmarks.synthetic_catalogue import DEFAULT_OUTPUT_DIR, DEFAULT_SIZES, catalogue_path, read_source, write_catalogue
+from database_handler import build_database_index, find_best_match_linear, parse_shape_probabilities
+
+REFERENCE_MATCHER = 'exact'
+
+MATCHERS = {
+    'linear': lambda pill_db: (lambda query: find_best_match_linear(pill_db.records, *query)),
+    'exact': lambda pill_db: (lambda query: pill_db.match(parse_shape_probabilities(query[0]), *query[1:],
+                                                          candidate_limit=0, use_imprint_keys=False)),
+    'indexed': lambda pill_db: (lambda query: pill_db.match(parse_shape_probabilities(query[0]), *query[1:])),
+}
+
+
+def _build_index(db_path):
+    """ CSV로 인덱스를 만들며 생성 시간과 메모리(tracemalloc: 유지되는 크기, 최대 사용량)를 잽니다. """
+    tracemalloc.start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        pill_db = build_database_index(db_path)
+        pill_db.records  # 행 dict 리스트도 미리 만들어 측정에 포함 (linear 방식과 후보 표시에 사용)
+    build_seconds = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pill_db, {'build_seconds': build_seconds, 'retained_mb': retained / 2 ** 20, 'peak_mb': peak / 2 ** 20}
+
+
+def _run_matcher(match_fn, queries):
+    latencies, results = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for query in queries:
+            start = time.perf_counter()
+            candidates = match_fn(query)
+            latencies.append(time.perf_counter() - start)
+            results.append([c['pill_info'] for c in candidates])
+    latencies = np.array(latencies) * 1000
+    return results, {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'mean_ms': float(latencies.mean()),
+    }
+
+
+def _agreement(results, reference):
+    """ 기준 결과 대비 상위 10개 일치율(재현율)과 1순위 일치율 """
+    pairs = [(a, e) for a, e in zip(results, reference) if e]
+    if not pairs:
+        return {'top10_agreement': 1.0, 'top1_agreement': 1.0}
+    return {
+        'top10_agreement': float(np.mean([len(set(a) & set(e)) / len(e) for a, e in pairs])),
+        'top1_agreement': float(np.mean([a[:1] == e[:1] for a, e in pairs])),
+    }
+
+
+def run_size(db_path, n_rows, matcher_names, n_queries, linear_max_rows, seed):
+    pill_db, build = _build_index(db_path)
+    queries = make_queries(pill_db, n_queries, seed=seed)
+    report = {'rows': n_rows, 'queries': len(queries), 'index': build, 'matchers': {}}
+
+    outputs = {}
+    for name in matcher_names:
+        if name == 'linear' and n_rows > linear_max_rows:
+            continue
+        outputs[name], report['matchers'][name] = _run_matcher(MATCHERS[name](pill_db), queries)
+
+    reference = outputs.get(REFERENCE_MATCHER)
+    if reference is not None:
+        for name, results in outputs.items():
+            report['matchers'][name].update(_agreement(results, reference))
+    return report
+
+
+def _print_report(report, baseline_sizes):
+    index = report['index']
+    print(f"\n[{report['rows']}행] 인덱스 생성 {index['build_seconds']:.2f}s, "
+          f"메모리 {index['retained_mb']:.1f}MB (최대 {index['peak_mb']:.1f}MB), 질의 {report['queries']}개")
+    print(f"  {'matcher':<8} {'p50(ms)':>8} {'p99(ms)':>8} {'top10':>6} {'top1':>6} {'p50 vs base':>12}")
+    baseline = baseline_sizes.get(report['rows'], {}).get('matchers', {})
+    for name, m in report['matchers'].items():
+        change = ""
+        if name in baseline:
+            change = f"{m['p50_ms'] / max(baseline[name]['p50_ms'], 1e-9):.2f}x"
+        print(f"  {name:<8} {m['p50_ms']:>8.2f} {m['p99_ms']:>8.2f} {m.get('top10_agreement', float('nan')):>6.3f} "
+              f"{m.get('top1_agreement', float('nan')):>6.3f} {change:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DB 매칭 규모 확장성 벤치마크")
+    parser.add_argument('--db', default="database/pill.csv", help="합성 DB의 원본 분포로 사용할 실제 DB")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--matchers', nargs='+', default=list(MATCHERS), choices=list(MATCHERS))
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--linear-max-rows', type=int, default=10000, help="이보다 큰 DB에서는 linear 방식 생략")
+    parser.add_argument('--data-dir', default=DEFAULT_OUTPUT_DIR, help="합성 DB 저장 위치 (없으면 생성)")
+    parser.add_argument('--output', default=os.path.join(os.path.dirname(DEFAULT_OUTPUT_DIR), "bench_matcher_scaling.json"))
+    parser.add_argument('--baseline', default=None, help="비교할 이전 결과 JSON")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    baseline_sizes = {}
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline_sizes = {r['rows']: r for r in json.load(f)['results']}
+
+    source_df = None
+    results = []
+    for n_rows in args.sizes:
+        db_path = catalogue_path(n_rows, args.data_dir)
+        if not os.path.exists(db_path):
+            if source_df is None:
+                source_df = read_source(args.db)
+            write_catalogue(args.db, n_rows, args.data_dir, args.seed, source_df)
+        report = run_size(db_path, n_rows, args.matchers, args.queries, args.linear_max_rows, args.seed)
+        _print_report(report, baseline_sizes)
+        results.append(report)
+
+    output = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"\n결과를 저장했습니다: {args.output}")
+
+
+if __name__ == '__main__':
+    main()
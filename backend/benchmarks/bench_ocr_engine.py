@@ -0,0 +1,75 @@
+"""
+각인 OCR 엔진 벤치마크: tesseract CLI(pytesseract)와 상주 엔진 풀(tesserocr)의 호출당 지연과 결과 일치를 비교합니다.
+test_image/의 각 이미지를 알약 크롭으로 보고, get_imprint와 같은 두 가지 전처리(어두운/밝은 각인) 결과를 인식합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.bench_ocr_engine [--image-dir test_image] [--repeat 3] [--engines cli tesserocr]
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from image_preprocessing import preprocess_imprint_variants
+from imprint_analysis import _clean_ocr_text
+from ocr_engine import OCR_ENGINES, OcrEnginePool
+from pill_pyramid import PillPyramid, STAGE_LEVELS
+
+
+def _variants(image_dir):
+    """ 이미지별 (이름, [어두운 각인용 전처리, 밝은 각인용 전처리]) """
+    variants = []
+    for image_path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        mask = PillPyramid(image).mask(STAGE_LEVELS['ocr'])
+        variants.append((os.path.basename(image_path), list(preprocess_imprint_variants(image, mask))))
+    return variants
+
+
+def main():
+    parser = argparse.ArgumentParser(description="각인 OCR 엔진 벤치마크")
+    parser.add_argument('--image-dir', default="test_image")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engines', nargs='+', default=list(OCR_ENGINES), choices=list(OCR_ENGINES))
+    args = parser.parse_args()
+
+    variants = _variants(args.image_dir)
+    outputs = {}
+    for name in args.engines:
+        start = time.perf_counter()
+        try:
+            pool = OcrEnginePool(OCR_ENGINES[name], size=1)
+            pool.recognize([variants[0][1][0]] if variants else [np.full((32, 32), 255, dtype=np.uint8)])
+        except Exception as e:
+            print(f"{name}: 사용할 수 없습니다 ({e})")
+            continue
+        init_ms = (time.perf_counter() - start) * 1000
+
+        texts = []
+        for _ in range(args.repeat):
+            texts = [[_clean_ocr_text(t) for t in pool.recognize(images)] for _, images in variants]
+        stats = pool.stats()
+        outputs[name] = texts
+        print(f"{name:<10} 첫 호출(초기화 포함) {init_ms:8.1f}ms, 호출당 p50 {stats['p50_call_ms']:7.1f}ms, "
+              f"p99 {stats['p99_call_ms']:7.1f}ms ({stats['calls']}회)")
+        pool.close()
+
+    if len(outputs) > 1:
+        reference_name, reference = next(iter(outputs.items()))
+        for name, texts in outputs.items():
+            if name == reference_name:
+                continue
+            same = sum(a == b for a, b in zip(texts, reference))
+            print(f"{name} 결과가 {reference_name}와 같은 이미지: {same}/{len(reference)}")
+            for (image_name, _), a, b in zip(variants, texts, reference):
+                if a != b:
+                    print(f"  {image_name}: {name}={a} {reference_name}={b}")
+
+
+if __name__ == '__main__':
+    main()
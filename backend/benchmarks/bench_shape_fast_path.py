@@ -0,0 +1,83 @@
+"""
+모양 분류 기하 규칙(shape_geometry) 적중률/일치율 벤치마크.
+서버와 같은 입력을 쓰도록 test_image/의 각 이미지에서 탐지 모델로 알약 박스를 찾고, 원본 해상도에서 잘라낸
+크롭마다 PillPyramid로 모양 마스크와 외곽선 특징을 만듭니다. 규칙으로 판정된 알약에 대해 CNN(채움 비율 보정 포함)의
+1순위 모양과 일치하는지, 규칙 판정과 CNN 추론에 각각 얼마나 걸리는지 비교합니다.
+SHAPE_FAST_PATH(기본값 꺼짐)를 켜기 전에 이 일치율을 확인하세요.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.bench_shape_fast_path [--image-dir test_image] [--backend native]
+"""
+import argparse
+import glob
+import os
+import time
+
+from detection_input import load_working_image
+from inference_backends import resolve_model_paths
+from model_registry import get_detection_model, get_shape_model
+from object_detection import detect_pills_on_working_image
+from pill_pyramid import PillPyramid
+from shape_analysis import classify_shapes_batch
+from shape_geometry import classify_shape_by_geometry, correct_with_fill_ratio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="모양 분류 기하 규칙 벤치마크")
+    parser.add_argument('--image-dir', default="test_image")
+    parser.add_argument('--backend', default=None, help="탐지/모양 모델 백엔드 (기본값: INFERENCE_BACKEND)")
+    args = parser.parse_args()
+
+    detection_model_path, shape_model_path = resolve_model_paths(args.backend)
+    detection_model = get_detection_model(detection_model_path)
+    shape_model = get_shape_model(shape_model_path)
+
+    rows = []
+    for image_path in sorted(glob.glob(os.path.join(args.image_dir, "*"))):
+        working_image = load_working_image(image_path)
+        if working_image is None:
+            continue
+        boxes = detect_pills_on_working_image(working_image, detection_model_path, model=detection_model)
+        for i, (x1, y1, x2, y2) in enumerate(boxes):
+            cropped_pill = working_image.full[y1:y2, x1:x2]
+            if cropped_pill.size == 0:
+                continue
+            pyramid = PillPyramid(cropped_pill.copy())
+            shape_mask, _ = pyramid.shape_mask()
+
+            start = time.perf_counter()
+            geometry = pyramid.geometry()
+            fast_result = classify_shape_by_geometry(geometry)
+            geometry_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            model_result = classify_shapes_batch([shape_mask], shape_model)[0]
+            model_time = time.perf_counter() - start
+            model_result = correct_with_fill_ratio(model_result, geometry.fill_ratio)
+
+            model_top = model_result[0][0] if isinstance(model_result, list) else model_result
+            fast_top = fast_result[0][0] if fast_result else None
+            name = f"{os.path.basename(image_path)}#{i + 1}"
+            rows.append((name, geometry, fast_top, model_top, geometry_time, model_time))
+
+    print(f"{'crop':<24} {'fill':>5} {'aspect':>6} {'resid':>6} {'circ':>5}  {'rule':<6} {'cnn':<6} "
+          f"{'rule(ms)':>8} {'cnn(ms)':>8}")
+    for name, g, fast_top, model_top, geometry_time, model_time in rows:
+        features = (f"{g.fill_ratio:>5.2f} {g.aspect_ratio:>6.2f} {g.ellipse_residual:>6.3f} {g.circularity:>5.2f}"
+                    if g.is_valid else f"{'-':>5} {'-':>6} {'-':>6} {'-':>5}")
+        mark = '*' if fast_top and fast_top != model_top else ' '
+        print(f"{name:<24} {features}  {fast_top or '-':<6} {model_top:<6} "
+              f"{geometry_time * 1000:>8.2f} {model_time * 1000:>8.2f} {mark}")
+
+    hits = [r for r in rows if r[2] is not None]
+    if rows:
+        print(f"\n탐지 크롭 {len(rows)}개, 규칙 적중률: {len(hits)}/{len(rows)} ({len(hits) / len(rows):.0%})")
+    else:
+        print(f"'{args.image_dir}'에서 탐지된 알약이 없습니다.")
+    if hits:
+        agree = sum(r[2] == r[3] for r in hits)
+        print(f"적중한 알약의 CNN 1순위 일치율: {agree}/{len(hits)} ({agree / len(hits):.0%})")
+
+
+if __name__ == '__main__':
+    main()
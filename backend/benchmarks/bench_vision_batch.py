@@ -0,0 +1,67 @@
+"""
+Google Vision 배치 요청 벤치마크 (네트워크 불필요, benchmarks.vision_stub 대역 서버 사용).
+한 이미지의 알약 수별로 알약마다 요청을 순서대로 보내는 기존 방식과 batch_annotate_images 배치 방식의
+지연, 요청 수, 보낸 바이트, 정답 각인 일치율을 비교합니다. (캐시는 사용하지 않음)
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.bench_vision_batch [--pills 1 4 8 20 40] [--rtt-ms 80] [--per-image-ms 5]
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from benchmarks.vision_stub import VisionStubServer, synthetic_pill_crops
+from imprint_analysis_google import annotate_batch, create_vision_client, detect_texts_batch, _parse_response
+
+
+def per_crop(vision_client, images):
+    """ 기존 방식: 알약마다 요청 하나를 순서대로 """
+    results = []
+    for image in images:
+        results.append(detect_texts_batch([image], vision_client)[0])
+    return results
+
+
+def batched(vision_client, images):
+    return detect_texts_batch(images, vision_client)
+
+
+MODES = {'per_crop': per_crop, 'batched': batched}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Google Vision 배치 요청 벤치마크")
+    parser.add_argument('--pills', type=int, nargs='+', default=[1, 4, 8, 20, 40])
+    parser.add_argument('--rtt-ms', type=float, default=80.0)
+    parser.add_argument('--per-image-ms', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with VisionStubServer(rtt_ms=args.rtt_ms, per_image_ms=args.per_image_ms) as stub:
+        vision_client = create_vision_client(stub.url)
+        # 연결 준비 (첫 요청의 연결 비용은 제외)
+        with contextlib.redirect_stdout(io.StringIO()):
+            _parse_response(annotate_batch(vision_client, [b"warmup"])[0])
+
+        print(f"대역 서버 왕복 {args.rtt_ms:.0f}ms + 이미지당 {args.per_image_ms:.0f}ms")
+        print(f"{'pills':>5} {'mode':<9} {'latency(ms)':>11} {'requests':>8} {'bytes':>9} {'accuracy':>8}")
+        for n_pills in args.pills:
+            crops = synthetic_pill_crops(n_pills, seed=args.seed)
+            images = [image for image, _, _ in crops]
+            for name, run in MODES.items():
+                stub.reset_stats()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results = run(vision_client, images)
+                elapsed = (time.perf_counter() - start) * 1000
+                accuracy = sum(text == truth for (text, _), (_, _, truth) in zip(results, crops)) / n_pills
+                stats = stub.stats
+                print(f"{n_pills:>5} {name:<9} {elapsed:>11.1f} {stats['requests']:>8} {stats['bytes_received']:>9} "
+                      f"{accuracy:>8.2f}")
+                if stats['rejected']:
+                    print(f"      요청 {stats['rejected']}개가 이미지 수 제한으로 거부되었습니다.")
+
+
+if __name__ == '__main__':
+    main()
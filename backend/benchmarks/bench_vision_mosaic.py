@@ -0,0 +1,68 @@
+"""
+알약 크롭 모자이크 벤치마크 (네트워크 불필요, benchmarks.vision_stub 대역 서버 사용).
+알약마다 요청(per_crop), 배치 요청(batched), 모자이크 한 장(mosaic, 크롭 짧은 변 크기별)의
+지연, 요청 수, 과금 단위인 이미지 수, 보낸 바이트, 정답 각인 일치율을 비교합니다. (캐시는 사용하지 않음)
+대역 서버의 QR 읽기 시간은 실제 Vision 처리 시간과 무관하므로 이를 뺀 지연(net)도 함께 보고합니다.
+모자이크의 크롭 크기(--sides)를 줄여 가며 각인을 읽을 수 있는 최소 해상도(MOSAIC_CROP_SIDE)를 정할 때 사용합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.bench_vision_mosaic [--pills 4 8 20] [--sides 128 160 192 224 288] [--rtt-ms 80]
+"""
+import argparse
+import contextlib
+import io
+import time
+
+from benchmarks.bench_vision_batch import batched, per_crop
+from benchmarks.vision_stub import VisionStubServer, synthetic_pill_crops
+from imprint_analysis_google import annotate_batch, create_vision_client, detect_texts_mosaic
+
+
+def mosaic_mode(crop_side):
+    def run(vision_client, images, masks):
+        return detect_texts_mosaic(images, masks, vision_client, crop_side=crop_side)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description="알약 크롭 모자이크 벤치마크")
+    parser.add_argument('--pills', type=int, nargs='+', default=[4, 8, 20])
+    parser.add_argument('--sides', type=int, nargs='+', default=[128, 160, 192, 224, 288])
+    parser.add_argument('--rtt-ms', type=float, default=80.0)
+    parser.add_argument('--per-image-ms', type=float, default=5.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    modes = {
+        'per_crop': lambda client, images, masks: per_crop(client, images),
+        'batched': lambda client, images, masks: batched(client, images),
+    }
+    modes.update({f"mosaic{side}": mosaic_mode(side) for side in args.sides})
+
+    with VisionStubServer(rtt_ms=args.rtt_ms, per_image_ms=args.per_image_ms) as stub:
+        vision_client = create_vision_client(stub.url)
+        # 연결 준비 (첫 요청의 연결 비용은 제외)
+        annotate_batch(vision_client, [b"warmup"])
+
+        print(f"대역 서버 왕복 {args.rtt_ms:.0f}ms + 이미지당 {args.per_image_ms:.0f}ms")
+        print(f"{'pills':>5} {'mode':<10} {'latency(ms)':>11} {'net(ms)':>8} {'requests':>8} {'images':>6} {'bytes':>9} "
+              f"{'accuracy':>8}")
+        for n_pills in args.pills:
+            crops = synthetic_pill_crops(n_pills, seed=args.seed)
+            images = [image for image, _, _ in crops]
+            masks = [mask for _, mask, _ in crops]
+            for name, run in modes.items():
+                stub.reset_stats()
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results = run(vision_client, images, masks)
+                elapsed = (time.perf_counter() - start) * 1000
+                accuracy = sum(text == truth for (text, _), (_, _, truth) in zip(results, crops)) / n_pills
+                stats = stub.stats
+                net = elapsed - stats['recognize_seconds'] * 1000
+                print(f"{n_pills:>5} {name:<10} {elapsed:>11.1f} {net:>8.1f} {stats['requests']:>8} {stats['images']:>6} "
+                      f"{stats['bytes_received']:>9} {accuracy:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
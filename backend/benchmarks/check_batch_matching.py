@@ -0,0 +1,59 @@
+"""
+일괄 매칭(PillIndex.match_batch) 점검: 한 이미지의 알약 여러 개를 한 번에 매칭한 결과가
+알약마다 match를 호출한 결과와 같은지 확인하고, 이미지당 매칭 지연을 비교합니다.
+서로 다른 알약이 섞인 이미지(mixed)와 같은 알약 여러 개를 찍은 이미지(same)를 각각 측정합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.check_batch_matching [--db database/pill.csv] [--images 100] [--pills 1 2 4 8]
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+from benchmarks.check_matcher_parity import make_queries
+from database_handler import load_database, parse_shape_probabilities
+
+
+def _timed(fn, batches):
+    results = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for batch in batches:
+            results.extend(fn(batch))
+    return results, (time.perf_counter() - start) / max(len(batches), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="일괄 매칭 결과 동일성 점검")
+    parser.add_argument('--db', default="database/pill.csv")
+    parser.add_argument('--images', type=int, default=100)
+    parser.add_argument('--pills', type=int, nargs='+', default=[1, 2, 4, 8], help="이미지당 알약 수")
+    args = parser.parse_args()
+
+    pill_db = load_database(args.db)
+    if not pill_db:
+        sys.exit(1)
+
+    total_mismatches = 0
+    print(f"{'image':>6} {'pills':>5} {'single(ms)':>11} {'batch(ms)':>10} {'speedup':>8} {'mismatch':>9}")
+    for n_pills in args.pills:
+        queries = [(parse_shape_probabilities(s), c, i) for s, c, i in make_queries(pill_db, args.images * n_pills)]
+        scenarios = {
+            'mixed': [queries[i:i + n_pills] for i in range(0, len(queries), n_pills)],
+            'same': [[query] * n_pills for query in queries[:args.images]],
+        }
+        for scenario, batches in scenarios.items():
+            single, single_time = _timed(lambda batch: [pill_db.match(*query) for query in batch], batches)
+            batched, batch_time = _timed(pill_db.match_batch, batches)
+
+            mismatches = sum(a != b for a, b in zip(single, batched))
+            total_mismatches += mismatches
+            print(f"{scenario:>6} {n_pills:>5} {single_time * 1000:>11.2f} {batch_time * 1000:>10.2f} "
+                  f"{single_time / max(batch_time, 1e-9):>7.1f}x {mismatches:>9}")
+    sys.exit(1 if total_mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
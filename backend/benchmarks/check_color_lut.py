@@ -0,0 +1,58 @@
+"""
+색상 조회 테이블(color_lut) 정확도/속도 점검.
+무작위 RGB 값에 대해 기존 방식(rgb2lab + 기준 색상별 deltaE_cie76 반복)과 map_rgb_batch의 결과를 비교합니다.
+기본 8비트 테이블은 모든 RGB 값을 담으므로 하나라도 다르면 0이 아닌 코드로 종료합니다.
+COLOR_LUT_BITS를 낮춘 양자화 테이블은 경계 근처의 값이 다르게 분류될 수 있으므로 불일치율과 그때의 Delta E 차이만 보고합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.check_color_lut [--samples 20000]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+from skimage.color import rgb2lab, deltaE_cie76
+
+from color_analysis import COLOR_NAME_ALIASES, color_dict_rgb, color_lut, map_rgb_batch
+
+
+def exact_color_names(rgb_values):
+    """ 변경 전 map_rgb_to_color_name과 같은 계산 (비교 기준) """
+    palette_lab = {name: rgb2lab(np.uint8([[rgb]])) for name, rgb in color_dict_rgb.items()}
+    names, margins = [], []
+    for rgb in rgb_values:
+        input_lab = rgb2lab(np.uint8([[rgb]]))
+        distances = sorted((float(deltaE_cie76(input_lab, lab).item()), name) for name, lab in palette_lab.items())
+        names.append(COLOR_NAME_ALIASES.get(distances[0][1], distances[0][1]))
+        margins.append(distances[1][0] - distances[0][0])
+    return np.array(names, dtype=object), np.array(margins)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="색상 조회 테이블 점검")
+    parser.add_argument('--samples', type=int, default=20000)
+    args = parser.parse_args()
+
+    rgb_values = np.random.default_rng(0).integers(0, 256, size=(args.samples, 3), dtype=np.uint8)
+
+    map_rgb_batch(rgb_values[:1])  # 테이블 로드/생성은 측정에서 제외
+    start = time.perf_counter()
+    lut_names = map_rgb_batch(rgb_values)
+    lut_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact_names, margins = exact_color_names(rgb_values)
+    exact_time = time.perf_counter() - start
+
+    mismatch = lut_names != exact_names
+    print(f"샘플 {args.samples}개: 조회 테이블 {lut_time * 1000:.2f}ms, 기존 방식 {exact_time * 1000:.0f}ms "
+          f"({exact_time / max(lut_time, 1e-9):.0f}배)")
+    print(f"{color_lut.bits}비트 테이블 불일치율: {mismatch.mean():.3%}"
+          + (f" (불일치 값의 1·2위 Delta E 차이 최대 {margins[mismatch].max():.2f})" if mismatch.any() else ""))
+    if color_lut.bits == 8 and mismatch.any():
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
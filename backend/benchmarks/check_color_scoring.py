@@ -0,0 +1,57 @@
+"""
+색상 점수 동일성 점검: PillIndex.color_scores(유사도 행렬 + 배열 연산)와 기존 calculate_color_similarity_score를
+모든 DB 색상 문자열 × 인식 색상 조합(기준 색상 1~2개, 어휘에 없는 값, 빈 문자열)에 대해 비교합니다.
+값은 부동소수점까지 정확히 같아야 합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.check_color_scoring [--db database/pill.csv]
+"""
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from database_handler import COLOR_RGB_MAP, calculate_color_similarity_score, load_database
+
+
+def identified_color_queries():
+    names = list(COLOR_RGB_MAP)
+    queries = list(names)
+    queries += [" ".join(pair) for pair in itertools.combinations(names, 2)]
+    queries += ["알 수 없음", "색상 분석 불가", "하양 투명", ""]
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="색상 점수 동일성 점검")
+    parser.add_argument('--db', default="database/pill.csv")
+    args = parser.parse_args()
+
+    pill_db = load_database(args.db)
+    if not pill_db:
+        sys.exit(1)
+    queries = identified_color_queries()
+
+    start = time.perf_counter()
+    vectorized = [pill_db.color_scores(q) for q in queries]
+    vectorized_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    reference = [np.array([calculate_color_similarity_score(q, v) for v in pill_db.color_values], dtype=np.float64)
+                 for q in queries]
+    reference_time = time.perf_counter() - start
+
+    mismatches = [(q, v, a, b) for q, vec, ref in zip(queries, vectorized, reference)
+                  for v, a, b in zip(pill_db.color_values, vec, ref) if a != b]
+    print(f"인식 색상 {len(queries)}개 × DB 색상 문자열 {len(pill_db.color_values)}개 "
+          f"(어휘 {len(pill_db.color_vocab)}개): 행렬 {vectorized_time * 1000:.1f}ms, 기존 {reference_time * 1000:.1f}ms")
+    print(f"값 불일치: {len(mismatches)}개")
+    for q, v, a, b in mismatches[:5]:
+        print(f"  '{q}' vs '{v}': 행렬 {a!r}, 기존 {b!r}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+탐지 배치 추론 결과 일치 점검.
+test_image/의 작업 이미지들을 (1) 한 장씩 predict한 결과와 (2) 배칭 스케줄러가 쓰는 predict_same_shape_groups로
+한 번에 예측한 결과를 비교합니다. 크기가 다른 이미지와 같은 크기의 이미지(같은 이미지 반복)를 섞어
+요청 간 배치에서도 박스와 신뢰도가 단일 요청과 같은지 확인하고, 다르면 0이 아닌 코드로 종료합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.check_detection_batching [--image-dir test_image] [--backend native]
+"""
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+
+from detection_input import load_working_image
+from inference_backends import resolve_model_paths
+from model_registry import get_detection_model
+from object_detection import DETECTION_CONF, predict_same_shape_groups
+
+# 박스 좌표(픽셀)와 신뢰도의 허용 오차 (배치 크기에 따른 부동소수점 합산 순서 차이)
+BOX_TOLERANCE = 1.0
+CONF_TOLERANCE = 1e-3
+
+
+def _detections(result):
+    """ Results → 신뢰도 순 (박스 배열, 신뢰도 배열) """
+    boxes = result.boxes.xyxy.cpu().numpy() if len(result.boxes) else np.zeros((0, 4))
+    confidences = result.boxes.conf.cpu().numpy() if len(result.boxes) else np.zeros(0)
+    order = np.argsort(-confidences, kind='stable')
+    return boxes[order], confidences[order]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="탐지 배치 추론 결과 일치 점검")
+    parser.add_argument('--image-dir', default="test_image")
+    parser.add_argument('--backend', default=None, help="탐지 모델 백엔드 (기본값: INFERENCE_BACKEND)")
+    parser.add_argument('--batch-size', type=int, default=8)
+    args = parser.parse_args()
+
+    detection_model_path, _ = resolve_model_paths(args.backend)
+    model = get_detection_model(detection_model_path)
+
+    images = [load_working_image(path).working for path in sorted(glob.glob(os.path.join(args.image_dir, "*")))
+              if os.path.splitext(path)[1].lower() in ('.jpg', '.jpeg', '.png', '.bmp', '.webp')]
+    if not images:
+        print(f"'{args.image_dir}'에 이미지가 없습니다.")
+        sys.exit(1)
+    # 같은 크기 묶음도 생기도록 각 이미지를 두 번씩 넣고 섞음
+    inputs = [images[i] for i in np.random.default_rng(0).permutation(np.repeat(np.arange(len(images)), 2))]
+
+    single = [_detections(model.predict(source=image, save=False, conf=DETECTION_CONF, verbose=False)[0])
+              for image in inputs]
+    batched = []
+    for start in range(0, len(inputs), args.batch_size):
+        batched += [_detections(r) for r in predict_same_shape_groups(model, inputs[start:start + args.batch_size])]
+
+    mismatches = 0
+    for (boxes_a, conf_a), (boxes_b, conf_b) in zip(single, batched):
+        if (boxes_a.shape != boxes_b.shape or not np.allclose(boxes_a, boxes_b, atol=BOX_TOLERANCE)
+                or not np.allclose(conf_a, conf_b, atol=CONF_TOLERANCE)):
+            mismatches += 1
+    shapes = len({image.shape for image in inputs})
+    print(f"작업 이미지 {len(inputs)}개 (서로 다른 크기 {shapes}종), 배치 크기 {args.batch_size}: 결과 불일치 {mismatches}개")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
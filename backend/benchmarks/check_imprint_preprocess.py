@@ -0,0 +1,78 @@
+"""
+각인 전처리 동일성/속도 점검: preprocess_imprint_variants(한 번에 두 결과)가
+preprocess_for_dark_text / preprocess_for_bright_text를 각각 호출한 결과와 픽셀 단위로 같은지 확인하고 지연을 비교합니다.
+test_image/의 이미지(배경 분리 마스크 적용/미적용)와 임의 크기의 무작위 이미지를 사용합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.check_imprint_preprocess [--image-dir test_image] [--random 30] [--repeat 50]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from image_preprocessing import (preprocess_for_bright_text, preprocess_for_dark_text, preprocess_imprint_variants,
+                                 segment_pill)
+
+
+def _cases(image_dir, n_random, seed=0):
+    cases = []
+    for image_path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        _, mask, _ = segment_pill(image)
+        cases.append((os.path.basename(image_path), image, mask))
+        cases.append((f"{os.path.basename(image_path)} (마스크 없음)", image, None))
+
+    rng = np.random.default_rng(seed)
+    for i in range(n_random):
+        h, w = rng.integers(20, 400, size=2)
+        image = rng.integers(0, 256, (h, w, 3), dtype=np.uint8)
+        mask = ((rng.random((h, w)) > 0.3) * int(rng.choice([1, 255]))).astype(np.uint8)
+        cases.append((f"random_{i} ({h}x{w})", image, mask))
+    return cases
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="각인 전처리 동일성/속도 점검")
+    parser.add_argument('--image-dir', default="test_image")
+    parser.add_argument('--random', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    cases = _cases(args.image_dir, args.random)
+    mismatches = []
+    for name, image, mask in cases:
+        dark, bright = preprocess_imprint_variants(image, mask)
+        if not (np.array_equal(dark, preprocess_for_dark_text(image.copy(), mask))
+                and np.array_equal(bright, preprocess_for_bright_text(image.copy(), mask))):
+            mismatches.append(name)
+    print(f"{len(cases)}개 이미지 중 결과 불일치: {len(mismatches)}개 {mismatches[:5]}")
+
+    print(f"{'image':<32} {'separate(ms)':>12} {'fused(ms)':>10}")
+    for name, image, mask in cases:
+        if name.startswith("random_") or mask is None:
+            continue
+        separate = _best_of(lambda: (preprocess_for_dark_text(image.copy(), mask),
+                                     preprocess_for_bright_text(image.copy(), mask)), args.repeat)
+        fused = _best_of(lambda: preprocess_imprint_variants(image, mask), args.repeat)
+        print(f"{name:<32} {separate * 1000:>12.3f} {fused * 1000:>10.3f}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+각인 n-gram 색인/정규 키 재현율 점검.
+IMPRINT_CANDIDATE_LIMIT 값별로 색인을 사용한 매칭의 상위 10개가 전체 계산(candidate_limit=0)의 상위 10개를
+얼마나 포함하는지(재현율), 1순위가 같은지, 질의당 지연이 얼마인지 보고합니다.
+'+keys' 줄은 같은 제한에 OCR 혼동 문자를 접은 정규 키(일치한 각인은 항상 정확히 계산)를 함께 켠 결과입니다.
+마지막 'default' 줄은 환경 변수 기본 설정 그대로의 결과이며, 재현율이나 1순위 일치율이 1.000이 아니면
+0이 아닌 코드로 종료합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.check_imprint_recall [--db database/pill.csv] [--queries 300] [--limits 128 256 512 1024]
+"""
+import argparse
+import contextlib
+import io
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.check_matcher_parity import make_queries
+from database_handler import load_database, parse_shape_probabilities
+from imprint_index import get_imprint_key_stats
+
+
+def _run(pill_db, queries, **options):
+    results = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for shape_probabilities, colors, imprint in queries:
+            matches = pill_db.match(shape_probabilities, colors, imprint, **options)
+            results.append([m['pill_info'] for m in matches])
+    return results, (time.perf_counter() - start) / max(len(queries), 1)
+
+
+def _compare(approx, exact):
+    """ (상위 10개 재현율, 1순위 일치율) """
+    recall = np.mean([len(set(a) & set(e)) / len(e) for a, e in zip(approx, exact) if e])
+    top1 = np.mean([a[:1] == e[:1] for a, e in zip(approx, exact)])
+    return recall, top1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="각인 n-gram 색인 재현율 점검")
+    parser.add_argument('--db', default="database/pill.csv")
+    parser.add_argument('--queries', type=int, default=300)
+    parser.add_argument('--limits', type=int, nargs='+', default=[128, 256, 512, 1024])
+    args = parser.parse_args()
+
+    pill_db = load_database(args.db)
+    if not pill_db:
+        sys.exit(1)
+    # 각인이 있는 질의만 사용 (각인이 없으면 색인을 쓰지 않음)
+    queries = [(parse_shape_probabilities(s), c, i) for s, c, i in make_queries(pill_db, args.queries * 2) if i]
+    queries = queries[:args.queries]
+    print(f"고유 각인 쌍 {len(pill_db.imprint_pairs)}개, n-gram {len(pill_db.imprint_ngrams.grams)}개, 질의 {len(queries)}개")
+
+    exact, exact_time = _run(pill_db, queries, candidate_limit=0, use_imprint_keys=False)
+    print(f"{'limit':>10} {'recall@10':>10} {'top1':>6} {'ms/query':>9}")
+    print(f"{'full':>10} {1:>10.3f} {1:>6.3f} {exact_time * 1000:>9.2f}")
+    for limit in args.limits:
+        for use_imprint_keys in (False, True):
+            hits_before = get_imprint_key_stats()['hits']
+            approx, approx_time = _run(pill_db, queries, candidate_limit=limit, use_imprint_keys=use_imprint_keys)
+            recall, top1 = _compare(approx, exact)
+            label = f"{limit}+keys" if use_imprint_keys else str(limit)
+            note = (f"  (정규 키 적중 {get_imprint_key_stats()['hits'] - hits_before}/{len(queries)})"
+                    if use_imprint_keys else "")
+            print(f"{label:>10} {recall:>10.3f} {top1:>6.3f} {approx_time * 1000:>9.2f}{note}")
+
+    default, default_time = _run(pill_db, queries)
+    recall, top1 = _compare(default, exact)
+    print(f"{'default':>10} {recall:>10.3f} {top1:>6.3f} {default_time * 1000:>9.2f}")
+    if recall < 1.0 or top1 < 1.0:
+        print("기본 설정의 결과가 전체 계산과 다릅니다.")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+DB 매칭 결과 동일성 점검: PillIndex와 기존 행 단위 구현(find_best_match_linear)을 비교합니다.
+DB의 각 행에서 만든 질의(모양 확률, 색상, 각인에 OCR 오류 흉내를 낸 변형 포함)로 상위 후보 목록과 점수가
+같은지 확인하고 질의당 평균 지연을 보고합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.check_matcher_parity [--db database/pill.csv] [--queries 200]
+"""
+import argparse
+import contextlib
+import io
+import random
+import sys
+import time
+
+from database_handler import load_database, find_best_match_linear, parse_shape_probabilities
+
+SHAPES = ['원형', '타원형', '장방형']
+
+
+def make_queries(pill_db, n_queries, seed=0):
+    """ DB 행을 바탕으로 현실적인 질의를 만듭니다. (모양 확률 분산, 색상 일부 누락, 각인 글자 변형) """
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        row = pill_db[rng.randrange(len(pill_db))]
+        probabilities = [rng.random() for _ in SHAPES]
+        total = sum(probabilities)
+        shape_info = sorted(((s, p / total) for s, p in zip(SHAPES, probabilities)), key=lambda x: x[1], reverse=True)
+
+        colors = row['color'].split()
+        if len(colors) > 1 and rng.random() < 0.3:
+            colors = colors[:1]
+
+        imprint = rng.choice([row['text'], row['text2'], f"{row['text']} {row['text2']}", ""])
+        imprint = imprint.replace('nan', '')
+        if imprint and rng.random() < 0.4:
+            chars = list(imprint)
+            chars[rng.randrange(len(chars))] = rng.choice("O0I1L5S8B")
+            imprint = "".join(chars)
+        queries.append((shape_info, " ".join(sorted(colors)), imprint.strip()))
+    return queries
+
+
+def _timed(fn, queries):
+    results = []
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for query in queries:
+            # db_version 등 부가 정보는 제외하고 (후보, 점수)만 비교
+            results.append([(c['pill_info'], c['score']) for c in fn(*query)])
+    return results, (time.perf_counter() - start) / max(len(queries), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DB 매칭 결과 동일성 점검")
+    parser.add_argument('--db', default="database/pill.csv")
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    pill_db = load_database(args.db)
+    if not pill_db:
+        sys.exit(1)
+    queries = make_queries(pill_db, args.queries)
+    records = list(pill_db)
+
+    # 각인 n-gram 색인의 근사와 정규 키 단축 경로는 끄고 비교 (재현율은 check_imprint_recall에서 점검)
+    indexed, indexed_time = _timed(
+        lambda s, c, i: pill_db.match(parse_shape_probabilities(s), c, i, candidate_limit=0, use_imprint_keys=False), queries)
+    linear, linear_time = _timed(lambda *q: find_best_match_linear(records, *q), queries)
+
+    mismatches = [i for i, (a, b) in enumerate(zip(indexed, linear)) if a != b]
+    print(f"질의 {len(queries)}개: 인덱스 {indexed_time * 1000:.2f}ms/질의, 기존 {linear_time * 1000:.2f}ms/질의 "
+          f"({linear_time / max(indexed_time, 1e-9):.1f}배)")
+    print(f"결과 불일치: {len(mismatches)}개")
+    for i in mismatches[:5]:
+        print(f"  질의 {queries[i]}\n    인덱스: {indexed[i][:3]}\n    기존:   {linear[i][:3]}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
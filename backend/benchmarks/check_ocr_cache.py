@@ -0,0 +1,200 @@
+"""
+OCR 결과 캐시 점검: 서로 다른 크롭(작은 글씨의 한 글자만 다른 같은 모양 알약 포함)의 캐시 키가 모두 다르고,
+배경이나 마스크만 다른 크롭도 다른 키가 되는지 확인합니다. (Tesseract 전처리의 블러/적응 이진화는 배경 픽셀도
+사용하므로, 배경만 바꿔도 전처리 결과가 달라지는 크롭 수를 함께 보고합니다) 지각 해시 근사 일치(OCR_CACHE_MAX_DISTANCE)를 켠 경우에는
+재인코딩(JPEG 재압축, 약간의 밝기 변화)한 같은 크롭이 허용 거리 안에 있고 다른 크롭은 그보다 멀리 떨어지는지도 확인합니다.
+반복 요청(중복 업로드/재인코딩 흉내)에서의 적중률과 디스크 저장소의 TTL/크기 제한 동작도 점검합니다.
+OCR은 지연만 흉내 낸 가짜 엔진으로 대신합니다. (Tesseract/네트워크 불필요)
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.check_ocr_cache [--image-dir test_image] [--requests 200] [--ocr-ms 150]
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from image_preprocessing import preprocess_imprint_variants, segment_pill
+from ocr_cache import OCR_CACHE_MAX_DISTANCE, DiskCacheTier, OcrCache, _storage_key, hash_distance, ocr_cache_key
+
+ENGINE = "stub"
+PARAMS = {'psm': 6}
+
+
+def _crops(image_dir, n_random, seed=0):
+    """ test_image의 알약 이미지(배경 분리 마스크 포함)와 무작위 크롭 """
+    crops = []
+    for image_path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        _, mask, _ = segment_pill(image)
+        crops.append((os.path.basename(image_path), image, mask))
+    rng = np.random.default_rng(seed)
+    for i in range(n_random):
+        height, width = rng.integers(60, 240, size=2)
+        crops.append((f"random{i}", rng.integers(0, 256, (height, width, 3), dtype=np.uint8), None))
+    return crops
+
+
+# 글자 하나만 다르거나 OCR이 혼동하는 각인 쌍을 포함
+SAME_SHAPE_TEXTS = ("5", "S", "8", "B", "0", "O", "K1", "K7", "AB12", "AB17", "XY34", "TYL", "500", "M 5", "CP20",
+                    "ZC 23")
+
+
+def _same_shape_pills(texts=SAME_SHAPE_TEXTS, scales=(0.4, 0.6, 0.8, 1.1)):
+    """ 모양/색은 같고 각인만 다른 합성 알약 (글자 크기별, 알약 마스크 포함) """
+    pills = []
+    for scale in scales:
+        for text in texts:
+            image = np.full((160, 220, 3), 40, dtype=np.uint8)
+            mask = np.zeros((160, 220), dtype=np.uint8)
+            cv2.ellipse(image, (110, 80), (90, 60), 0, 0, 360, (235, 235, 235), -1)
+            cv2.ellipse(mask, (110, 80), (90, 60), 0, 0, 360, 255, -1)
+            (width, height), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, scale, 2)
+            cv2.putText(image, text, (110 - width // 2, 80 + height // 2), cv2.FONT_HERSHEY_SIMPLEX, scale,
+                        (120, 120, 120), 2)
+            pills.append((f"pill {text} x{scale}", image, mask))
+    return pills
+
+
+def _reencoded(image, rng):
+    """ 같은 사진의 재업로드 흉내: JPEG 재압축과 약간의 밝기 변화 """
+    _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, rng.choice([85, 90, 95])])
+    decoded = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    return cv2.convertScaleAbs(decoded, alpha=1.0, beta=rng.choice([-3, 0, 3]))
+
+
+def _background_changed(image, mask, rng):
+    """ 알약(마스크 안) 픽셀은 그대로 두고 배경만 바꾼 크롭 """
+    changed = image.copy()
+    changed[mask == 0] = rng.randrange(256)
+    return changed
+
+
+def _mask_changed(mask):
+    """ 알약 경계를 한 픽셀 줄인 마스크 (크롭 픽셀은 그대로) """
+    return cv2.erode(mask, np.ones((3, 3), np.uint8))
+
+
+def _preprocessing_differs(image, changed, mask):
+    """ 두 크롭의 Tesseract 전처리 변형 이미지가 하나라도 다른지 """
+    return any(not np.array_equal(a, b) for a, b in
+               zip(preprocess_imprint_variants(image, mask), preprocess_imprint_variants(changed, mask)))
+
+
+def check_keys(crops, seed=0, reencodes=20):
+    rng = random.Random(seed)
+    crops = crops + _same_shape_pills()
+    keys = [ocr_cache_key(ENGINE, PARAMS, image, mask, near_match=True) for _, image, mask in crops]
+    # 정확한 키: 서로 다른 크롭은 모두 다른 키. OCR 입력이 바뀌므로 배경이나 마스크만 다른 크롭도 다른 키
+    collisions = len(keys) - len({_storage_key(key) for key in keys})
+    masked = [(image, mask, key) for (_, image, mask), key in zip(crops, keys) if mask is not None]
+    background_changed = [_background_changed(image, mask, rng) for image, mask, _ in masked]
+    background_differs = all(
+        _storage_key(ocr_cache_key(ENGINE, PARAMS, changed, mask)) != _storage_key(key)
+        for changed, (_, mask, key) in zip(background_changed, masked))
+    mask_differs = all(_storage_key(ocr_cache_key(ENGINE, PARAMS, image, _mask_changed(mask))) != _storage_key(key)
+                       for image, mask, key in masked)
+    preprocessing_changed = sum(_preprocessing_differs(image, changed, mask)
+                                for changed, (image, mask, _) in zip(background_changed, masked))
+    engine_differs = all(ocr_cache_key("other", PARAMS, image, mask)[0] != key[0]
+                         for (_, image, mask), key in zip(crops, keys))
+    print(f"크롭 {len(crops)}개: 정확한 키 충돌 {collisions}개, 배경만 다른 크롭 다른 키 {background_differs} "
+          f"(전처리 결과가 달라진 크롭 {preprocessing_changed}/{len(masked)}개), 마스크만 다른 크롭 다른 키 {mask_differs}, "
+          f"엔진별 키 구분 {engine_differs}")
+
+    # 근사 일치: 서로 다른 크롭 사이의 최소 해밍 거리 (가로세로 비율이 다르면 비교하지 않음)
+    pairs = [(crops[i][0], crops[j][0], hash_distance(keys[i][2], keys[j][2]))
+             for i in range(len(keys)) for j in range(i + 1, len(keys))]
+    closest = min((pair for pair in pairs if pair[2] is not None), key=lambda pair: pair[2], default=None)
+    # 재인코딩한 같은 크롭의 최대 해밍 거리
+    reencode_distances = [
+        hash_distance(key[2], ocr_cache_key(ENGINE, PARAMS, _reencoded(image, rng), mask, near_match=True)[2])
+        for (name, image, mask), key in zip(crops, keys) if not name.startswith("random") for _ in range(reencodes)]
+    max_reencode = max(d if d is not None else 10 ** 6 for d in reencode_distances)
+    near_ok = closest is None or (closest[2] > OCR_CACHE_MAX_DISTANCE and max_reencode <= OCR_CACHE_MAX_DISTANCE)
+    closest_text = f"{closest[2]} ('{closest[0]}' / '{closest[1]}')" if closest else "-"
+    print(f"지각 해시: 서로 다른 크롭의 최소 해밍 거리 {closest_text}, 재인코딩한 같은 크롭의 최대 해밍 거리 {max_reencode} "
+          f"(OCR_CACHE_MAX_DISTANCE={OCR_CACHE_MAX_DISTANCE}"
+          f"{', 근사 일치 사용 가능' if near_ok else ', 이 값으로 켜면 다른 각인의 결과를 돌려줄 수 있음'})")
+    return collisions == 0 and background_differs and mask_differs and engine_differs and (OCR_CACHE_MAX_DISTANCE == 0 or near_ok)
+
+
+def check_hit_rate(crops, n_requests, ocr_seconds, repeat_rate, seed=0):
+    """ 일부 요청이 이전 크롭을 다시 보내는 상황(절반은 같은 파일, 절반은 재인코딩)에서 적중률과 평균 지연 """
+    rng = random.Random(seed)
+    calls = []
+
+    def compute(name):
+        calls.append(name)
+        time.sleep(ocr_seconds)
+        return f"TEXT-{name}", True
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = OcrCache(memory_size=8, persistent=DiskCacheTier(directory, ttl=3600, max_bytes=1 << 20))
+        seen = []
+        wrong = 0
+        start = time.perf_counter()
+        for _ in range(n_requests):
+            if seen and rng.random() < repeat_rate:
+                name, image, mask = rng.choice(seen)
+                if not name.startswith("random") and rng.random() < 0.5:
+                    image = _reencoded(image, rng)
+            else:
+                name, image, mask = rng.choice(crops)
+                seen.append((name, image, mask))
+            key = ocr_cache_key(ENGINE, PARAMS, image, mask)
+            wrong += cache.get_or_compute(key, lambda: compute(name)) != f"TEXT-{name}"
+        elapsed = time.perf_counter() - start
+        stats = cache.stats()
+    print(f"요청 {n_requests}개 (반복 비율 {repeat_rate:.0%}): OCR 실행 {len(calls)}회, 적중률 {stats['hit_rate']:.1%} "
+          f"(메모리 {stats['memory_hits']} (근사 {stats['near_hits']}), 디스크 {stats['persistent_hits']}), "
+          f"평균 {elapsed / n_requests * 1000:.1f}ms/요청 (캐시 없으면 {ocr_seconds * 1000:.0f}ms), 잘못된 결과 {wrong}개")
+    return wrong == 0
+
+
+def check_disk_limits():
+    """ 디스크 저장소의 TTL 만료와 크기 제한 삭제 """
+    with tempfile.TemporaryDirectory() as directory:
+        tier = DiskCacheTier(directory, ttl=3600, max_bytes=4096)
+        for i in range(200):
+            tier.put(f"{i:040x}", ["X" * 20, 90.0])
+        tier.evict()
+        total = sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(directory) for f in files)
+        newest_kept = tier.get(f"{199:040x}") is not None
+        oldest_dropped = tier.get(f"{0:040x}") is None
+
+        expired = DiskCacheTier(directory, ttl=-1)
+        expired.put("ff" * 20, ["Y", 1.0])
+        expired_dropped = expired.get("ff" * 20) is None
+    ok = total <= 4096 and newest_kept and oldest_dropped and expired_dropped
+    print(f"디스크 크기 제한: {total}B / 4096B, 최근 항목 유지 {newest_kept}, 오래된 항목 삭제 {oldest_dropped}, "
+          f"TTL 만료 {expired_dropped}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR 결과 캐시 점검")
+    parser.add_argument('--image-dir', default="test_image")
+    parser.add_argument('--random', type=int, default=40, help="무작위 크롭 수")
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--repeat-rate', type=float, default=0.3, help="이전 크롭을 다시 보내는 요청 비율")
+    parser.add_argument('--ocr-ms', type=float, default=150.0, help="가짜 OCR 한 번의 지연")
+    args = parser.parse_args()
+
+    crops = _crops(args.image_dir, args.random)
+    ok = check_keys(crops)
+    ok &= check_hit_rate(crops, args.requests, args.ocr_ms / 1000.0, args.repeat_rate)
+    ok &= check_disk_limits()
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+색상 군집화 엔진(KMeans vs 히스토그램) 정확도/지연 비교.
+test_image/의 각 이미지를 알약 크롭으로 보고, 서버와 같은 경로(피라미드 작업 레벨 + 배경 분리 마스크)로
+두 엔진의 최종 색상 이름과 대표 색(Delta E)을 비교합니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.compare_color_engines [--image-dir test_image] [--repeat 3]
+"""
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+from skimage.color import rgb2lab, deltaE_cie76
+
+from color_analysis import analyze_pill_colors
+from pill_pyramid import PillPyramid, STAGE_LEVELS
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="색상 군집화 엔진 비교")
+    parser.add_argument('--image-dir', default="test_image")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    level = STAGE_LEVELS['color']
+    rows = []
+    for image_path in sorted(glob.glob(os.path.join(args.image_dir, "*"))):
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        pyramid = PillPyramid(image)
+        work_image, mask = pyramid.image(level), pyramid.mask(level)
+
+        kmeans_time, (kmeans_rgb, kmeans_names) = _timed(
+            lambda: analyze_pill_colors(work_image, mask=mask, engine='kmeans'), args.repeat)
+        hist_time, (hist_rgb, hist_names) = _timed(
+            lambda: analyze_pill_colors(work_image, mask=mask, engine='histogram'), args.repeat)
+
+        delta_e = float(deltaE_cie76(rgb2lab(np.uint8([[kmeans_rgb[0]]])), rgb2lab(np.uint8([[hist_rgb[0]]]))).item())
+        rows.append((os.path.basename(image_path), kmeans_names, hist_names, delta_e, kmeans_time, hist_time))
+
+    print(f"{'image':<20} {'kmeans':<16} {'histogram':<16} {'dE':>6} {'kmeans(ms)':>11} {'hist(ms)':>9}")
+    for name, kmeans_names, hist_names, delta_e, kmeans_time, hist_time in rows:
+        mark = ' ' if kmeans_names == hist_names else '*'
+        print(f"{name:<20} {','.join(kmeans_names):<16} {','.join(hist_names):<16} {delta_e:>6.1f} "
+              f"{kmeans_time * 1000:>11.2f} {hist_time * 1000:>9.2f} {mark}")
+
+    if rows:
+        agreement = np.mean([r[1] == r[2] for r in rows])
+        print(f"\n색상 이름 일치율: {agreement:.0%}, 평균 Delta E: {np.mean([r[3] for r in rows]):.2f}, "
+              f"평균 지연 kmeans {np.mean([r[4] for r in rows]) * 1000:.2f}ms / "
+              f"histogram {np.mean([r[5] for r in rows]) * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+합성 알약 DB 생성기 (매칭 규모 확장성 측정용).
+실제 database/pill.csv의 행을 무작위로 골라 모양/색상/각인(앞, 뒤) 조합과 분포는 그대로 두고,
+각인의 영문자/숫자를 같은 종류의 다른 문자로 바꿔 새 알약을 만듭니다. (각인 길이, 공백/하이픈 위치, 한글 각인 유지)
+실제 행은 모두 앞쪽에 그대로 포함하므로 실제 알약 질의도 그대로 찾을 수 있습니다.
+
+backend/ 폴더에서 실행:
+    python -m benchmarks.synthetic_catalogue [--db database/pill.csv] [--sizes 1000 10000 50000 200000]
+"""
+import argparse
+import os
+import random
+import string
+
+import pandas as pd
+
+# 합성 DB 기본 저장 위치 (.gitignore의 cache/ 아래)
+DEFAULT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "synthetic")
+DEFAULT_SIZES = (1000, 10000, 50000, 200000)
+# 각인 문자 하나를 바꿀 확률
+MUTATION_RATE = 0.5
+# 합성 행의 품목기준코드 시작값 (실제 코드와 겹치지 않도록)
+SYNTHETIC_CODE_START = 900000000
+
+
+def _mutate_imprint(text, rng):
+    """ 영문 대문자는 다른 대문자로, 숫자는 다른 숫자로 바꿉니다. (나머지 문자와 결측값은 그대로) """
+    if pd.isna(text):
+        return text
+    chars = []
+    for char in str(text):
+        if char in string.ascii_uppercase and rng.random() < MUTATION_RATE:
+            char = rng.choice(string.ascii_uppercase)
+        elif char in string.digits and rng.random() < MUTATION_RATE:
+            char = rng.choice(string.digits)
+        chars.append(char)
+    return "".join(chars)
+
+
+def generate_catalogue(source_df, n_rows, seed=0):
+    """ 실제 DB(source_df) 분포를 따르는 n_rows행의 합성 DB(DataFrame)를 만듭니다. """
+    rng = random.Random(seed)
+    n_real = min(n_rows, len(source_df))
+    real = source_df.iloc[:n_real]
+    n_synthetic = n_rows - n_real
+    if n_synthetic == 0:
+        return real.reset_index(drop=True)
+
+    picks = [rng.randrange(len(source_df)) for _ in range(n_synthetic)]
+    synthetic = source_df.iloc[picks].copy()
+    synthetic['text'] = [_mutate_imprint(v, rng) for v in synthetic['text']]
+    synthetic['text2'] = [_mutate_imprint(v, rng) for v in synthetic['text2']]
+    synthetic['name'] = [f"{name} (합성 {i + 1})" for i, name in enumerate(synthetic['name'])]
+    if 'code' in synthetic:
+        synthetic['code'] = [str(SYNTHETIC_CODE_START + i) for i in range(n_synthetic)]
+
+    catalogue = pd.concat([real, synthetic], ignore_index=True)
+    if 'num' in catalogue:
+        catalogue['num'] = [str(i + 1) for i in range(len(catalogue))]
+    return catalogue
+
+
+def read_source(db_path):
+    """ 실제 DB를 문자열 그대로 읽습니다. (load_database와 같은 cp949 인코딩) """
+    return pd.read_csv(db_path, encoding='cp949', dtype=str)
+
+
+def catalogue_path(n_rows, output_dir=DEFAULT_OUTPUT_DIR):
+    return os.path.join(output_dir, f"synthetic_{n_rows}.csv")
+
+
+def write_catalogue(db_path, n_rows, output_dir=DEFAULT_OUTPUT_DIR, seed=0, source_df=None):
+    """ 합성 DB를 CSV로 저장하고 경로를 반환합니다. (같은 크기/시드면 항상 같은 내용) """
+    if source_df is None:
+        source_df = read_source(db_path)
+    os.makedirs(output_dir, exist_ok=True)
+    path = catalogue_path(n_rows, output_dir)
+    generate_catalogue(source_df, n_rows, seed).to_csv(path, index=False, encoding='cp949')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="합성 알약 DB 생성")
+    parser.add_argument('--db', default="database/pill.csv")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--output-dir', default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    source_df = read_source(args.db)
+    for n_rows in args.sizes:
+        path = write_catalogue(args.db, n_rows, args.output_dir, args.seed, source_df)
+        print(f"{n_rows}행 합성 DB를 생성했습니다: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Google Vision images:annotate 로컬 대역 서버 (오프라인 테스트/벤치마크용).
+REST 엔드포인트(POST /v1/images:annotate)와 응답 형식(textAnnotations, boundingPoly, 이미지별 error)을 흉내 내고,
+요청당 왕복 지연(rtt_ms)과 이미지당 처리 시간(per_image_ms), 요청당 이미지 수 제한(16)을 재현합니다.
+실제 OCR 대신 이미지 안의 QR 코드를 읽어 글자와 위치를 돌려주므로, 합성 알약(각인 자리에 QR 코드)으로
+결과 정확도와 위치 대응까지 확인할 수 있습니다.
+
+imprint_analysis_google의 클라이언트를 이 서버로 향하게 하려면:
+    VISION_ENDPOINT=http://127.0.0.1:8089 python main.py
+
+backend/ 폴더에서 단독 실행:
+    python -m benchmarks.vision_stub [--port 8089] [--rtt-ms 80] [--per-image-ms 5]
+"""
+import argparse
+import base64
+import contextlib
+import json
+import random
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+# Vision API 동기 요청당 최대 이미지 수
+MAX_IMAGES_PER_REQUEST = 16
+
+_QR_DETECTOR = threading.local()
+
+
+def qr_recognizer(image):
+    """
+    이미지 안의 QR 코드들을 읽어 [(글자, 꼭짓점 4개 [(x, y), ...]), ...] 반환 (OCR 대역)
+    여러 코드가 있는 이미지에 강한 ArUco 기반 검출기와 기본 검출기의 결과를 합칩니다.
+    """
+    detectors = getattr(_QR_DETECTOR, 'detectors', None)
+    if detectors is None:
+        detectors = _QR_DETECTOR.detectors = (cv2.QRCodeDetectorAruco(), cv2.QRCodeDetector())
+    words = {}
+    for detector in detectors:
+        ok, texts, points, _ = detector.detectAndDecodeMulti(image)
+        if not ok:
+            continue
+        for text, quad in zip(texts, points):
+            if text and text not in words:
+                words[text] = [(int(round(x)), int(round(y))) for x, y in quad]
+    return list(words.items())
+
+
+def _poly(vertices):
+    return {'vertices': [{'x': x, 'y': y} for x, y in vertices]}
+
+
+def _annotate(content, recognizer):
+    image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return {'error': {'code': 3, 'message': "Bad image data."}}
+    words = recognizer(image)
+    if not words:
+        return {}
+    xs = [x for _, quad in words for x, _ in quad]
+    ys = [y for _, quad in words for _, y in quad]
+    # 첫 항목은 이미지 전체 텍스트, 이후는 단어별 (Vision과 같은 구성)
+    full = {'locale': 'en', 'description': "\n".join(text for text, _ in words),
+            'boundingPoly': _poly([(min(xs), min(ys)), (max(xs), min(ys)), (max(xs), max(ys)), (min(xs), max(ys))])}
+    return {'textAnnotations': [full] + [{'description': text, 'boundingPoly': _poly(quad)} for text, quad in words]}
+
+
+class VisionStubServer:
+    """ 백그라운드 스레드에서 동작하는 Vision 대역 서버. with 문으로 시작/종료 """
+
+    def __init__(self, host="127.0.0.1", port=0, rtt_ms=80.0, per_image_ms=5.0,
+                 max_images=MAX_IMAGES_PER_REQUEST, recognizer=qr_recognizer):
+        self.rtt_ms = rtt_ms
+        self.per_image_ms = per_image_ms
+        self.max_images = max_images
+        self.recognizer = recognizer
+        self._lock = threading.Lock()
+        self.reset_stats()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self._lock:
+            # recognize_seconds: 대역 인식(QR 읽기)에 쓴 시간 (실제 Vision 처리 시간과 무관하므로 지연 비교에서 뺄 수 있음)
+            self.stats = {'requests': 0, 'images': 0, 'bytes_received': 0, 'max_images_per_request': 0, 'rejected': 0,
+                          'recognize_seconds': 0.0}
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if not self.path.startswith("/v1/images:annotate"):
+                    return self._reply(404, {'error': {'code': 404, 'message': "Not found", 'status': "NOT_FOUND"}})
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                requests = json.loads(body).get('requests', [])
+                with stub._lock:
+                    stub.stats['requests'] += 1
+                    stub.stats['images'] += len(requests)
+                    stub.stats['bytes_received'] += len(body)
+                    stub.stats['max_images_per_request'] = max(stub.stats['max_images_per_request'], len(requests))
+                time.sleep((stub.rtt_ms + stub.per_image_ms * len(requests)) / 1000.0)
+                if len(requests) > stub.max_images:
+                    with stub._lock:
+                        stub.stats['rejected'] += 1
+                    return self._reply(400, {'error': {
+                        'code': 400, 'status': "INVALID_ARGUMENT",
+                        'message': f"At most {stub.max_images} images allowed per request."}})
+                start = time.perf_counter()
+                responses = [_annotate(base64.b64decode(r['image']['content']), stub.recognizer) for r in requests]
+                with stub._lock:
+                    stub.stats['recognize_seconds'] += time.perf_counter() - start
+                self._reply(200, {'responses': responses})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                # 클라이언트가 제한 시간으로 먼저 끊은 경우
+                with contextlib.suppress(BrokenPipeError, ConnectionResetError):
+                    self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="vision-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def random_imprint(rng):
+    """ 알약 각인처럼 짧은 영숫자 문자열 """
+    return "".join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(rng.randint(2, 6)))
+
+
+def synthetic_pill_crop(text, size, rng):
+    """
+    각인 자리에 QR 코드(text)를 넣은 합성 알약 크롭과 알약 마스크.
+    size는 크롭의 긴 변 길이이며, QR 코드는 알약 크기에 비례해 작아집니다. (작은 크롭일수록 읽기 어려움)
+    """
+    height, width = int(size * rng.uniform(0.6, 1.0)), size
+    background = tuple(int(v) for v in rng.choice([(60, 60, 60), (90, 110, 100), (40, 70, 120)]))
+    body = tuple(int(v) for v in rng.choice([(235, 235, 235), (200, 220, 245), (170, 200, 230)]))
+    image = np.full((height, width, 3), background, dtype=np.uint8)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    center, axes = (width // 2, height // 2), (int(width * 0.46), int(height * 0.46))
+    cv2.ellipse(image, center, axes, 0, 0, 360, body, -1)
+    cv2.ellipse(mask, center, axes, 0, 0, 360, 255, -1)
+
+    qr = cv2.QRCodeEncoder.create().encode(text)
+    module = max(1, int(min(axes) * 1.1) // qr.shape[0])
+    qr = cv2.resize(qr, None, fx=module, fy=module, interpolation=cv2.INTER_NEAREST)
+    y0, x0 = center[1] - qr.shape[0] // 2, center[0] - qr.shape[1] // 2
+    image[y0:y0 + qr.shape[0], x0:x0 + qr.shape[1]] = qr[..., None]
+    return image, mask
+
+
+def synthetic_pill_crops(n, seed=0, min_size=140, max_size=320):
+    """ [(크롭, 마스크, 정답 각인), ...] """
+    rng = random.Random(seed)
+    crops = []
+    for _ in range(n):
+        text = random_imprint(rng)
+        image, mask = synthetic_pill_crop(text, rng.randint(min_size, max_size), rng)
+        crops.append((image, mask, text))
+    return crops
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Google Vision 로컬 대역 서버")
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--rtt-ms', type=float, default=80.0)
+    parser.add_argument('--per-image-ms', type=float, default=5.0)
+    args = parser.parse_args()
+
+    server = VisionStubServer(port=args.port, rtt_ms=args.rtt_ms, per_image_ms=args.per_image_ms)
+    print(f"Vision 대역 서버: {server.url}/v1/images:annotate (Ctrl+C로 종료)")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+
+
+if __name__ == '__main__':
+    main()
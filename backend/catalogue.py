@@ -0,0 +1,168 @@
+import os
+import time
+import signal
+import logging
+import threading
+
+from database_handler import PillIndex, load_database, read_database_columns
+from pill_snapshot import PILL_DB_SNAPSHOT, load_snapshot, save_snapshot, source_fingerprint
+
+# --- 알약 DB 무중단 갱신 ---
+# 요청 처리 코드는 매번 CatalogueManager.current로 현재 인덱스를 한 번 받아 사용합니다.
+# 새 인덱스는 백그라운드에서 만든 뒤 참조만 교체하므로, 진행 중인 매칭은 이전 인덱스로 끝까지 수행됩니다.
+# 갱신은 CSV 변경 감시(CATALOGUE_POLL_SECONDS 간격), 관리자 요청(reload_async) 또는 SIGHUP으로 시작합니다.
+
+CATALOGUE_POLL_SECONDS = float(os.getenv("CATALOGUE_POLL_SECONDS", "30"))  # 0이면 감시하지 않음
+# 행을 구분하는 키 열 (품목기준코드). 없으면 행 순서로 구분
+ROW_KEY_COLUMN = "code"
+
+
+def _row_fingerprints(columns):
+    """ 행 키(코드 + 같은 코드 내 순번) → 행 내용 해시 """
+    names = list(columns)
+    size = len(columns[names[0]]) if names else 0
+    keys = columns[ROW_KEY_COLUMN] if ROW_KEY_COLUMN in columns else range(size)
+    seen = {}
+    fingerprints = {}
+    for i, (key, values) in enumerate(zip(keys, zip(*(columns[n] for n in names)))):
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        fingerprints[(str(key), occurrence)] = hash(tuple(str(v) for v in values))
+    return fingerprints
+
+
+def compute_row_delta(old_fingerprints, new_fingerprints):
+    """ 추가/삭제/변경된 행 수 """
+    old_keys, new_keys = old_fingerprints.keys(), new_fingerprints.keys()
+    return {
+        'added': len(new_keys - old_keys),
+        'removed': len(old_keys - new_keys),
+        'changed': sum(1 for k in old_keys & new_keys if old_fingerprints[k] != new_fingerprints[k]),
+    }
+
+
+class CatalogueManager:
+    """
+    현재 알약 DB 인덱스에 대한 참조를 보관하고 무중단으로 교체합니다.
+    감시 스레드는 처음 current에 접근할 때 프로세스마다 시작됩니다. (prefork 워커에서도 동작)
+    """
+
+    def __init__(self, db_path, poll_interval=CATALOGUE_POLL_SECONDS):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self._index = load_database(db_path)
+        self._fingerprint = self._stat()
+        self._row_fingerprints = None
+        self._reload_lock = threading.Lock()
+        self._watcher_pid = None
+        self.reload_count = 0
+        self.last_reload = None
+
+    def _stat(self):
+        try:
+            return source_fingerprint(self.db_path, with_hash=False)
+        except OSError:
+            return None
+
+    @property
+    def current(self):
+        """ 현재 인덱스 (요청마다 한 번 받아서 사용) """
+        self._ensure_watcher()
+        return self._index
+
+    @property
+    def version(self):
+        return getattr(self._index, 'version', None)
+
+    def _ensure_watcher(self):
+        if self.poll_interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        self._watcher_pid = os.getpid()
+        threading.Thread(target=self._watch, name="catalogue-watcher", daemon=True).start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.reload()
+            except Exception as e:
+                logging.error(f"알약 DB 갱신 중 오류: {e}", exc_info=True)
+
+    def reload(self, force=False):
+        """
+        CSV가 바뀌었으면(force면 항상) 새 인덱스를 만들어 교체하고 갱신 결과를 반환합니다.
+        다른 프로세스가 이미 만든 최신 스냅샷이 있으면 그것을 사용하고, 없으면 CSV 전체를 다시 읽어 만듭니다.
+        이때 고유값 테이블과 각인 정규화/색인은 이전 인덱스에서 재사용하고 새 값만 계산합니다. (행 변화 수는 delta로 보고)
+        """
+        with self._reload_lock:
+            fingerprint = self._stat()
+            if fingerprint is None or (not force and fingerprint == self._fingerprint):
+                return {'reloaded': False, 'db_version': self.version}
+
+            start = time.perf_counter()
+            old_index = self._index
+            snapshot = load_snapshot(self.db_path) if PILL_DB_SNAPSHOT else None
+            if snapshot is not None:
+                new_index = PillIndex.from_snapshot(*snapshot)
+                columns = new_index.columns
+            else:
+                columns, version, source = read_database_columns(self.db_path)
+                new_index = None
+
+            if self._row_fingerprints is None and old_index is not None:
+                self._row_fingerprints = _row_fingerprints(old_index.columns)
+            new_fingerprints = _row_fingerprints(columns)
+            delta = compute_row_delta(self._row_fingerprints or {}, new_fingerprints)
+
+            if old_index is not None and not force and not any(delta.values()):
+                # 내용이 같으면(시각만 바뀜) 인덱스를 교체하지 않음
+                self._fingerprint = fingerprint
+                return {'reloaded': False, 'db_version': self.version, 'delta': delta}
+
+            if new_index is None:
+                new_index = PillIndex(columns, previous=old_index, version=version, source=source)
+                if PILL_DB_SNAPSHOT:
+                    try:
+                        save_snapshot(self.db_path, *new_index.to_snapshot(), source=new_index.source)
+                    except OSError as e:
+                        logging.warning(f"DB 스냅샷을 저장하지 못했습니다: {e}")
+
+            # 참조 교체 (진행 중인 매칭은 이전 인덱스를 계속 사용)
+            self._index = new_index
+            self._fingerprint = fingerprint
+            self._row_fingerprints = new_fingerprints
+            self.reload_count += 1
+            self.last_reload = {
+                'time': time.time(),
+                'seconds': round(time.perf_counter() - start, 3),
+                'delta': delta,
+                'db_version': new_index.version,
+                'rows': len(new_index),
+            }
+            logging.info(f"알약 DB를 갱신했습니다: {self.last_reload}")
+            return dict(self.last_reload, reloaded=True)
+
+    def reload_async(self, force=False):
+        """ 백그라운드 스레드에서 갱신 (요청 처리를 막지 않음) """
+        thread = threading.Thread(target=self.reload, kwargs={'force': force}, name="catalogue-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def install_signal_handler(self, signum=getattr(signal, 'SIGHUP', None)):
+        """ 신호(기본 SIGHUP)를 받으면 백그라운드 갱신. 메인 스레드에서만 설치할 수 있음 """
+        if signum is None:
+            return False
+        try:
+            signal.signal(signum, lambda *_: self.reload_async(force=True))
+            return True
+        except ValueError:
+            return False
+
+    def stats(self):
+        return {
+            'db_version': self.version,
+            'rows': len(self._index) if self._index is not None else 0,
+            'reload_count': self.reload_count,
+            'last_reload': self.last_reload,
+            'poll_seconds': self.poll_interval,
+        }
@@ -1,9 +1,12 @@
+import os
 import cv2
 import numpy as np
-from sklearn.cluster import KMeans
 from skimage.color import rgb2lab, deltaE_cie76
 import logging
 
+from color_clustering import cluster_colors
+from color_lut import ColorLookupTable
+
 # 로깅 설정
 logging.basicConfig(level=logging.INFO, format='- %(message)s')
 
@@ -16,45 +19,72 @@ color_dict_rgb = {
     '살구': [240, 190, 160],  '적갈색': [80, 30, 25]
 }
 
-# 모든 기준 색상의 LAB 값을 미리 계산하여 성능을 최적화합니다.
-color_dict_lab = {
-    name: rgb2lab(np.uint8([[rgb]]))
-    for name, rgb in color_dict_rgb.items()
-}
+# 최종 결과에서 다른 이름으로 합쳐 보고하는 기준 색상
+COLOR_NAME_ALIASES = {'적갈색': '갈색'}
+
+# 기준 색상별 RGB → 가장 가까운 색상 인덱스 조회 테이블 (팔레트가 바뀌면 자동으로 다시 생성됨)
+color_lut = ColorLookupTable(color_dict_rgb)
+_REPORTED_NAMES = np.array([COLOR_NAME_ALIASES.get(name, name) for name in color_lut.names], dtype=object)
+
+
+def warmup_color_lut():
+    """ 서버 시작 시 색상 조회 테이블을 미리 열어 둡니다. (캐시 파일이 없으면 이때 생성, 8비트 기준 십여 초) """
+    color_lut.lookup_index([0, 0, 0])
+
+
+def map_rgb_batch(rgb_array):
+    """
+    (..., 3) RGB 배열의 모든 값을 한 번의 배열 연산으로 색상 이름 배열(...)로 변환합니다.
+    군집 중심 목록뿐 아니라 이미지 전체에도 사용할 수 있습니다.
+    """
+    return _REPORTED_NAMES[color_lut.lookup_index(rgb_array)]
 
 
 def map_rgb_to_color_name(rgb_color):
     """
     CIELAB 색 공간에서 Delta E 공식을 사용하여, 주어진 RGB 값과
-    가장 시각적으로 가까운 색상 이름을 찾습니다.
+    가장 시각적으로 가까운 색상 이름을 찾습니다. (미리 계산한 조회 테이블 사용)
     """
     if rgb_color is None: return "알 수 없음"
-    input_lab = rgb2lab(np.uint8([[list(rgb_color)]]))
-    min_dist = float('inf')
-    closest_color = "알 수 없음"
-    for name, standard_lab in color_dict_lab.items():
-        dist = deltaE_cie76(input_lab, standard_lab)
-        if dist < min_dist:
-            min_dist = dist
-            closest_color = name
+    return str(map_rgb_batch(list(rgb_color)))
 
-    if closest_color == '적갈색':
-        return '갈색'
 
-    return closest_color
+# K-Means에 넣을 최대 픽셀 수 (0 또는 None이면 제한 없음)
+COLOR_SAMPLE_BUDGET = int(os.getenv("COLOR_SAMPLE_BUDGET", "20000"))
+BRIGHTNESS_THRESHOLD = 30
 
 
-def analyze_pill_colors(pill_image_without_bg):
+def sample_pill_pixels(image_rgb, mask=None, brightness_threshold=BRIGHTNESS_THRESHOLD, max_pixels=COLOR_SAMPLE_BUDGET):
     """
-    K-Means로 주요 색상 후보를 추출한 뒤, 후보 간의 시각적 유사도와
+    색상 분석에 사용할 알약 픽셀을 NumPy 연산으로 골라냅니다.
+    - 밝기 조건: 픽셀의 RGB 평균 > brightness_threshold (배경/그림자 제외)
+    - mask가 주어지면 마스크 영역(>0) 안의 픽셀만 사용
+    - max_pixels를 넘으면 일정 간격으로 결정적으로 부분 샘플링 (같은 입력이면 항상 같은 결과)
+    """
+    pixels = image_rgb.reshape(-1, 3)
+
+    # np.mean(p) > t  <=>  R + G + B > 3t (정수 합으로 비교하여 픽셀별 실수 연산을 피함)
+    keep = pixels.sum(axis=1, dtype=np.uint16) > brightness_threshold * 3
+    if mask is not None:
+        keep &= mask.reshape(-1) > 0
+    selected = pixels[keep]
+
+    if max_pixels and len(selected) > max_pixels:
+        indices = np.linspace(0, len(selected) - 1, max_pixels).astype(np.int64)
+        selected = selected[indices]
+    return selected
+
+
+def analyze_pill_colors(pill_image_without_bg, mask=None, max_pixels=COLOR_SAMPLE_BUDGET, engine=None):
+    """
+    K-Means(또는 히스토그램 군집화)로 주요 색상 후보를 추출한 뒤, 후보 간의 시각적 유사도와
     반사/그림자 여부를 판단하여 단일/다중 색상을 최종 결정합니다.
+    (mask가 주어지면 배경 분리 마스크를 그대로 사용하여 알약 픽셀만 샘플링,
+     engine을 지정하지 않으면 COLOR_CLUSTER_ENGINE 설정을 따름)
     """
     try:
         image_rgb = cv2.cvtColor(pill_image_without_bg, cv2.COLOR_BGR2RGB)
-        pixels = image_rgb.reshape(-1, 3)
-
-        brightness_threshold = 30
-        non_black_pixels = np.array([p for p in pixels if np.mean(p) > brightness_threshold])
+        non_black_pixels = sample_pill_pixels(image_rgb, mask, max_pixels=max_pixels)
         n_clusters_to_use = 5
         
         if non_black_pixels.size == 0:
@@ -67,35 +97,33 @@ def analyze_pill_colors(pill_image_without_bg):
             else:
                 n_clusters_to_use = 3 # 100개 미만 5개 이상이면 3으로 줄임
 
-        kmeans = KMeans(n_clusters=n_clusters_to_use, n_init='auto', random_state=42)
-        kmeans.fit(non_black_pixels)
-
-        unique_labels, counts = np.unique(kmeans.labels_, return_counts=True)
-        cluster_centers = kmeans.cluster_centers_.astype(int)
+        # 군집 중심(RGB, int)과 군집별 픽셀 수 (비어 있는 군집은 제외됨)
+        cluster_centers, counts = cluster_colors(non_black_pixels, n_clusters_to_use, engine)
 
         min_pixel_percentage = 0.15
         significant_clusters = []
-        for label, count in zip(unique_labels, counts):
+        for center, count in zip(cluster_centers, counts):
             if count / len(non_black_pixels) > min_pixel_percentage:
-                significant_clusters.append({'rgb': cluster_centers[label], 'count': count})
+                significant_clusters.append({'rgb': center, 'count': count})
 
         if not significant_clusters:
-            dominant_label = unique_labels[np.argmax(counts)]
-            dominant_rgb = cluster_centers[dominant_label]
+            dominant_rgb = cluster_centers[np.argmax(counts)]
             color_name = map_rgb_to_color_name(dominant_rgb)
             logging.info(f"식별된 색상: {color_name} (대표 RGB: {dominant_rgb.tolist()})")
             return [dominant_rgb.tolist()], [color_name]
 
         sorted_clusters = sorted(significant_clusters, key=lambda x: x['count'], reverse=True)
         top1_rgb = sorted_clusters[0]['rgb']
-        top1_name = map_rgb_to_color_name(top1_rgb)
 
         if len(sorted_clusters) == 1:
+            top1_name = map_rgb_to_color_name(top1_rgb)
             logging.info(f"식별된 색상: {top1_name} (대표 RGB: {top1_rgb.tolist()})")
             return [top1_rgb.tolist()], [top1_name]
 
+        # 상위 두 후보의 이름을 조회 테이블에서 한 번에 가져옴
         top2_rgb = sorted_clusters[1]['rgb']
-        top2_name = map_rgb_to_color_name(top2_rgb)
+        top_rgbs = np.stack([top1_rgb, top2_rgb])
+        top1_name, top2_name = (str(name) for name in map_rgb_batch(top_rgbs))
 
         # --- 단순하고 안정적인 최종 결정 로직 ---
         achromatic_colors = ['하양', '회색', '검정']
@@ -112,7 +140,7 @@ def analyze_pill_colors(pill_image_without_bg):
             return [top1_rgb.tolist()], [top1_name]
 
         # 2. 색상 유사도 처리: 두 색상이 비슷하면(예: 주황과 갈색) 하나의 색으로 통일
-        delta_e = float(deltaE_cie76(rgb2lab(np.uint8([[top1_rgb]])), rgb2lab(np.uint8([[top2_rgb]]))))
+        delta_e = float(deltaE_cie76(rgb2lab(np.uint8([[top1_rgb]])), rgb2lab(np.uint8([[top2_rgb]]))).item())
         SIMILARITY_THRESHOLD = 25.0
         if delta_e < SIMILARITY_THRESHOLD:
             logging.info(
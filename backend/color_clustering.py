@@ -0,0 +1,83 @@
+import os
+
+import numpy as np
+
+# --- 색상 군집화 엔진 ---
+# analyze_pill_colors가 사용하는 (군집 중심 RGB, 군집별 픽셀 수)를 계산합니다.
+#   - 'kmeans'   : scikit-learn KMeans (기존 방식)
+#   - 'histogram': 양자화된 3D RGB 히스토그램의 봉우리를 병합하는 방식 (반복 없이 고정 비용)
+# COLOR_CLUSTER_ENGINE 환경 변수로 선택합니다.
+
+COLOR_CLUSTER_ENGINE = os.getenv("COLOR_CLUSTER_ENGINE", "kmeans")
+
+HISTOGRAM_BINS = 16            # 채널당 구간 수 (16^3 = 4096 구간)
+HISTOGRAM_MERGE_DISTANCE = 48  # 이 거리(RGB) 이내의 구간은 같은 봉우리로 병합
+
+
+def cluster_kmeans(pixels, n_clusters):
+    """ KMeans로 군집화하여 (비어 있지 않은 군집의 중심 RGB(int), 픽셀 수)를 반환 """
+    from sklearn.cluster import KMeans
+
+    kmeans = KMeans(n_clusters=n_clusters, n_init='auto', random_state=42)
+    kmeans.fit(pixels)
+
+    unique_labels, counts = np.unique(kmeans.labels_, return_counts=True)
+    cluster_centers = kmeans.cluster_centers_.astype(int)
+    return cluster_centers[unique_labels], counts
+
+
+def cluster_histogram(pixels, n_clusters, bins=HISTOGRAM_BINS, merge_distance=HISTOGRAM_MERGE_DISTANCE):
+    """
+    양자화된 RGB 히스토그램으로 군집화합니다.
+    1. 픽셀을 bins^3 구간으로 양자화하고 구간별 픽셀 수/평균 색을 계산
+    2. 픽셀 수가 가장 많은 구간부터, 기존 봉우리와 merge_distance 이상 떨어진 구간을 새 봉우리로 선택 (최대 n_clusters개)
+    3. 모든 구간을 가장 가까운 봉우리에 배정하고, 픽셀 수 가중 평균으로 군집 중심을 계산
+    """
+    pixels = np.asarray(pixels).reshape(-1, 3)
+    step = 256 // bins
+    quantized = (pixels // step).astype(np.int64)
+    bin_index = (quantized[:, 0] * bins + quantized[:, 1]) * bins + quantized[:, 2]
+
+    n_bins = bins ** 3
+    bin_counts = np.bincount(bin_index, minlength=n_bins)
+    occupied = np.flatnonzero(bin_counts)
+    counts = bin_counts[occupied].astype(np.float64)
+    sums = np.stack(
+        [np.bincount(bin_index, weights=pixels[:, c], minlength=n_bins)[occupied] for c in range(3)], axis=1
+    )
+    bin_means = sums / counts[:, np.newaxis]
+
+    # 봉우리 선택: 반복 횟수는 군집 수(n_clusters) 이하
+    peaks = []
+    far_from_peaks = np.ones(len(occupied), dtype=bool)
+    while len(peaks) < n_clusters and far_from_peaks.any():
+        candidate = np.flatnonzero(far_from_peaks)[np.argmax(counts[far_from_peaks])]
+        peaks.append(candidate)
+        distance = np.linalg.norm(bin_means - bin_means[candidate], axis=1)
+        far_from_peaks &= distance >= merge_distance
+
+    # 모든 구간을 가장 가까운 봉우리에 배정
+    peak_means = bin_means[peaks]
+    distances = np.linalg.norm(bin_means[:, np.newaxis, :] - peak_means[np.newaxis, :, :], axis=2)
+    assignment = distances.argmin(axis=1)
+
+    cluster_counts = np.bincount(assignment, weights=counts, minlength=len(peaks))
+    cluster_sums = np.stack(
+        [np.bincount(assignment, weights=sums[:, c], minlength=len(peaks)) for c in range(3)], axis=1
+    )
+    centers = (cluster_sums / cluster_counts[:, np.newaxis]).astype(int)
+    return centers, cluster_counts.astype(np.int64)
+
+
+CLUSTER_ENGINES = {
+    'kmeans': cluster_kmeans,
+    'histogram': cluster_histogram,
+}
+
+
+def cluster_colors(pixels, n_clusters, engine=None):
+    """ 설정된 엔진으로 픽셀을 군집화하여 (군집 중심 RGB, 군집별 픽셀 수)를 반환 """
+    engine = engine or COLOR_CLUSTER_ENGINE
+    if engine not in CLUSTER_ENGINES:
+        raise ValueError(f"알 수 없는 색상 군집화 엔진입니다: {engine} (사용 가능: {', '.join(CLUSTER_ENGINES)})")
+    return CLUSTER_ENGINES[engine](pixels, n_clusters)
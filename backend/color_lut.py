@@ -0,0 +1,110 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+
+import numpy as np
+
+# --- RGB → 기준 색상 조회 테이블 ---
+# RGB 격자(채널당 2^COLOR_LUT_BITS 단계)마다 가장 가까운 기준 색상 인덱스(CIELAB Delta E 기준)를
+# 미리 계산해 .npy로 저장하고, 이후에는 메모리 매핑으로 읽어 배열 인덱싱만으로 조회합니다.
+# 기본값 8비트는 가능한 모든 RGB 값(256^3, 16MB)을 담으므로 기존 rgb2lab + deltaE_cie76 계산과 결과가 같습니다.
+# 더 작은 값(예: 6 → 64^3, 256KB)은 격자 중심 값으로 분류하므로 팔레트 경계 근처의 이름이 바뀔 수 있습니다. (선택 사항)
+# 파일 이름에 팔레트 해시가 들어가므로 기준 색상이 바뀌면 새 테이블이 자동으로 생성됩니다.
+
+COLOR_LUT_BITS = int(os.getenv("COLOR_LUT_BITS", "8"))
+COLOR_LUT_DIR = os.getenv("COLOR_LUT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+
+# 테이블 생성 방식이 바뀌면 올려서 기존 캐시 파일을 무효화
+_LUT_FORMAT_VERSION = 2
+
+
+def palette_hash(palette, bits):
+    """ 팔레트(이름 → RGB)와 양자화 단계로 테이블을 식별하는 해시 """
+    payload = json.dumps(
+        {'version': _LUT_FORMAT_VERSION, 'bits': bits, 'palette': [[name, list(rgb)] for name, rgb in palette.items()]},
+        ensure_ascii=False,
+    )
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+
+def build_color_lut(palette, bits):
+    """ 격자별 기준 색상 인덱스(uint8, (L, L, L)) 테이블을 계산합니다. """
+    from skimage.color import rgb2lab
+
+    levels = 1 << bits
+    step = 256 // levels
+    centers = (np.arange(levels) * step + step // 2).astype(np.uint8)
+    palette_lab = rgb2lab(np.uint8([list(palette.values())])).reshape(-1, 3)
+
+    # R 값 하나씩 (L, L) 평면 단위로 계산하여 메모리 사용을 억제 (8비트 기준 평면당 65536개)
+    # 거리는 deltaE_cie76과 같은 float64 식으로 계산하고, 같은 거리면 팔레트 순서가 앞선 색을 선택
+    index = np.zeros((levels, levels, levels), dtype=np.uint8)
+    green, blue = np.meshgrid(centers, centers, indexing='ij')
+    for r, red in enumerate(centers):
+        plane = np.stack([np.full_like(green, red), green, blue], axis=-1).reshape(1, -1, 3)
+        lab = rgb2lab(plane).reshape(-1, 3)
+        best_index = np.zeros(len(lab), dtype=np.uint8)
+        best_dist = np.full(len(lab), np.inf)
+        for i, ref in enumerate(palette_lab):
+            dist = np.sqrt(np.sum((lab - ref) ** 2, axis=-1))
+            closer = dist < best_dist
+            best_index[closer] = i
+            best_dist[closer] = dist[closer]
+        index[r] = best_index.reshape(levels, levels)
+    return index
+
+
+class ColorLookupTable:
+    """
+    팔레트별 RGB 조회 테이블. 처음 조회할 때 캐시 파일을 메모리 매핑으로 열고, 없으면 생성하여 저장합니다.
+    캐시 디렉터리에 쓸 수 없으면 메모리에서만 사용합니다.
+    """
+
+    def __init__(self, palette, bits=COLOR_LUT_BITS, cache_dir=COLOR_LUT_DIR):
+        self.names = list(palette)
+        self.palette = dict(palette)
+        self.bits = bits
+        self.shift = 8 - bits
+        self.cache_dir = cache_dir
+        self.key = palette_hash(self.palette, bits)
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _path(self):
+        return os.path.join(self.cache_dir, f"color_lut_{self.bits}bit_{self.key}_index.npy")
+
+    def _load(self):
+        with self._lock:
+            if self._index is not None:
+                return
+            index_path = self._path()
+            try:
+                index = np.load(index_path, mmap_mode='r')
+            except (OSError, ValueError):
+                logging.info(f"색상 조회 테이블을 생성합니다: {os.path.basename(index_path)}")
+                index = build_color_lut(self.palette, self.bits)
+                self._save(index, index_path)
+            self._index = index
+
+    def _save(self, index, index_path):
+        """ 임시 파일에 쓴 뒤 교체하여, 동시에 시작한 워커가 반쯤 쓰인 파일을 읽지 않도록 합니다. """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, index)
+            os.replace(tmp_path, index_path)
+        except OSError as e:
+            logging.warning(f"색상 조회 테이블을 저장하지 못했습니다 (메모리에서만 사용): {e}")
+
+    def _cells(self, rgb):
+        rgb = np.asarray(rgb)
+        quantized = np.clip(rgb, 0, 255).astype(np.uint8) >> self.shift
+        return quantized[..., 0], quantized[..., 1], quantized[..., 2]
+
+    def lookup_index(self, rgb):
+        """ (..., 3) RGB 배열 → (...) 기준 색상 인덱스 배열 """
+        self._load()
+        return np.asarray(self._index[self._cells(rgb)])
@@ -1,8 +1,25 @@
+import io
 import pandas as pd
 import numpy as np
 import re
 from fuzzywuzzy import fuzz
 
+from imprint_index import ImprintNgramIndex, ImprintKeyIndex, IMPRINT_CANDIDATE_LIMIT, IMPRINT_CANONICAL_KEYS
+from pill_snapshot import PILL_DB_SNAPSHOT, load_snapshot, read_source, save_snapshot
+
+# 점수 배점 (calculate_score와 PillIndex가 함께 사용)
+MAX_SHAPE_SCORE = 25
+MAX_COLOR_SCORE = 25
+MAX_IMPRINT_SCORE = 50
+# 정규화 후 95% 이상 일치하는 각인 보너스
+IMPRINT_MATCH_BONUS = 20
+# 인식된 각인도 DB 각인도 없을 때의 각인 점수
+NO_IMPRINT_SCORE = 10
+# 반환할 최대 후보 수
+TOP_K = 10
+# OCR 신뢰도 0일 때의 각인 점수 가중치 (신뢰도 100이면 1. 신뢰도를 모르면 가중치를 적용하지 않음)
+IMPRINT_CONFIDENCE_FLOOR = 0.5
+
 # 색상명과 RGB 값 매핑 (수정/추가 가능)
 COLOR_RGB_MAP = {
     '하양': [255, 255, 255],  '검정': [0, 0, 0],        '회색': [149, 165, 166],
@@ -62,17 +79,63 @@ def calculate_color_similarity_score(identified_colors_str, db_colors_str):
     return total_max_similarity / len(identified_colors)
 
 
-def load_database(db_path):
+def build_color_similarity_matrix(vocabulary):
     """
-    CSV 데이터베이스를 로드하고, 모든 데이터를 문자열로 변환하여 반환
+    색상 토큰 쌍별 유사도 행렬 (calculate_color_similarity_score의 색상 쌍 유사도와 같은 값).
+    같은 토큰은 1, 다르면 max(0, 1 - 거리 / EFFECTIVE_COLOR_DIST), 맵에 없는 색상과는 0.
+    """
+    size = len(vocabulary)
+    similarity = np.zeros((size, size), dtype=np.float64)
+    for i, color1 in enumerate(vocabulary):
+        for j, color2 in enumerate(vocabulary):
+            if color1 == color2:
+                similarity[i, j] = 1.0
+            else:
+                distance = get_color_distance(color1, color2)
+                similarity[i, j] = max(0, 1 - (distance / EFFECTIVE_COLOR_DIST))
+    return similarity
+
+
+def read_database_columns(db_path):
+    """
+    CSV를 파싱하고 모든 데이터를 문자열로 변환하여 (열 이름 → 값 배열, DB 버전, 원본 지문)을 반환합니다.
+    버전과 지문은 실제로 파싱한 내용에서 계산합니다. (파싱 도중 CSV가 교체되어도 스냅샷이 새 파일로 오인되지 않도록)
+    """
+    data, source = read_source(db_path)
+    df = pd.read_csv(io.BytesIO(data), encoding='cp949')
+    # 모든 열의 데이터를 문자열 타입으로 변환하여 타입 오류 방지
+    for col in df.columns:
+        df[col] = df[col].astype(str)
+    return {col: df[col].to_numpy(dtype=object) for col in df.columns}, source['sha1'][:12], source
+
+
+def build_database_index(db_path, previous=None):
+    """ CSV로 PillIndex를 만듭니다. (previous를 주면 각인 색인을 증분으로 갱신) """
+    columns, version, source = read_database_columns(db_path)
+    return PillIndex(columns, previous=previous, version=version, source=source)
+
+
+def load_database(db_path, use_snapshot=PILL_DB_SNAPSHOT):
+    """
+    CSV 데이터베이스를 로드하고, 모든 데이터를 문자열로 변환하여 매칭용 PillIndex로 반환
+    (PillIndex는 행 dict 리스트처럼 len/반복/인덱싱도 지원)
+    use_snapshot이면 유효한 바이너리 스냅샷을 메모리 매핑으로 읽고, 없으면 CSV에서 만든 뒤 스냅샷을 저장합니다.
     """
     try:
-        df = pd.read_csv(db_path, encoding='cp949')
-        # 모든 열의 데이터를 문자열 타입으로 변환하여 타입 오류 방지
-        for col in df.columns:
-            df[col] = df[col].astype(str)
-        print(f"'{db_path}' 데이터베이스를 성공적으로 불러왔습니다.")
-        return df.to_dict('records')
+        snapshot = load_snapshot(db_path) if use_snapshot else None
+        if snapshot is not None:
+            pill_index = PillIndex.from_snapshot(*snapshot)
+            print(f"'{db_path}' 데이터베이스를 스냅샷에서 불러왔습니다. ({len(pill_index)}개)")
+            return pill_index
+
+        pill_index = build_database_index(db_path)
+        print(f"'{db_path}' 데이터베이스를 성공적으로 불러왔습니다. ({len(pill_index)}개)")
+        if use_snapshot:
+            try:
+                save_snapshot(db_path, *pill_index.to_snapshot(), source=pill_index.source)
+            except OSError as e:
+                print(f"  - [경고] DB 스냅샷을 저장하지 못했습니다: {e}")
+        return pill_index
     except Exception as e:
         print(f"데이터베이스 로딩 오류: {e}")
         return None
@@ -89,15 +152,55 @@ def normalize_imprint(text):
     return re.sub(r"[^A-Z0-9가-힣]", "", text_cleaned)
 
 
-def calculate_score(row, shape_probabilities, colors, imprint):
+def calculate_imprint_score(imprint_recognized, imprint1_db, imprint2_db):
+    """ 정규화된 인식 각인과 정규화된 DB 각인(앞/뒤)으로 각인 점수를 계산합니다. """
+    imprint_score = 0
+    db_imprint_full = (imprint1_db + imprint2_db).strip()
+
+    if imprint_recognized:
+        # 3-1. 탐지된 각인이 있는 경우
+        if db_imprint_full:
+            # DB에도 각인이 있으면 유사도 계산
+            similarity1 = fuzz.ratio(imprint_recognized, imprint1_db) if imprint1_db else 0
+            similarity2 = fuzz.ratio(imprint_recognized, imprint2_db) if imprint2_db else 0
+            similarity_full = fuzz.ratio(imprint_recognized, db_imprint_full)
+
+            max_similarity = max(similarity1, similarity2, similarity_full)
+            imprint_score = (max_similarity / 100.0) * MAX_IMPRINT_SCORE  # MAX 45점
+
+            # --- 각인 일치도 보너스 ---
+            # 정규화 후 95% 이상 일치하면 보너스
+            if max_similarity > 95:
+                imprint_score += IMPRINT_MATCH_BONUS  # 20점 추가
+
+        else:
+            # (탐지 각인은 있으나 DB 각인이 없으면 0점)
+            imprint_score = 0
+
+    elif not db_imprint_full:
+        # 3-2. 탐지된 각인도 없고, DB 각인도 없으면 10점 보너스
+        imprint_score = NO_IMPRINT_SCORE
+
+    # (3-3. 탐지 각인은 없으나 DB 각인이 있으면 0점 -> 기본값)
+
+    return imprint_score
+
+
+def imprint_confidence_weight(imprint_confidence):
+    """ OCR 신뢰도(0~100)에 따른 각인 점수 가중치 (None이면 1) """
+    if imprint_confidence is None:
+        return 1.0
+    confidence = min(max(float(imprint_confidence), 0.0), 100.0)
+    return IMPRINT_CONFIDENCE_FLOOR + (1.0 - IMPRINT_CONFIDENCE_FLOOR) * confidence / 100.0
+
+
+def calculate_score(row, shape_probabilities, colors, imprint, imprint_confidence=None):
     """
     데이터베이스의 약 정보와 분석된 정보를 비교하여 유사도 점수를 계산
     (점수가 높을수록 더 유사함)
+    imprint_confidence(OCR 신뢰도 0~100)를 주면 인식된 각인의 점수를 신뢰도에 따라 낮춰 반영
     """
     score = 0
-    MAX_SHAPE_SCORE = 25
-    MAX_COLOR_SCORE = 25
-    MAX_IMPRINT_SCORE = 50
 
     # 1. 모양 점수: AI의 예측 확률에 따라 가중치 부여
     shape_score = 0
@@ -115,48 +218,22 @@ def calculate_score(row, shape_probabilities, colors, imprint):
     # --- 각인 점수 계산 로직 수정 (정규화 적용) ---
     # 1. AI가 인식한 각인을 정규화
     imprint_recognized = normalize_imprint(imprint)
-    imprint_score = 0
 
     # 2. DB의 각인 정보를 정규화
     imprint1_db = normalize_imprint(row.get('text', ''))
     imprint2_db = normalize_imprint(row.get('text2', ''))
-    db_imprint_full = (imprint1_db + imprint2_db).strip()
-
+    imprint_score = calculate_imprint_score(imprint_recognized, imprint1_db, imprint2_db)
     if imprint_recognized:
-        # 3-1. 탐지된 각인이 있는 경우
-        if db_imprint_full:
-            # DB에도 각인이 있으면 유사도 계산
-            similarity1 = fuzz.ratio(imprint_recognized, imprint1_db) if imprint1_db else 0
-            similarity2 = fuzz.ratio(imprint_recognized, imprint2_db) if imprint2_db else 0
-            similarity_full = fuzz.ratio(imprint_recognized, db_imprint_full)
-
-            max_similarity = max(similarity1, similarity2, similarity_full)
-            imprint_score = (max_similarity / 100.0) * MAX_IMPRINT_SCORE  # MAX 45점
-
-            # --- 각인 일치도 보너스 ---
-            # 정규화 후 95% 이상 일치하면 보너스
-            if max_similarity > 95:
-                imprint_score += 20  # 20점 추가
-
-        else:
-            # (탐지 각인은 있으나 DB 각인이 없으면 0점)
-            imprint_score = 0
-
-    elif not db_imprint_full:
-        # 3-2. 탐지된 각인도 없고, DB 각인도 없으면 10점 보너스
-        imprint_score = 10
-
-    # (3-3. 탐지 각인은 없으나 DB 각인이 있으면 0점 -> 기본값)
+        imprint_score *= imprint_confidence_weight(imprint_confidence)
 
     score += imprint_score
     return score
 
 
-def find_best_match(pill_db, identified_shape_info, identified_colors, identified_imprint):
+def parse_shape_probabilities(identified_shape_info):
     """
-    분석된 정보를 바탕으로 데이터베이스에서 가장 일치하는 알약 후보를 찾음.
+    모양 분석 결과(문자열/딕셔너리/(모양, 신뢰도) 리스트)를 {모양: 확률(%)} 딕셔너리로 변환합니다.
     """
-
     # 문자열, 딕셔너리 등 어떤 형태로 들어와도 처리 가능하도록 파싱 로직 추가
     shape_probabilities = {}
     if isinstance(identified_shape_info, str) and identified_shape_info:
@@ -171,10 +248,445 @@ def find_best_match(pill_db, identified_shape_info, identified_colors, identifie
                 continue  # 파싱에 실패하는 경우(예: '(A)...' 등)는 무시
     elif isinstance(identified_shape_info, dict):
         shape_probabilities = identified_shape_info
+    elif isinstance(identified_shape_info, list):
+        # classify_shapes_batch의 [(모양, 신뢰도 0~1), ...] 형식을 백분율 딕셔너리로 변환
+        shape_probabilities = {shape: float(conf) * 100 for shape, conf in identified_shape_info}
 
     # 모양 정보가 없으면(파싱 실패) 빈 딕셔너리 유지
     if not shape_probabilities:
         print("  - [경고] 모양 확률 정보가 파싱되지 않았습니다. 모양 점수가 0이 됩니다.")
+    return shape_probabilities
+
+
+def _normalized_imprints(pill_index):
+    """
+    인덱스의 원본 각인 문자열 → 정규화 각인 dict (앞, 뒤 열 각각).
+    normalize_imprint를 다시 호출하지 않고 행별 각인 쌍 코드에서 역으로 구합니다.
+    """
+    fronts = np.array([front for front, _ in pill_index.imprint_pairs], dtype=object)
+    backs = np.array([back for _, back in pill_index.imprint_pairs], dtype=object)
+    normalized1 = np.full(len(pill_index.text_values), None, dtype=object)
+    normalized2 = np.full(len(pill_index.text2_values), None, dtype=object)
+    normalized1[pill_index.text_codes] = fronts[pill_index.imprint_pair_codes]
+    normalized2[pill_index.text2_codes] = backs[pill_index.imprint_pair_codes]
+    return ({value: n for value, n in zip(pill_index.text_values, normalized1) if n is not None},
+            {value: n for value, n in zip(pill_index.text2_values, normalized2) if n is not None})
+
+
+def _format_pill_info(row):
+    imprint_display = f"앞:{row.get('text', '')}/뒤:{row.get('text2', '')}"
+    return f"{row['name']} ({row['shape']}, {row['color']}, {imprint_display})"
+
+
+class PillIndex:
+    """
+    알약 DB를 열(column) 단위 배열로 보관하고, 매칭에 필요한 값을 로딩 시점에 미리 계산한 인덱스.
+      - 모양/색상/원본 각인 문자열: 고유값 테이블 + 행별 코드 배열 (필터와 점수는 고유값마다 한 번만 계산)
+      - 정규화된 각인(앞/뒤) 쌍: 고유값 테이블 + 행별 코드 배열 (normalize_imprint를 질의마다 다시 하지 않음)
+      - 색상 문자열별 색상 토큰 포함 행렬 + 토큰 간 유사도 행렬 (색상 점수를 배열 연산으로 계산)
+      - 각인 쌍의 n-gram 역색인과 OCR 혼동 문자를 접은 정규 키 해시 맵
+    행 dict 리스트처럼 len(), 반복, 인덱싱을 지원합니다.
+    """
+
+    def __init__(self, columns, previous=None, version=None, source=None):
+        """
+        columns: 열 이름 → 값 배열. previous(이전 PillIndex)를 주면 고유값 테이블을 다시 정렬하지 않고 이전 순서에
+        새 값만 덧붙이며, 각인 정규화와 각인 색인도 새 값/새 각인 쌍만 계산합니다. (DB 증분 갱신용)
+        행별 코드 배열은 행 순서가 바뀌었을 수 있으므로 항상 전체 행에 대해 다시 만듭니다. (해시 조회만 수행)
+        version: 결과에 함께 돌려줄 DB 버전 (원본 CSV 해시 등)
+        source: 인덱스를 만든 CSV 내용의 지문 (스냅샷 저장 시 유효성 확인용, read_source)
+        """
+        self.version = version
+        self.source = source
+        # 결측값도 문자열('nan')로 통일 (pandas 버전에 따라 astype(str)이 NaN을 그대로 둘 수 있음)
+        self.columns = {name: np.array([str(v) for v in values], dtype=object) for name, values in columns.items()}
+        self.size = len(next(iter(self.columns.values()))) if self.columns else 0
+        self._records = None
+
+        def previous_values(name):
+            return getattr(previous, name) if previous is not None else None
+
+        self.shape_values, self.shape_codes = self._encode(self.column('shape'), previous_values('shape_values'))
+        self.color_values, self.color_codes = self._encode(self.column('color'), previous_values('color_values'))
+
+        # 색상 어휘: 기준 색상 + DB에만 있는 토큰 ('nan' 등). 색상 문자열마다 포함된 토큰을 True로 표시
+        db_tokens = sorted({token for value in self.color_values for token in value.split()} - set(COLOR_RGB_MAP))
+        self.color_vocab = list(COLOR_RGB_MAP) + db_tokens
+        self.color_token_ids = {token: i for i, token in enumerate(self.color_vocab)}
+        self.color_similarity = build_color_similarity_matrix(self.color_vocab)
+        self.color_token_matrix = np.zeros((len(self.color_values), len(self.color_vocab)), dtype=bool)
+        for i, value in enumerate(self.color_values):
+            for token in value.split():
+                self.color_token_matrix[i, self.color_token_ids[token]] = True
+
+        # 후보 필터용 원본 각인 문자열 (str(row.get('text', ''))와 같은 값)
+        self.text_values, self.text_codes = self._encode(self.column('text'), previous_values('text_values'))
+        self.text2_values, self.text2_codes = self._encode(self.column('text2'), previous_values('text2_values'))
+
+        # 점수 계산용 정규화 각인 쌍 (이전 인덱스에 있던 각인 문자열은 정규화 결과를 재사용)
+        known1, known2 = _normalized_imprints(previous) if previous is not None else ({}, {})
+        normalized1 = [known1[v] if v in known1 else normalize_imprint(v) for v in self.text_values]
+        normalized2 = [known2[v] if v in known2 else normalize_imprint(v) for v in self.text2_values]
+        pairs = np.array(
+            [f"{normalized1[a]}\x00{normalized2[b]}" for a, b in zip(self.text_codes, self.text2_codes)], dtype=object)
+        previous_pair_values = (
+            [f"{front}\x00{back}" for front, back in previous.imprint_pairs] if previous is not None else None)
+        pair_values, self.imprint_pair_codes = self._encode(pairs, previous_pair_values)
+        self.imprint_pairs = [tuple(value.split('\x00')) for value in pair_values]
+        previous_pairs = previous.imprint_pairs if previous is not None else None
+        self.imprint_ngrams = ImprintNgramIndex.build(
+            self.imprint_pairs, previous.imprint_ngrams if previous is not None else None, previous_pairs)
+        self.imprint_keys = ImprintKeyIndex.build(
+            self.imprint_pairs, previous.imprint_keys if previous is not None else None, previous_pairs)
+
+    def to_snapshot(self):
+        """ 스냅샷으로 저장할 (배열, 문자열 테이블, 메타) """
+        column_names = list(self.columns)
+        arrays = {
+            'shape_codes': self.shape_codes, 'color_codes': self.color_codes,
+            'text_codes': self.text_codes, 'text2_codes': self.text2_codes,
+            'imprint_pair_codes': self.imprint_pair_codes,
+            'color_similarity': self.color_similarity, 'color_token_matrix': self.color_token_matrix,
+            'ngram_grams': self.imprint_ngrams.grams, 'ngram_indptr': self.imprint_ngrams.indptr,
+            'ngram_field_ids': self.imprint_ngrams.field_ids, 'ngram_field_docs': self.imprint_ngrams.field_docs,
+            'ngram_field_gram_counts': self.imprint_ngrams.field_gram_counts,
+            'key_keys': self.imprint_keys.keys, 'key_indptr': self.imprint_keys.indptr,
+            'key_doc_ids': self.imprint_keys.doc_ids,
+        }
+        strings = {f"column_{i}": self.columns[name] for i, name in enumerate(column_names)}
+        strings.update({
+            'shape_values': self.shape_values, 'color_values': self.color_values, 'color_vocab': self.color_vocab,
+            'text_values': self.text_values, 'text2_values': self.text2_values,
+            'imprint_fronts': [front for front, _ in self.imprint_pairs],
+            'imprint_backs': [back for _, back in self.imprint_pairs],
+        })
+        return arrays, strings, {'size': self.size, 'column_names': column_names, 'version': self.version}
+
+    @classmethod
+    def from_snapshot(cls, arrays, strings, meta):
+        """
+        스냅샷에서 CSV 파싱과 사전 계산 없이 인덱스를 복원합니다.
+        전체 열은 StringTable로 두어 필요한 행만 디코딩하고, 고유값 테이블만 바로 디코딩합니다.
+        """
+        index = cls.__new__(cls)
+        index.version = meta.get('version')
+        index.source = None
+        index.columns = {name: strings[f"column_{i}"] for i, name in enumerate(meta['column_names'])}
+        index.size = meta['size']
+        index._records = None
+
+        index.shape_values, index.shape_codes = strings['shape_values'].tolist(), arrays['shape_codes']
+        index.color_values, index.color_codes = strings['color_values'].tolist(), arrays['color_codes']
+        index.color_vocab = strings['color_vocab'].tolist()
+        index.color_token_ids = {token: i for i, token in enumerate(index.color_vocab)}
+        index.color_similarity = arrays['color_similarity']
+        index.color_token_matrix = arrays['color_token_matrix']
+
+        index.text_values, index.text_codes = strings['text_values'].tolist(), arrays['text_codes']
+        index.text2_values, index.text2_codes = strings['text2_values'].tolist(), arrays['text2_codes']
+        index.imprint_pair_codes = arrays['imprint_pair_codes']
+        index.imprint_pairs = list(zip(strings['imprint_fronts'].tolist(), strings['imprint_backs'].tolist()))
+        index.imprint_ngrams = ImprintNgramIndex(
+            arrays['ngram_grams'], arrays['ngram_indptr'], arrays['ngram_field_ids'], arrays['ngram_field_docs'],
+            arrays['ngram_field_gram_counts'], len(index.imprint_pairs))
+        index.imprint_keys = ImprintKeyIndex(arrays['key_keys'], arrays['key_indptr'], arrays['key_doc_ids'])
+        return index
+
+    @classmethod
+    def from_records(cls, records):
+        """ 행 dict 리스트로 인덱스를 만듭니다. """
+        records = list(records)
+        names = list(records[0].keys()) if records else ['name', 'shape', 'color', 'text', 'text2']
+        return cls({name: [row.get(name, '') for row in records] for name in names})
+
+    @staticmethod
+    def _encode(values, previous_values=None):
+        """
+        (고유값 테이블, 행별 코드 배열). previous_values(이전 인덱스의 테이블)를 주면 정렬하지 않고
+        이전 테이블 중 아직 쓰이는 값의 순서를 유지한 채 새 값을 뒤에 붙입니다.
+        """
+        if previous_values is None:
+            unique_values, codes = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+            return list(unique_values), codes.astype(np.int32).reshape(-1)
+        present = dict.fromkeys(values)
+        table = [value for value in previous_values if value in present]
+        known = set(table)
+        table.extend(value for value in present if value not in known)
+        positions = {value: i for i, value in enumerate(table)}
+        return table, np.fromiter((positions[value] for value in values), dtype=np.int32, count=len(values))
+
+    def column(self, name):
+        """ 열 배열. 없는 열은 빈 문자열 배열 (row.get(name, '')과 같은 동작) """
+        if name in self.columns:
+            return self.columns[name]
+        return np.full(self.size, '', dtype=object)
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    @property
+    def records(self):
+        """ 행 dict 리스트 (처음 접근할 때 생성) """
+        if self._records is None:
+            names = list(self.columns)
+            self._records = [dict(zip(names, values)) for values in zip(*(self.columns[n] for n in names))]
+        return self._records
+
+    def row(self, i):
+        return {name: values[i] for name, values in self.columns.items()}
+
+    def candidate_mask(self, shape_probabilities, identified_colors, identified_imprint):
+        """
+        1차 후보 필터 (모양 일치 / 색상 부분 문자열 일치 / 원본 각인 부분 문자열 일치 중 하나라도 만족).
+        후보가 없으면 전체 행을 후보로 합니다.
+        """
+        shape_match = np.array([v in shape_probabilities for v in self.shape_values], dtype=bool)
+        # identified_colors가 비어있을 수 있으므로 split() 전 확인
+        color_list = identified_colors.split() if identified_colors else []
+        color_match = np.array([any(color in v for color in color_list) for v in self.color_values], dtype=bool)
+        mask = shape_match[self.shape_codes] | color_match[self.color_codes]
+
+        if identified_imprint:
+            text_match = np.array([identified_imprint in v for v in self.text_values], dtype=bool)
+            text2_match = np.array([identified_imprint in v for v in self.text2_values], dtype=bool)
+            mask |= text_match[self.text_codes] | text2_match[self.text2_codes]
+
+        if not mask.any():
+            print("  - [알림] 1차 필터링 후보가 없습니다. 전체 DB를 대상으로 점수를 계산합니다.")
+            mask[:] = True
+        return mask
+
+    def color_scores(self, identified_colors):
+        """
+        모든 색상 문자열에 대한 calculate_color_similarity_score 값을 한 번에 계산합니다.
+        (인식된 색상마다 DB 색상 중 최대 유사도를 구해 평균. 합산 순서도 원래 함수와 같음)
+        """
+        identified = set(identified_colors.split())
+        if not identified:
+            return np.zeros(len(self.color_values), dtype=np.float64)
+
+        total_max_similarity = np.zeros(len(self.color_values), dtype=np.float64)
+        for id_color in identified:
+            token_id = self.color_token_ids.get(id_color)
+            if token_id is None:
+                continue  # 어휘에 없는 색상은 어떤 DB 색상과도 유사도 0
+            # 포함되지 않은 토큰은 0으로 가려서 최댓값 계산 (유사도는 0 이상이므로 결과가 같음)
+            total_max_similarity += np.where(self.color_token_matrix, self.color_similarity[token_id], 0.0).max(axis=1)
+
+        # DB 색상이 비어 있으면 0점
+        has_colors = self.color_token_matrix.any(axis=1)
+        return np.where(has_colors, total_max_similarity / len(identified), 0.0)
+
+    def score_rows(self, rows, shape_probabilities, identified_colors, identified_imprint,
+                   candidate_limit=IMPRINT_CANDIDATE_LIMIT, key_matched_codes=None, imprint_confidence=None):
+        """
+        rows(행 번호 배열)의 점수를 calculate_score와 같은 순서/값으로 계산합니다.
+        후보 각인 쌍이 candidate_limit보다 많으면 n-gram 색인으로 고른 각인만 fuzz.ratio로 정확히 계산하고,
+        나머지 각인은 n-gram 겹침으로 추정한 유사도로 점수를 매깁니다. (candidate_limit=0이면 항상 전체 계산)
+        key_matched_codes(정규 키가 일치한 각인 쌍)는 색인 선택과 관계없이 항상 정확히 계산합니다.
+        """
+        shape_scores = self.shape_scores(shape_probabilities)
+        color_scores = self.color_scores(identified_colors) * MAX_COLOR_SCORE
+        pair_codes = self.imprint_pair_codes[rows]
+        imprint_scores = self.imprint_scores(np.unique(pair_codes), identified_imprint, candidate_limit,
+                                             key_matched_codes, imprint_confidence=imprint_confidence)
+        return shape_scores[self.shape_codes[rows]] + color_scores[self.color_codes[rows]] + imprint_scores[pair_codes]
+
+    def shape_scores(self, shape_probabilities):
+        """ 모양 고유값별 모양 점수 """
+        return np.array(
+            [MAX_SHAPE_SCORE * (shape_probabilities[v] / 100.0) if v in shape_probabilities else 0
+             for v in self.shape_values], dtype=np.float64)
+
+    def imprint_scores(self, codes, identified_imprint, candidate_limit=IMPRINT_CANDIDATE_LIMIT,
+                       key_matched_codes=None, cache=None, imprint_confidence=None):
+        """
+        각인 쌍별 각인 점수. 후보에 등장하는 고유 각인 쌍(codes)마다 한 번만 계산합니다.
+        cache(dict)를 주면 같은 인식 각인의 fuzz.ratio 결과를 여러 질의 사이에서 재사용합니다.
+        인식된 각인이 있고 imprint_confidence가 주어지면 calculate_score처럼 신뢰도 가중치를 곱합니다.
+        """
+        imprint_scores = self._unweighted_imprint_scores(codes, identified_imprint, candidate_limit,
+                                                         key_matched_codes, cache)
+        if imprint_confidence is not None and normalize_imprint(identified_imprint):
+            imprint_scores *= imprint_confidence_weight(imprint_confidence)
+        return imprint_scores
+
+    def _unweighted_imprint_scores(self, codes, identified_imprint, candidate_limit, key_matched_codes, cache):
+        imprint_scores = np.zeros(len(self.imprint_pairs), dtype=np.float64)
+        imprint_recognized = normalize_imprint(identified_imprint)
+        if not imprint_recognized:
+            # 인식된 각인이 없으면 DB 각인 유무만으로 점수가 정해짐 (calculate_imprint_score와 같은 값)
+            imprint_scores[codes] = np.where(self.imprint_pair_empty[codes], NO_IMPRINT_SCORE, 0)
+            return imprint_scores
+        if candidate_limit and len(codes) > candidate_limit:
+            retrieved, estimated_similarity = self.imprint_ngrams.search(imprint_recognized, candidate_limit)
+            imprint_scores = estimated_similarity / 100.0 * MAX_IMPRINT_SCORE
+            exact_codes = np.intersect1d(codes, retrieved)
+            if key_matched_codes is not None:
+                # 정규 키 일치 각인은 혼동 문자만 같은 각인(예: '5'와 'S')도 있으므로 항상 정확히 계산
+                exact_codes = np.union1d(exact_codes, np.intersect1d(codes, key_matched_codes))
+            codes = exact_codes
+
+        # 인식 각인별 (각인 쌍 점수, 계산 여부) 배열
+        if cache is None:
+            cache = {}
+        if imprint_recognized not in cache:
+            cache[imprint_recognized] = (np.zeros(len(self.imprint_pairs), dtype=np.float64),
+                                         np.zeros(len(self.imprint_pairs), dtype=bool))
+        exact_scores, computed = cache[imprint_recognized]
+        for code in codes[~computed[codes]]:
+            exact_scores[code] = calculate_imprint_score(imprint_recognized, *self.imprint_pairs[code])
+        computed[codes] = True
+        imprint_scores[codes] = exact_scores[codes]
+        return imprint_scores
+
+    @property
+    def imprint_pair_empty(self):
+        """ 각인 쌍별로 앞/뒤 각인이 모두 비어 있는지 (처음 접근할 때 계산) """
+        if getattr(self, '_imprint_pair_empty', None) is None:
+            self._imprint_pair_empty = np.array([not (front + back) for front, back in self.imprint_pairs], dtype=bool)
+        return self._imprint_pair_empty
+
+    def top_k(self, rows, scores, k=TOP_K):
+        """
+        점수가 0 초과인 행 중 상위 k개를 (행 번호, 점수) 리스트로 반환합니다.
+        동점이면 DB 순서가 앞선 행이 먼저 옵니다 (안정 정렬과 같은 결과).
+        """
+        positive = scores > 0
+        rows, scores = rows[positive], scores[positive]
+        if len(rows) > k:
+            kth_score = scores[np.argpartition(-scores, k - 1)[:k]].min()
+            above = scores > kth_score
+            tied = np.flatnonzero(scores == kth_score)[:k - np.count_nonzero(above)]
+            keep = np.concatenate([np.flatnonzero(above), tied])
+            rows, scores = rows[keep], scores[keep]
+        order = np.lexsort((rows, -scores))
+        return [(int(rows[i]), float(scores[i])) for i in order]
+
+    def match(self, shape_probabilities, identified_colors, identified_imprint, k=TOP_K,
+              candidate_limit=IMPRINT_CANDIDATE_LIMIT, use_imprint_keys=IMPRINT_CANONICAL_KEYS, imprint_confidence=None):
+        """
+        후보 필터 → 벡터화 점수 → 상위 k개 선택 → 선택된 행만 표시 문자열 생성.
+        candidate_limit으로 각인 계산을 줄일 때, 인식된 각인의 정규 키가 일치한 DB 각인은 항상 정확히 계산합니다.
+        imprint_confidence: 각인 OCR 신뢰도(0~100). 주어지면 각인 점수에 신뢰도 가중치를 적용
+        """
+        key_matched_codes = self._key_matched_codes(identified_imprint, use_imprint_keys, candidate_limit)
+        rows = np.flatnonzero(self.candidate_mask(shape_probabilities, identified_colors, identified_imprint))
+        scores = self.score_rows(rows, shape_probabilities, identified_colors, identified_imprint, candidate_limit,
+                                 key_matched_codes, imprint_confidence)
+        return self._format_matches(self.top_k(rows, scores, k))
+
+    def match_batch(self, queries, k=TOP_K, candidate_limit=IMPRINT_CANDIDATE_LIMIT,
+                    use_imprint_keys=IMPRINT_CANONICAL_KEYS):
+        """
+        여러 알약 질의 [(모양 확률, 색상, 각인[, 각인 신뢰도]), ...]를 한 번에 매칭하여 질의별 상위 k개 리스트를 반환합니다.
+        (질의마다 match를 호출한 것과 같은 결과)
+          - 후보 필터를 (질의 × 행) 마스크로 만들고, 어느 질의에든 후보인 행의 코드 배열을 한 번만 모음
+          - 모양/색상/각인 점수를 (질의 × 고유값) 표로 계산해 (질의 × 후보 행) 점수 행렬을 한 번에 조회
+          - 완전히 같은 질의(같은 알약 여러 개)는 한 번만 계산
+          - 같은 색상 문자열은 한 번만 계산하고, 같은 각인의 fuzz.ratio 결과는 질의 간에 재사용
+        """
+        if not queries:
+            return []
+        # 각인 신뢰도가 없는 질의는 None으로 채움
+        queries = [tuple(query) + (None,) * (4 - len(query)) for query in queries]
+        slots = {}
+        query_slots = [
+            slots.setdefault((tuple(sorted(shape_probabilities.items())), identified_colors, identified_imprint,
+                              imprint_confidence), len(slots))
+            for shape_probabilities, identified_colors, identified_imprint, imprint_confidence in queries
+        ]
+        if len(slots) < len(queries):
+            unique_queries = [None] * len(slots)
+            for query, slot in zip(queries, query_slots):
+                unique_queries[slot] = query
+            results = self.match_batch(unique_queries, k, candidate_limit, use_imprint_keys)
+            return [[dict(candidate) for candidate in results[slot]] for slot in query_slots]
+
+        masks = np.zeros((len(queries), self.size), dtype=bool)
+        key_matched = []
+        for q, (shape_probabilities, identified_colors, identified_imprint, _) in enumerate(queries):
+            key_matched_codes = self._key_matched_codes(identified_imprint, use_imprint_keys, candidate_limit)
+            masks[q] = self.candidate_mask(shape_probabilities, identified_colors, identified_imprint)
+            key_matched.append(key_matched_codes)
+
+        # 공통 후보 행과 코드 배열 (한 번만 모음)
+        rows = np.flatnonzero(masks.any(axis=0))
+        masks = masks[:, rows]
+        pair_codes = self.imprint_pair_codes[rows]
+
+        color_cache, imprint_cache = {}, {}  # 같은 색상 문자열/인식 각인은 질의 간에 재사용
+        for identified_colors in dict.fromkeys(query[1] for query in queries):
+            color_cache[identified_colors] = self.color_scores(identified_colors) * MAX_COLOR_SCORE
+        shape_table = np.stack([self.shape_scores(query[0]) for query in queries])
+        color_table = np.stack([color_cache[query[1]] for query in queries])
+        imprint_table = np.stack([
+            self.imprint_scores(np.unique(pair_codes[masks[q]]), identified_imprint, candidate_limit,
+                                key_matched[q], imprint_cache, imprint_confidence)
+            for q, (_, _, identified_imprint, imprint_confidence) in enumerate(queries)
+        ])
+
+        # (질의 × 후보 행) 점수 행렬 (score_rows와 같은 합산 순서)
+        scores = (shape_table[:, self.shape_codes[rows]] + color_table[:, self.color_codes[rows]]
+                  + imprint_table[:, pair_codes])
+        return [self._format_matches(self.top_k(rows[masks[q]], scores[q, masks[q]], k)) for q in range(len(queries))]
+
+    def _key_matched_codes(self, identified_imprint, use_imprint_keys, candidate_limit):
+        """
+        인식된 각인의 정규 키가 일치한 각인 쌍 번호 배열 (사용하지 않거나 일치가 없으면 None).
+        전체 계산(candidate_limit=0)에서는 모든 각인을 정확히 계산하므로 조회하지 않습니다.
+        """
+        imprint_recognized = normalize_imprint(identified_imprint) if identified_imprint else ""
+        if use_imprint_keys and candidate_limit and imprint_recognized:
+            hit_codes = self.imprint_keys.lookup(imprint_recognized)
+            if len(hit_codes):
+                return hit_codes
+        return None
+
+    def _format_matches(self, top_rows):
+        return [
+            {'pill_info': _format_pill_info(self.row(i)), 'score': score, 'db_version': self.version}
+            for i, score in top_rows
+        ]
+
+
+def find_best_match(pill_db, identified_shape_info, identified_colors, identified_imprint, imprint_confidence=None):
+    """
+    분석된 정보를 바탕으로 데이터베이스에서 가장 일치하는 알약 후보를 찾음.
+    pill_db는 load_database가 반환한 PillIndex (행 dict 리스트를 넘기면 인덱스를 만들어 사용)
+    imprint_confidence: 각인 OCR 신뢰도(0~100, get_imprint_with_confidence). 주어지면 각인 점수에 가중치 적용
+    """
+    shape_probabilities = parse_shape_probabilities(identified_shape_info)
+    if not isinstance(pill_db, PillIndex):
+        pill_db = PillIndex.from_records(pill_db)
+    return pill_db.match(shape_probabilities, identified_colors, identified_imprint,
+                         imprint_confidence=imprint_confidence)
+
+
+def find_best_match_batch(pill_db, queries):
+    """
+    한 이미지에서 나온 여러 알약을 한 번에 매칭합니다.
+    queries: [(모양 분석 결과, 색상, 각인[, 각인 신뢰도]), ...] (find_best_match의 인자와 같은 형식)
+    반환값: 질의 순서대로 후보 리스트 (각각 find_best_match 결과와 같음)
+    """
+    if not isinstance(pill_db, PillIndex):
+        pill_db = PillIndex.from_records(pill_db)
+    parsed = [(parse_shape_probabilities(query[0]),) + tuple(query[1:]) for query in queries]
+    return pill_db.match_batch(parsed)
+
+
+def find_best_match_linear(pill_db, identified_shape_info, identified_colors, identified_imprint,
+                           imprint_confidence=None):
+    """
+    행마다 calculate_score를 호출하는 기존 매칭 방식. (PillIndex 결과 검증용 기준 구현)
+    """
+    shape_probabilities = parse_shape_probabilities(identified_shape_info)
 
     primary_candidates = []
     for row in pill_db:
@@ -202,7 +714,7 @@ def find_best_match(pill_db, identified_shape_info, identified_colors, identifie
     candidates = []
     for row in primary_candidates:
         # 파싱된 shape_probabilities 딕셔너리를 점수 계산에 사용
-        score = calculate_score(row, shape_probabilities, identified_colors, identified_imprint)
+        score = calculate_score(row, shape_probabilities, identified_colors, identified_imprint, imprint_confidence)
         imprint_display = f"앞:{row.get('text', '')}/뒤:{row.get('text2', '')}"
         pill_info = f"{row['name']} ({row['shape']}, {row['color']}, {imprint_display})"
         candidates.append({'pill_info': pill_info, 'score': score})
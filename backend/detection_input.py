@@ -0,0 +1,154 @@
+import io
+import os
+import logging
+
+import cv2
+import numpy as np
+
+# --- 탐지용 작업 해상도 이미지 ---
+# 휴대폰 업로드(12MP 이상)를 그대로 디코딩해 파이프라인 전체에 들고 다니지 않도록,
+# 탐지는 긴 변이 DETECTION_MAX_SIDE 이하인 작업 이미지에서 수행하고
+# 박스를 원본 좌표로 되돌린 뒤, 각인 OCR 등에 필요한 크롭만 원본 해상도에서 잘라냅니다.
+
+DETECTION_MAX_SIDE = int(os.getenv("DETECTION_MAX_SIDE", "1280"))
+
+# JPEG은 디코딩 단계에서 1/2, 1/4, 1/8로 축소하여 읽을 수 있음 (디코딩 시간/메모리 감소)
+_REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+# EXIF 방향 값 중 가로/세로가 뒤바뀌는 경우 (cv2는 디코딩 시 EXIF 방향을 적용함)
+_EXIF_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+class WorkingImage:
+    """
+    탐지용으로 축소한 작업 이미지와 원본 해상도 정보를 함께 보관합니다.
+    원본 해상도 배열은 크롭이 필요할 때 처음 디코딩되며, crop_boxes 이후에는 해제할 수 있습니다.
+    """
+
+    def __init__(self, working, full_size, full_image=None, source_bytes=None):
+        self.working = working
+        self.full_size = full_size  # (가로, 세로)
+        self._full_image = full_image
+        self._source_bytes = source_bytes
+
+        full_w, full_h = full_size
+        work_h, work_w = working.shape[:2]
+        self.scale_x = full_w / work_w
+        self.scale_y = full_h / work_h
+
+    @property
+    def full(self):
+        """ 원본 해상도 이미지 (처음 접근할 때 디코딩) """
+        if self._full_image is None:
+            npimg = np.frombuffer(self._source_bytes, np.uint8)
+            self._full_image = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+        return self._full_image
+
+    def release_full(self):
+        """ 원본 해상도 배열을 해제합니다. (바이트가 남아 있으면 다시 디코딩 가능) """
+        if self._source_bytes is not None:
+            self._full_image = None
+
+    def to_full_box(self, box):
+        """ 작업 이미지 좌표의 박스를 원본 좌표로 변환 """
+        x1, y1, x2, y2 = box
+        full_w, full_h = self.full_size
+        return [
+            max(0, min(full_w, int(round(x1 * self.scale_x)))),
+            max(0, min(full_h, int(round(y1 * self.scale_y)))),
+            max(0, min(full_w, int(round(x2 * self.scale_x)))),
+            max(0, min(full_h, int(round(y2 * self.scale_y)))),
+        ]
+
+    def to_working_box(self, box):
+        """ 원본 좌표의 박스를 작업 이미지 좌표로 변환 (결과 시각화용) """
+        x1, y1, x2, y2 = box
+        return [
+            int(round(x1 / self.scale_x)), int(round(y1 / self.scale_y)),
+            int(round(x2 / self.scale_x)), int(round(y2 / self.scale_y)),
+        ]
+
+    def crop_boxes(self, full_boxes, release=True):
+        """
+        원본 해상도에서 박스 영역만 복사해 반환합니다.
+        release=True면 크롭 후 원본 배열을 해제하여 요청당 최대 메모리를 줄입니다.
+        """
+        if not full_boxes:
+            return []
+        full = self.full
+        crops = [full[y1:y2, x1:x2].copy() for x1, y1, x2, y2 in full_boxes]
+        if release:
+            self.release_full()
+        return crops
+
+
+def _fit_to_max_side(image, max_side):
+    h, w = image.shape[:2]
+    if max(h, w) <= max_side:
+        return image
+    scale = max_side / max(h, w)
+    return cv2.resize(image, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))), interpolation=cv2.INTER_AREA)
+
+
+def _read_encoded_size(data):
+    """ 헤더만 읽어 (EXIF 방향이 적용된) 원본 크기를 구합니다. 실패하면 None """
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as pil_image:
+            w, h = pil_image.size
+            orientation = pil_image.getexif().get(0x0112, 1)
+        if orientation in _EXIF_TRANSPOSED_ORIENTATIONS:
+            w, h = h, w
+        return w, h
+    except Exception as e:
+        logging.warning(f"이미지 헤더에서 크기를 읽지 못했습니다: {e}")
+        return None
+
+
+def load_working_image_from_bytes(data, max_side=DETECTION_MAX_SIDE):
+    """
+    인코딩된 이미지 바이트를 작업 해상도로 디코딩합니다.
+    지원되는 코덱(JPEG)에서는 축소 디코딩 플래그를 사용하여 원본 크기 배열을 만들지 않습니다.
+    디코딩할 수 없으면 None을 반환합니다.
+    """
+    npimg = np.frombuffer(data, np.uint8)
+    full_size = _read_encoded_size(data)
+
+    working = None
+    if full_size is not None:
+        longest = max(full_size)
+        for factor, flag in _REDUCED_DECODE_FLAGS:
+            # 축소 후에도 max_side 이상이 되는 가장 큰 축소 비율 선택 (이후 INTER_AREA로 정확히 맞춤)
+            if longest / factor >= max_side:
+                working = cv2.imdecode(npimg, flag)
+                break
+
+    if working is None:
+        full_image = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+        if full_image is None:
+            return None
+        h, w = full_image.shape[:2]
+        return WorkingImage(_fit_to_max_side(full_image, max_side), (w, h), full_image=full_image, source_bytes=data)
+
+    return WorkingImage(_fit_to_max_side(working, max_side), full_size, source_bytes=data)
+
+
+def load_working_image(image_path, max_side=DETECTION_MAX_SIDE):
+    """ 이미지 파일을 작업 해상도로 불러옵니다. 파일이 없거나 디코딩할 수 없으면 None """
+    try:
+        with open(image_path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        logging.error(f"이미지를 불러올 수 없습니다: {image_path} ({e})")
+        return None
+    return load_working_image_from_bytes(data, max_side)
+
+
+def working_image_from_array(image, max_side=DETECTION_MAX_SIDE):
+    """ 이미 디코딩된 이미지 배열로 작업 이미지를 만듭니다. (원본 배열은 그대로 보관) """
+    h, w = image.shape[:2]
+    return WorkingImage(_fit_to_max_side(image, max_side), (w, h), full_image=image)
@@ -0,0 +1,143 @@
+"""
+탐지/모양 모델을 CPU 전용 추론 백엔드 형식으로 내보내는 오프라인 스크립트.
+내보낸 파일은 inference_backends.BACKEND_MODEL_PATHS의 경로에 저장되며,
+서버/워커는 INFERENCE_BACKEND 환경 변수로 해당 백엔드를 선택합니다.
+
+사용 예:
+    python export_models.py --backend onnx
+    python export_models.py --backend openvino
+    python export_models.py --backend tflite-int8      # 모양 모델 int8 사후 양자화
+"""
+import argparse
+import glob
+import os
+import shutil
+
+import cv2
+import numpy as np
+
+from inference_backends import BACKEND_MODEL_PATHS
+
+REFERENCE_DETECTION_PATH, REFERENCE_SHAPE_PATH = BACKEND_MODEL_PATHS['native']
+SHAPE_TARGET_SIZE = 224
+
+
+def collect_shape_inputs(image_dir="test_image", augment=False):
+    """
+    기준 모델로 test_image/의 알약을 탐지/배경 제거하여 모양 모델 입력(letterbox 된 마스크)을 만듭니다.
+    int8 양자화의 대표 데이터셋과 패리티 검사 입력으로 사용합니다.
+    """
+    from object_detection import detect_pills
+    from pill_pyramid import PillPyramid
+    from shape_analysis import letterbox_mask
+    from model_registry import get_detection_model
+
+    detector = get_detection_model(REFERENCE_DETECTION_PATH)
+    inputs = []
+    for image_path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        for x1, y1, x2, y2 in detect_pills(image, model=detector):
+            crop = image[y1:y2, x1:x2]
+            if crop.size == 0:
+                continue
+            # 서버와 같은 경로(피라미드 작업 레벨 분리 -> 모양 레벨 마스크)로 입력 생성
+            mask, _ = PillPyramid(crop).shape_mask()
+            masks = [mask]
+            if augment:
+                # 대표 데이터셋 크기를 늘리기 위해 회전/반전한 마스크도 추가
+                masks += [cv2.rotate(mask, cv2.ROTATE_90_CLOCKWISE), cv2.flip(mask, 0), cv2.flip(mask, 1)]
+            inputs.extend(letterbox_mask(m, SHAPE_TARGET_SIZE) for m in masks)
+    return inputs
+
+
+def _move(src, dst):
+    src, dst = str(src), str(dst)
+    if os.path.abspath(src) != os.path.abspath(dst):
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if os.path.isdir(dst):
+            shutil.rmtree(dst)
+        shutil.move(src, dst)
+    return dst
+
+
+def export_detection(backend):
+    """ Ultralytics 내보내기 기능으로 탐지 모델을 ONNX/OpenVINO 형식으로 변환 (배치 차원은 동적) """
+    from ultralytics import YOLO
+
+    target = BACKEND_MODEL_PATHS[backend][0]
+    model = YOLO(REFERENCE_DETECTION_PATH)
+    if target.endswith('.xml'):
+        exported_dir = model.export(format='openvino', dynamic=True, imgsz=640)
+        _move(exported_dir, os.path.dirname(target))
+    else:
+        exported = model.export(format='onnx', dynamic=True, simplify=True, imgsz=640)
+        _move(exported, target)
+    print(f"탐지 모델 내보내기 완료: {target}")
+    return target
+
+
+def export_shape(backend, image_dir="test_image"):
+    """ Keras 모양 모델을 ONNX / OpenVINO / TFLite(float32 또는 int8) 형식으로 변환 """
+    import tensorflow as tf
+
+    target = BACKEND_MODEL_PATHS[backend][1]
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    model = tf.keras.models.load_model(REFERENCE_SHAPE_PATH)
+    input_spec = tf.TensorSpec([None, SHAPE_TARGET_SIZE, SHAPE_TARGET_SIZE, 3], tf.float32, name='input')
+
+    if backend == 'onnx':
+        import tf2onnx
+        tf2onnx.convert.from_keras(model, input_signature=(input_spec,), opset=13, output_path=target)
+
+    elif backend == 'openvino':
+        import openvino as ov
+        ov_model = ov.convert_model(model, input=[[-1, SHAPE_TARGET_SIZE, SHAPE_TARGET_SIZE, 3]])
+        ov.save_model(ov_model, target)
+
+    elif backend in ('tflite', 'tflite-int8'):
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        if backend == 'tflite-int8':
+            samples = collect_shape_inputs(image_dir, augment=True)
+            if not samples:
+                raise RuntimeError(f"'{image_dir}'에서 대표 데이터셋을 만들 수 없습니다. (int8 양자화 불가)")
+
+            def representative_dataset():
+                for sample in samples:
+                    yield [sample[np.newaxis, ...].astype(np.float32)]
+
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.representative_dataset = representative_dataset
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+            print(f"int8 사후 양자화: 대표 샘플 {len(samples)}개 사용")
+        with open(target, 'wb') as f:
+            f.write(converter.convert())
+
+    else:
+        raise ValueError(f"모양 모델을 내보낼 수 없는 백엔드입니다: {backend}")
+
+    print(f"모양 모델 내보내기 완료: {target}")
+    return target
+
+
+def main():
+    backends = [b for b in BACKEND_MODEL_PATHS if b != 'native']
+    parser = argparse.ArgumentParser(description="탐지/모양 모델을 CPU 추론 백엔드 형식으로 내보냅니다.")
+    parser.add_argument('--backend', required=True, choices=backends)
+    parser.add_argument('--image-dir', default="test_image", help="int8 양자화 대표 데이터셋용 이미지 폴더")
+    parser.add_argument('--skip-detection', action='store_true')
+    parser.add_argument('--skip-shape', action='store_true')
+    args = parser.parse_args()
+
+    if not args.skip_detection:
+        export_detection(args.backend)
+    if not args.skip_shape:
+        export_shape(args.backend, args.image_dir)
+    print(f"\n이제 INFERENCE_BACKEND={args.backend} 로 서버/워커를 실행하고 parity_check.py로 결과를 확인하세요.")
+
+
+if __name__ == '__main__':
+    main()
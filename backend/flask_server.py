@@ -7,16 +7,25 @@ import cv2
 import numpy as np
 import os
 import base64
+import hmac
 import re
-from tensorflow.keras.models import load_model
 
 # 로컬 모듈 임포트
-from object_detection import detect_pills
-from image_preprocessing import remove_background
-from color_analysis import get_dominant_color
-from shape_analysis import classify_shape_with_ai
-from database_handler import load_database, find_best_match
-from imprint_analysis import get_imprint
+from model_registry import warmup_models
+from inference_backends import resolve_model_paths
+from object_detection import detect_pills_on_working_image, create_detection_batcher
+from detection_input import load_working_image_from_bytes
+from image_preprocessing import get_segmentation_stats
+from pill_pyramid import PillPyramid, STAGE_LEVELS
+from color_analysis import analyze_pill_colors, warmup_color_lut
+from shape_analysis import create_shape_batcher
+from shape_geometry import classify_shapes_with_geometry, get_shape_fast_path_stats
+from database_handler import find_best_match_batch
+from catalogue import CatalogueManager
+from imprint_index import get_imprint_key_stats
+from imprint_analysis import get_imprint_with_confidence, get_ocr_variant_stats
+from ocr_engine import get_ocr_stats
+from ocr_cache import get_ocr_cache_stats
 from api_handler import get_pill_details_from_api
 
 # --- Flask 앱 초기화 ---
@@ -24,20 +33,24 @@ app = Flask(__name__)
 CORS(app) # 모바일 앱 등 다른 출처에서의 API 요청 허용
 
 # --- 전역 변수 및 모델 로딩 ---
-YOLO_MODEL_PATH = "weights/detection_model.pt"
-SHAPE_MODEL_PATH = "weights/shape_model.h5"
+# INFERENCE_BACKEND 환경 변수(native/onnx/openvino/tflite/tflite-int8)에 따라 모델 파일 선택
+YOLO_MODEL_PATH, SHAPE_MODEL_PATH = resolve_model_paths()
 DB_PATH = "database/pill.csv"
 FONT_PATH_BOLD = "fonts/malgunbd.ttf"
 FONT_SIZE = 18
-
-# 서버 시작 시 모델과 DB를 미리 로드
-PILL_DB = load_database(DB_PATH)
-SHAPE_MODEL = None
-try:
-    SHAPE_MODEL = load_model(SHAPE_MODEL_PATH)
-    print(f"'{SHAPE_MODEL_PATH}' 모양 분류 모델을 성공적으로 불러왔습니다.")
-except Exception as e:
-    print(f"오류: '{SHAPE_MODEL_PATH}' 모델을 불러올 수 없습니다. {e}")
+# 요청 간 마이크로 배칭 설정 (threaded 서버에서 동시 요청을 한 번의 추론으로 묶음)
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "1") == "1"
+
+# 서버 시작 시 모델과 DB를 미리 로드 (모델은 레지스트리에서 한 번만 로드 후 워밍업)
+# DB는 CSV 변경 감시/관리자 요청으로 무중단 갱신 (요청마다 CATALOGUE.current를 한 번 받아 사용)
+CATALOGUE = CatalogueManager(DB_PATH)
+CATALOGUE.install_signal_handler()
+# 관리자 API 토큰 (지정하지 않으면 관리자 API를 사용하지 않음. 역방향 프록시 뒤에서는 요청 주소로 구분할 수 없음)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+DETECTION_MODEL, SHAPE_MODEL = warmup_models(YOLO_MODEL_PATH, SHAPE_MODEL_PATH)
+warmup_color_lut()
+DETECTION_BATCHER = create_detection_batcher(DETECTION_MODEL) if INFERENCE_BATCHING and DETECTION_MODEL else None
+SHAPE_BATCHER = create_shape_batcher(SHAPE_MODEL) if INFERENCE_BATCHING and SHAPE_MODEL else None
 
 PIL_FONT = ImageFont.load_default()
 try:
@@ -73,51 +86,57 @@ def predict():
         return jsonify({'error': '파일이 선택되지 않았습니다.'}), 400
 
     filestr = file.read()
-    npimg = np.frombuffer(filestr, np.uint8)
-    original_image = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-
-    pill_boxes = detect_pills(original_image, YOLO_MODEL_PATH)
+    # 탐지는 축소된 작업 해상도에서 수행하고, 박스는 원본 좌표로 되돌림
+    working_image = load_working_image_from_bytes(filestr)
+    if working_image is None:
+        return jsonify({'error': '이미지를 읽을 수 없습니다.'}), 400
+
+    pill_boxes = detect_pills_on_working_image(working_image, YOLO_MODEL_PATH, model=DETECTION_MODEL, batcher=DETECTION_BATCHER)
+    # 각인 인식 품질을 위해 크롭은 원본 해상도에서 잘라냄 (크롭 후 원본 배열은 해제)
+    cropped_pills = working_image.crop_boxes(pill_boxes)
+    # 결과 시각화는 작업 해상도 이미지에 그림
+    original_image = working_image.working.copy()
     
     candidates_by_box = []
+    pill_features = []
+    pill_db = CATALOGUE.current  # 요청 도중 DB가 갱신되어도 이 요청은 같은 인덱스로 매칭
+    # ?ocr_cache=0이면 OCR 결과 캐시를 쓰지 않고 항상 다시 인식 (QA/디버깅용)
+    bypass_ocr_cache = request.args.get('ocr_cache') == '0'
     
-    for box in pill_boxes:
-        x1, y1, x2, y2 = box
-        cropped_pill = original_image[y1:y2, x1:x2]
+    for cropped_pill in cropped_pills:
         
         # main.py의 분석 흐름을 그대로 따름
-        pill_without_bg, pill_mask = remove_background(cropped_pill.copy())
+        # 알약별 해상도 피라미드: 배경 분리는 작업 레벨에서 한 번만 하고 마스크를 각 레벨로 전파
+        pyramid = PillPyramid(cropped_pill)
         
-        # 색상 분석
-        _, color_candidates = get_dominant_color(pill_without_bg)
+        # 색상 분석 (작업 레벨)
+        color_level = STAGE_LEVELS['color']
+        _, color_list = analyze_pill_colors(pyramid.image(color_level), mask=pyramid.mask(color_level))
+        color_candidates = " ".join(sorted(color_list))
         print(color_candidates)
         
-        # 모양 분석을 위한 이진화 및 스무딩 -----------
-        gray_pill = cv2.cvtColor(pill_without_bg, cv2.COLOR_BGR2GRAY)
-        _, binarized_image = cv2.threshold(gray_pill, 10, 255, cv2.THRESH_BINARY)
-        
-        smoothed_binarized_image = binarized_image.copy()
-        contours, _ = cv2.findContours(binarized_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if contours:
-            pill_contour = max(contours, key=cv2.contourArea)
-            perimeter = cv2.arcLength(pill_contour, True)
-            epsilon = 0.005 * perimeter 
-            approximated_contour = cv2.approxPolyDP(pill_contour, epsilon, True)
-            smoothed_binarized_image = np.zeros_like(binarized_image)
-            cv2.drawContours(smoothed_binarized_image, [approximated_contour], -1, (255), -1)
-        #-----------------------------------------------------    
-        
-        # AI로 모양 분석
-        if SHAPE_MODEL:
-            shape_result = classify_shape_with_ai(smoothed_binarized_image, SHAPE_MODEL)
-            print(shape_result)
-        
+        # 모양 분석을 위한 스무딩 마스크와 외곽선 기하 특징 (모양 레벨)
+        smoothed_binarized_image, _ = pyramid.shape_mask()
+        geometry = pyramid.geometry()
         
-        # 각인 분석
-        imprint_text = get_imprint(cropped_pill.copy(), pill_mask)
-        print(imprint_text)
+        # 각인 분석 (원본 크롭 해상도)
+        imprint_text, imprint_confidence = get_imprint_with_confidence(
+            cropped_pill, pyramid.mask(STAGE_LEVELS['ocr']), bypass_cache=bypass_ocr_cache)
+        print(imprint_text, imprint_confidence)
 
-        # DB 조회
-        candidate_pills = find_best_match(PILL_DB, shape_result, color_candidates, imprint_text)
+        pill_features.append((color_candidates, smoothed_binarized_image, geometry, imprint_text, imprint_confidence))
+
+    # 모양 분석: 기하 규칙으로 판정하지 못한 알약만 AI로 (한 번의 순전파로)
+    shape_results = classify_shapes_with_geometry(
+        [f[1] for f in pill_features], [f[2] for f in pill_features], SHAPE_MODEL, batcher=SHAPE_BATCHER)
+    print(shape_results)
+
+    # DB 조회: 이미지의 모든 알약을 한 번에 매칭
+    candidates_list = find_best_match_batch(
+        pill_db, [(shape_result, f[0], f[3], f[4]) for f, shape_result in zip(pill_features, shape_results)])
+
+    for box, candidate_pills in zip(pill_boxes, candidates_list):
+        x1, y1, x2, y2 = working_image.to_working_box(box)
         print(candidate_pills)
         
         if candidate_pills:
@@ -135,7 +154,8 @@ def predict():
     
     return jsonify({
         'image': 'data:image/jpeg;base64,' + img_str,
-        'candidates': candidates_by_box
+        'candidates': candidates_by_box,
+        'db_version': pill_db.version if pill_db is not None else None,
     })
 
 @app.route('/detail')
@@ -147,6 +167,38 @@ def detail():
     details = get_pill_details_from_api(item_code)
     return jsonify(details)
 
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """
+    알약 DB를 백그라운드에서 다시 불러옵니다. (?wait=1이면 완료까지 기다려 결과 반환)
+    X-Admin-Token 헤더가 ADMIN_TOKEN과 같아야 하며, ADMIN_TOKEN이 없으면 사용할 수 없습니다. (SIGHUP으로 갱신)
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({'error': '관리자 API가 비활성화되어 있습니다. (ADMIN_TOKEN 미설정)'}), 404
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', '').encode(), ADMIN_TOKEN.encode()):
+        return jsonify({'error': '권한이 없습니다.'}), 403
+
+    force = request.args.get('force') == '1'
+    if request.args.get('wait') == '1':
+        return jsonify(CATALOGUE.reload(force=force))
+    CATALOGUE.reload_async(force=force)
+    return jsonify({'reloading': True, 'db_version': CATALOGUE.version}), 202
+
+@app.route('/metrics')
+def metrics():
+    """ 배칭 스케줄러의 큐 길이/배치 크기, 배경 분리 단계별 사용 횟수, 모양 규칙 판정/각인 정규 키 적중률, OCR 엔진 지연/사용률, OCR 캐시 적중률 등 지표 (튜닝용) """
+    batchers = [b for b in (DETECTION_BATCHER, SHAPE_BATCHER) if b is not None]
+    return jsonify({
+        'batching': {b.name: b.stats() for b in batchers},
+        'segmentation': get_segmentation_stats(),
+        'shape_fast_path': get_shape_fast_path_stats(),
+        'imprint_keys': get_imprint_key_stats(),
+        'ocr': get_ocr_stats(),
+        'ocr_variants': get_ocr_variant_stats(),
+        'ocr_cache': get_ocr_cache_stats(),
+        'catalogue': CATALOGUE.stats(),
+    })
+
 # --- 서버 실행 ---
 if __name__ == '__main__':
     # ★★★ 변경된 부분: use_reloader=False를 추가하여 자동 재시작 문제 해결 ★★★
@@ -1,27 +1,148 @@
 import cv2
 import numpy as np
 import logging
+import threading
 
 
-def remove_background(cropped_image):
+# --- 단계적 배경 분리 엔진 ---
+# 1단계(fast): 크롭 테두리의 배경색과의 색 거리(Lab)를 Otsu로 이진화하고 모폴로지로 정리
+# 2단계(grabcut): 1단계 마스크 품질 점수가 낮을 때만, 축소한 크롭에서 GrabCut 실행 후 마스크를 원래 크기로 확대
+SEGMENTATION_QUALITY_THRESHOLD = 0.6
+GRABCUT_MAX_SIDE = 160
+GRABCUT_ITERATIONS = 5
+
+_SEGMENTATION_STATS = {'fast': 0, 'grabcut': 0, 'skipped': 0, 'failed': 0}
+_STATS_LOCK = threading.Lock()
+
+
+def _record_tier(tier):
+    with _STATS_LOCK:
+        _SEGMENTATION_STATS[tier] += 1
+
+
+def get_segmentation_stats():
+    """ 배경 분리 단계별 사용 횟수와 1단계(fast) 적중률을 반환합니다. """
+    with _STATS_LOCK:
+        stats = dict(_SEGMENTATION_STATS)
+    attempted = stats['fast'] + stats['grabcut']
+    stats['fast_hit_rate'] = stats['fast'] / attempted if attempted else 0.0
+    return stats
+
+
+def _fill_largest_contour(binary_mask):
+    """ 가장 큰 외곽선 내부를 채운 0/1 마스크와 해당 외곽선을 반환 (각인 등 내부 구멍 제거) """
+    contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return np.zeros_like(binary_mask), None
+    contour = max(contours, key=cv2.contourArea)
+    filled = np.zeros_like(binary_mask)
+    cv2.drawContours(filled, [contour], -1, 1, -1)
+    return filled, contour
+
+
+def _fast_segmentation(cropped_image):
+    """ 테두리 배경색과의 Lab 색 거리 + Otsu 이진화 + 모폴로지 정리로 알약 마스크를 추정 """
+    h, w = cropped_image.shape[:2]
+    lab = cv2.cvtColor(cropped_image, cv2.COLOR_BGR2LAB).astype(np.float32)
+
+    border = np.concatenate([lab[0], lab[-1], lab[:, 0], lab[:, -1]])
+    background = np.median(border, axis=0)
+    distance = np.linalg.norm(lab - background, axis=2)
+    distance = cv2.normalize(distance, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    distance = cv2.GaussianBlur(distance, (5, 5), 0)
+
+    _, binary = cv2.threshold(distance, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+    k = max(3, (min(h, w) // 40) | 1)
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (k, k))
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel, iterations=2)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel, iterations=1)
+    return _fill_largest_contour(binary)
+
+
+def score_mask_quality(mask, contour):
+    """
+    알약 마스크의 품질 점수(0~1)를 계산합니다.
+    - 볼록성(solidity): 알약은 볼록한 물체이므로 외곽선 면적 / 볼록 껍질 면적이 1에 가까워야 함
+    - 테두리 접촉: 크롭 테두리 픽셀 중 전경 비율이 높으면 배경이 섞인 것
+    - 채움 비율: 탐지 박스 대비 마스크 면적이 너무 작거나(놓침) 너무 크면(배경 포함) 불량
+    """
+    if contour is None:
+        return 0.0, {}
+    h, w = mask.shape[:2]
+    area = cv2.contourArea(contour)
+    hull_area = cv2.contourArea(cv2.convexHull(contour))
+    solidity = area / hull_area if hull_area > 0 else 0.0
+
+    border = np.concatenate([mask[0], mask[-1], mask[:, 0], mask[:, -1]])
+    border_contact = float(border.mean())
+    fill = float(mask.mean())
+
+    solidity_score = np.clip((solidity - 0.80) / 0.15, 0.0, 1.0)
+    border_score = 1.0 - np.clip((border_contact - 0.30) / 0.40, 0.0, 1.0)
+    fill_score = 1.0 if 0.25 <= fill <= 0.95 else 0.0
+
+    score = float(solidity_score * border_score * fill_score)
+    return score, {'solidity': solidity, 'border_contact': border_contact, 'fill': fill}
+
+
+def _grabcut_downscaled(cropped_image, max_side=GRABCUT_MAX_SIDE):
+    """ 축소한 크롭에서 GrabCut을 실행하고 마스크를 원래 크기로 확대 """
+    h, w = cropped_image.shape[:2]
+    scale = min(1.0, max_side / max(h, w))
+    small = cv2.resize(cropped_image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA) \
+        if scale < 1.0 else cropped_image
+    sh, sw = small.shape[:2]
+
+    mask = np.zeros((sh, sw), np.uint8)
+    bgdModel = np.zeros((1, 65), np.float64)
+    fgdModel = np.zeros((1, 65), np.float64)
+    rect = (int(sw * 0.05), int(sh * 0.05), int(sw * 0.9), int(sh * 0.9))
+    cv2.grabCut(small, mask, rect, bgdModel, fgdModel, GRABCUT_ITERATIONS, cv2.GC_INIT_WITH_RECT)
+    mask2 = np.where((mask == 2) | (mask == 0), 0, 1).astype('uint8')
+
+    if (sh, sw) != (h, w):
+        mask2 = cv2.resize(mask2, (w, h), interpolation=cv2.INTER_NEAREST)
+    return mask2
+
+
+def segment_pill(cropped_image, quality_threshold=SEGMENTATION_QUALITY_THRESHOLD):
     """
-    GrabCut 알고리즘을 사용하여 이미 잘라낸 알약 이미지에서 배경을 제거합니다.
+    잘라낸 알약 이미지에서 배경을 분리합니다.
+    빠른 색 거리 기반 분리를 먼저 시도하고, 품질 점수가 낮을 때만 GrabCut으로 넘어갑니다.
+
+    Returns:
+        tuple: (배경이 제거된 이미지, 0/1 마스크, 사용된 단계 'fast' | 'grabcut' | 'skipped' | 'failed')
     """
+    h, w = cropped_image.shape[:2]
+    if h < 10 or w < 10:
+        _record_tier('skipped')
+        return cropped_image, np.zeros((h, w), np.uint8), 'skipped'
+
     try:
-        h, w = cropped_image.shape[:2]
-        if h < 10 or w < 10: return cropped_image, np.zeros((h, w), np.uint8)
-        mask = np.zeros(cropped_image.shape[:2], np.uint8)
-        bgdModel = np.zeros((1, 65), np.float64)
-        fgdModel = np.zeros((1, 65), np.float64)
-        rect = (int(w * 0.05), int(h * 0.05), int(w * 0.9), int(h * 0.9))
-        cv2.grabCut(cropped_image, mask, rect, bgdModel, fgdModel, 5, cv2.GC_INIT_WITH_RECT)
-        mask2 = np.where((mask == 2) | (mask == 0), 0, 1).astype('uint8')
-        result_image = cropped_image * mask2[:, :, np.newaxis]
-        return result_image, mask2
+        mask, contour = _fast_segmentation(cropped_image)
+        score, details = score_mask_quality(mask, contour)
+        tier = 'fast'
+        if score < quality_threshold:
+            logging.debug(f"빠른 배경 분리 품질 부족(점수 {score:.2f}, {details}), GrabCut으로 대체합니다.")
+            mask = _grabcut_downscaled(cropped_image)
+            tier = 'grabcut'
+
+        _record_tier(tier)
+        result_image = cropped_image * mask[:, :, np.newaxis]
+        return result_image, mask, tier
     except Exception as e:
         logging.error(f"배경 제거 중 오류 발생: {e}", exc_info=True)
-        h, w = cropped_image.shape[:2]
-        return cropped_image, np.zeros((h, w), np.uint8)
+        _record_tier('failed')
+        return cropped_image, np.zeros((h, w), np.uint8), 'failed'
+
+
+def remove_background(cropped_image):
+    """
+    이미 잘라낸 알약 이미지에서 배경을 제거합니다. (segment_pill의 단계 정보를 제외한 결과)
+    """
+    result_image, mask, _ = segment_pill(cropped_image)
+    return result_image, mask
 
 
 def preprocess_for_dark_text(image, pill_mask):
@@ -84,6 +205,83 @@ def preprocess_for_bright_text(image, pill_mask):
         return np.full_like(image, 255, dtype=np.uint8)  # 오류 시 흰색 이미지 반환
 
 
+# 각인 전처리 공통 설정 (adaptiveThreshold 블록 크기 및 C값)
+IMPRINT_THRESHOLD_BLOCK_SIZE = 19
+IMPRINT_THRESHOLD_C = 9
+_IMPRINT_KERNEL = np.ones((2, 2), np.uint8)
+# 스레드별 중간 결과 버퍼 (크롭 크기별로 보관, 크기 종류가 이보다 많아지면 비움)
+_IMPRINT_WORKSPACE_MAX_SHAPES = 8
+_imprint_workspace_local = threading.local()
+
+
+def _imprint_workspace(shape):
+    workspaces = getattr(_imprint_workspace_local, 'by_shape', None)
+    if workspaces is None:
+        workspaces = _imprint_workspace_local.by_shape = {}
+    workspace = workspaces.get(shape)
+    if workspace is None:
+        if len(workspaces) >= _IMPRINT_WORKSPACE_MAX_SHAPES:
+            workspaces.clear()
+        workspace = {name: np.empty(shape, np.uint8) for name in ('gray', 'blurred', 'mean', 'mask', 'binary', 'masked', 'opened')}
+        workspace['diff'] = np.empty(shape, np.int16)
+        workspace['blurred_float'] = np.empty(shape, np.float32)
+        workspace['mean_float'] = np.empty(shape, np.float32)
+        workspaces[shape] = workspace
+    return workspace
+
+
+def preprocess_imprint_variants(image, pill_mask):
+    """
+    어두운 각인용(preprocess_for_dark_text)과 밝은 각인용(preprocess_for_bright_text) 전처리 결과를 한 번에 만듭니다.
+    두 전처리는 이진화 방향(THRESH_BINARY_INV / THRESH_BINARY)만 다르므로, 흑백 변환/블러/지역 평균(가우시안)은
+    한 번만 계산하고 두 방향의 이진화 결과를 함께 얻습니다. (각각 호출한 결과와 픽셀 단위로 같음)
+    중간 결과는 스레드별로 재사용하는 버퍼에 쓰며, 입력 이미지는 수정하지 않으므로 복사본을 넘길 필요가 없습니다.
+
+    Returns:
+        tuple: (어두운 각인용 이미지, 밝은 각인용 이미지)
+    """
+    try:
+        workspace = _imprint_workspace(image.shape[:2])
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=workspace['gray']) if image.ndim == 3 else image
+        blurred = cv2.GaussianBlur(gray, (5, 5), 0, dst=workspace['blurred'])
+
+        # adaptiveThreshold(ADAPTIVE_THRESH_GAUSSIAN_C)가 내부에서 계산하는 지역 평균과 같은 값
+        # (float32로 가우시안 블러 후 uint8로 반올림)
+        block_size = IMPRINT_THRESHOLD_BLOCK_SIZE
+        blurred_float = workspace['blurred_float']
+        blurred_float[...] = blurred
+        mean_float = cv2.GaussianBlur(blurred_float, (block_size, block_size), 0, dst=workspace['mean_float'],
+                                      borderType=cv2.BORDER_REPLICATE | cv2.BORDER_ISOLATED)
+        local_mean = workspace['mean']
+        # 블러 결과는 0~255 범위이므로 반올림 후 그대로 변환 (convertTo와 같은 round-half-even)
+        np.copyto(local_mean, np.rint(mean_float, out=mean_float), casting='unsafe')
+        # THRESH_BINARY: (픽셀 - 지역 평균) > -C 이면 흰색. THRESH_BINARY_INV는 정확히 그 반대
+        diff = cv2.subtract(blurred, local_mean, dst=workspace['diff'], dtype=cv2.CV_16S)
+        bright_thresh = cv2.compare(diff, -IMPRINT_THRESHOLD_C, cv2.CMP_GT, dst=workspace['binary'])
+
+        # 마스크를 0/255로 맞춰 bitwise_and(thresh, thresh, mask=pill_mask)와 같은 결과를 얻음
+        mask = None
+        if pill_mask is not None:
+            mask = cv2.compare(pill_mask, 0, cv2.CMP_GT, dst=workspace['mask'])
+
+        outputs = []
+        for invert_threshold in (True, False):
+            thresh = bright_thresh
+            if invert_threshold:
+                thresh = cv2.bitwise_not(bright_thresh, dst=workspace['masked'])
+            # 마스크를 적용하여 알약 영역만 남김
+            masked_image = cv2.bitwise_and(thresh, mask, dst=workspace['masked']) if mask is not None else thresh
+            # Tesseract가 잘 읽도록 노이즈 제거 및 글씨 굵게
+            cleaned = cv2.morphologyEx(masked_image, cv2.MORPH_OPEN, _IMPRINT_KERNEL, dst=workspace['opened'], iterations=1)
+            # Tesseract는 (검은 글씨 / 흰 배경)을 선호하므로 반전시킴 (결과는 버퍼가 아닌 새 배열)
+            outputs.append(cv2.bitwise_not(cleaned))
+        return outputs[0], outputs[1]
+    except Exception as e:
+        logging.error(f"각인 전처리 중 오류: {e}", exc_info=True)
+        white = np.full_like(image, 255, dtype=np.uint8)  # 오류 시 흰색 이미지 반환
+        return white, white.copy()
+
+
 def preprocess_image(image_path):
     """
     이미지 경로를 입력받아 이미지를 로드합니다.
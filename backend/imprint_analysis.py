@@ -1,45 +1,168 @@
+import os
 import cv2
-import pytesseract
 import logging
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import numpy as np
 # image_preprocessing에서 두 개의 새로운 전문 함수를 가져옵니다.
-from image_preprocessing import preprocess_for_dark_text, preprocess_for_bright_text
+from image_preprocessing import preprocess_imprint_variants, IMPRINT_THRESHOLD_BLOCK_SIZE, IMPRINT_THRESHOLD_C
+# Tesseract는 프로세스마다 유지되는 엔진 풀로 실행 (엔진 선택/Tesseract 경로 설정은 ocr_engine.py)
+from ocr_engine import get_ocr_pool, OCR_POOL_SIZE, OCR_LANG, OCR_PSM, OCR_CHAR_WHITELIST
+# 같은 크롭의 반복 인식은 OCR 결과 캐시에서 (ocr_cache.py)
+from ocr_cache import cached_ocr
 
+# --- 전처리 결과(변형)별 OCR 동시 실행 ---
+# 변형마다 OCR을 제한된 스레드 풀에서 동시에 실행하고(Tesseract는 인식 중 GIL을 놓음),
+# 어느 한 결과가 신뢰도/길이 기준을 넘으면 아직 시작하지 않은 나머지 변형은 실행하지 않고 기다리지도 않습니다.
+# 변형은 동시에 OCR_VARIANT_WORKERS개까지만 제출하고 하나가 끝날 때마다 다음 변형을 제출합니다.
+# 이미 실행 중인 변형은 멈출 수 없으므로, 기본값(변형 2개를 동시에 실행)에서 조기 종료는 응답 대기 시간만 줄이고
+# 나머지 변형은 끝까지 실행되어 OCR 엔진을 점유합니다. (/metrics의 variants_abandoned)
+# 요청당 동시에 실행할 변형 수 (1이면 순서대로 실행하며 기준을 넘으면 나머지를 실행하지 않음: CPU 절약, 지연 증가)
+OCR_VARIANT_WORKERS = int(os.getenv("OCR_VARIANT_WORKERS", str(OCR_POOL_SIZE)))
+# 조기 종료 기준: 단어 신뢰도 평균(0~100)과 정제된 각인 길이
+OCR_EARLY_EXIT_CONFIDENCE = float(os.getenv("OCR_EARLY_EXIT_CONFIDENCE", "80"))
+OCR_EARLY_EXIT_MIN_LENGTH = int(os.getenv("OCR_EARLY_EXIT_MIN_LENGTH", "2"))
+
+# variants_skipped: 실행하지 않은 변형, variants_abandoned: 조기 종료 후에도 끝까지 실행된 변형 (결과는 사용하지 않음)
+_VARIANT_STATS = {'runs': 0, 'variants_completed': 0, 'variants_skipped': 0, 'variants_abandoned': 0, 'early_exits': 0}
+_VARIANT_STATS_LOCK = threading.Lock()
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _clean_ocr_text(text):
+    # OCR 결과 정제: 공백, 특수문자 제거
+    return re.sub(r'[\W_]+', '', text).strip()
+
+
+def run_tesseract_batch(images):
+    """
+    여러 전처리 이미지를 엔진 하나로 연속 인식하고 정제된 결과 리스트를 반환하는 헬퍼 함수
+    (엔진 초기화 없이 같은 Tesseract 핸들을 재사용)
+    """
+    try:
+        return [_clean_ocr_text(text) for text in get_ocr_pool().recognize(images)]
+    except Exception as e:
+        logging.warning(f"Tesseract 실행 중 오류: {e}")
+        return [""] * len(images)
 
-# Tesseract OCR 경로 설정 (필요시 환경에 맞게 수정)
-# pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
 def run_tesseract(image):
     """Tesseract OCR을 실행하고 결과를 정제하는 헬퍼 함수"""
-    try:
-        # Tesseract 설정: --psm 6은 이미지를 단일 텍스트 블록으로 간주
-        config = r'--psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
-        text = pytesseract.image_to_string(image, lang='eng', config=config)
+    return run_tesseract_batch([image])[0]
+
+
+def _get_variant_executor():
+    """ 변형 OCR용 스레드 풀 (프로세스마다 하나, fork 후에는 새로 만듦) """
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=max(1, OCR_VARIANT_WORKERS), thread_name_prefix="ocr-variant")
+                _executor_pid = os.getpid()
+    return _executor
 
-        # OCR 결과 정제: 공백, 특수문자 제거
-        cleaned_text = re.sub(r'[\W_]+', '', text).strip()
-        return cleaned_text
+
+def _recognize_variant(image):
+    try:
+        text, confidence = get_ocr_pool().recognize([image], with_confidence=True)[0]
+        return _clean_ocr_text(text), confidence
     except Exception as e:
         logging.warning(f"Tesseract 실행 중 오류: {e}")
-        return ""
+        # 신뢰도 None: 인식 실패 (결과를 캐시하지 않도록 구분)
+        return "", None
 
 
-def get_imprint(original_pill_image, pill_mask, debug=False):
+def is_confident_imprint(text, confidence, min_confidence=OCR_EARLY_EXIT_CONFIDENCE, min_length=OCR_EARLY_EXIT_MIN_LENGTH):
+    """ 정제된 각인이 조기 종료 기준(신뢰도, 길이)을 넘는지 """
+    return confidence is not None and len(text) >= min_length and confidence >= min_confidence
+
+
+def run_ocr_variants(images, min_confidence=OCR_EARLY_EXIT_CONFIDENCE, min_length=OCR_EARLY_EXIT_MIN_LENGTH):
     """
-    알약 이미지에서 각인을 추출합니다.
-    [수정] '어두운 각인'과 '밝은 각인' 두 가지 전처리를 모두 실행하고,
-    최종적으로 문자열(string)만 반환합니다.
+    전처리 변형 이미지들을 동시에 OCR하여 입력 순서대로 (정제된 텍스트, 신뢰도) 리스트를 반환합니다.
+    변형은 동시에 OCR_VARIANT_WORKERS개까지만 제출하고, 한 결과가 기준을 넘으면 남은 변형은 실행하지 않으며
+    실행 중인 변형은 기다리지 않습니다. (해당 항목은 None. 실행 중인 변형은 멈추지 않으므로 대기 시간만 줄어듦)
+    인식에 실패한 변형은 ("", None)
+    """
+    executor = _get_variant_executor()
+    remaining = iter(enumerate(images))
+    running = {}
+
+    def submit_next():
+        for i, image in remaining:
+            running[executor.submit(_recognize_variant, image)] = i
+            return
+
+    for _ in range(max(1, OCR_VARIANT_WORKERS)):
+        submit_next()
+    results = [None] * len(images)
+    early_exit = False
+    while running and not early_exit:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            text, confidence = results[running.pop(future)] = future.result()
+            early_exit = early_exit or is_confident_imprint(text, confidence, min_confidence, min_length)
+        if not early_exit:
+            for _ in done:
+                submit_next()
+
+    # 풀이 다른 요청으로 바빠 아직 시작하지 않은 변형은 취소 (cancel()이 True인 것만 실행되지 않음)
+    cancelled = sum(future.cancel() for future in running)
+    with _VARIANT_STATS_LOCK:
+        _VARIANT_STATS['runs'] += 1
+        _VARIANT_STATS['early_exits'] += early_exit
+        completed = sum(result is not None for result in results)
+        _VARIANT_STATS['variants_completed'] += completed
+        _VARIANT_STATS['variants_skipped'] += len(images) - completed - len(running) + cancelled
+        _VARIANT_STATS['variants_abandoned'] += len(running) - cancelled
+    return results
+
+
+def get_ocr_variant_stats():
+    """ 변형 OCR 실행 횟수와 조기 종료/건너뛴(취소된) 변형/기다리지 않은 변형 수 """
+    with _VARIANT_STATS_LOCK:
+        stats = dict(_VARIANT_STATS)
+    stats['early_exit_rate'] = stats['early_exits'] / stats['runs'] if stats['runs'] else 0.0
+    return stats
+
+
+def _imprint_cache_params():
+    """ 캐시 키에 넣을 OCR/전처리 설정 (설정이 바뀌면 이전 결과를 쓰지 않도록) """
+    return {
+        'lang': OCR_LANG, 'psm': OCR_PSM, 'whitelist': OCR_CHAR_WHITELIST,
+        'threshold': [IMPRINT_THRESHOLD_BLOCK_SIZE, IMPRINT_THRESHOLD_C],
+        'early_exit': [OCR_EARLY_EXIT_CONFIDENCE, OCR_EARLY_EXIT_MIN_LENGTH],
+    }
+
+
+def get_imprint_with_confidence(original_pill_image, pill_mask, debug=False, bypass_cache=False):
+    """
+    알약 이미지에서 각인과 그 신뢰도를 추출합니다.
+    '어두운 각인'과 '밝은 각인' 두 가지 전처리 결과를 동시에 OCR하고, 한 결과가 충분히 확실하면 그 결과만 사용합니다.
+    크롭과 마스크가 모두 같은 입력은 OCR 결과 캐시에서 가져옵니다. (bypass_cache 또는 debug면 항상 OCR)
+
+    Returns:
+        tuple: (각인 문자열, 신뢰도 0~100). 찾지 못하면 ("", 0.0)
     """
+    text, confidence = cached_ocr(
+        get_ocr_pool().engine_name, _imprint_cache_params(), original_pill_image, pill_mask,
+        lambda: _recognize_imprint(original_pill_image, pill_mask, debug), bypass=bypass_cache or debug)
+    return text, confidence
+
+
+def _recognize_imprint(original_pill_image, pill_mask, debug):
+    """ ((각인 문자열, 신뢰도), 캐시 가능 여부). 인식에 실패한 변형이 있으면 캐시하지 않음 """
     logging.info("- [각인 분석] Tesseract OCR + 외곽선 추출 최종 분석 시작...")
 
-    # --- 1. 어두운 각인 추출 시도 (밝은 표면용) ---
-    preprocessed_dark = preprocess_for_dark_text(original_pill_image.copy(), pill_mask)
-    text_from_dark = run_tesseract(preprocessed_dark)
+    # --- 1, 2. 어두운 각인용(밝은 표면) / 밝은 각인용(어두운 표면) 전처리를 한 번에 ---
+    # (흑백 변환/블러/지역 평균을 공유하고 입력 이미지는 수정하지 않으므로 복사본이 필요 없음)
+    preprocessed_dark, preprocessed_bright = preprocess_imprint_variants(original_pill_image, pill_mask)
 
-    # --- 2. 밝은 각인 추출 시도 (어두운 표면용) ---
-    preprocessed_bright = preprocess_for_bright_text(original_pill_image.copy(), pill_mask)
-    text_from_bright = run_tesseract(preprocessed_bright)
+    # 두 전처리 결과를 동시에 OCR (확실한 결과가 나오면 나머지는 기다리지 않음)
+    variant_results = run_ocr_variants([preprocessed_dark, preprocessed_bright])
 
     if debug:
         logging.info("[디버그] 전처리된 이미지를 확인하세요. (창 1: 어두운 각인용, 창 2: 밝은 각인용)")
@@ -51,21 +174,28 @@ def get_imprint(original_pill_image, pill_mask, debug=False):
         cv2.destroyAllWindows()
 
     # --- 3. 결과 조합 ---
-    combined_results = set()  # 중복 제거
-    if text_from_dark:
-        combined_results.add(text_from_dark)
-    if text_from_bright:
-        combined_results.add(text_from_bright)
-
-    if not combined_results:
+    cacheable = all(result is None or result[1] is not None for result in variant_results)
+    completed = [result for result in variant_results if result is not None and result[0]]
+    confident = [result for result in completed if is_confident_imprint(*result)]
+    if confident:
+        final_text, confidence = max(confident, key=lambda result: result[1])
+    elif completed:
+        # 확실한 결과가 없으면 찾은 각인을 모두 (신뢰도 높은 순으로, 중복 제거) 조합
+        completed.sort(key=lambda result: result[1], reverse=True)
+        final_text = "/".join(dict.fromkeys(text for text, _ in completed))
+        confidence = completed[0][1]
+    else:
         logging.warning("  - [각인 분석] 최종 각인을 찾지 못했습니다.")
-        # [수정] 튜플이 아닌 빈 문자열 반환
-        return ""
-
-    final_text = "/".join(combined_results)
-    confidence = 70.0  # 임시 신뢰도
+        return ("", 0.0), cacheable
 
     logging.info(f"  - [각인 분석] 최종 식별된 각인: '{final_text}' (신뢰도: {confidence:.2f}%)")
+    return (final_text, confidence), cacheable
 
-    # [수정] 튜플이 아닌 최종 텍스트 문자열만 반환
-    return final_text
\ No newline at end of file
+
+def get_imprint(original_pill_image, pill_mask, debug=False, bypass_cache=False):
+    """
+    알약 이미지에서 각인을 추출합니다.
+    [수정] '어두운 각인'과 '밝은 각인' 두 가지 전처리를 모두 실행하고,
+    최종적으로 문자열(string)만 반환합니다. (신뢰도가 필요하면 get_imprint_with_confidence 사용)
+    """
+    return get_imprint_with_confidence(original_pill_image, pill_mask, debug, bypass_cache)[0]
@@ -2,72 +2,209 @@ import os
 import re
 import cv2
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import vision
 
+# 같은 크롭의 반복 요청은 OCR 결과 캐시에서 (유료 API 호출 절약)
+from ocr_cache import cached_ocr_batch
+from ocr_mosaic import build_mosaics, MOSAIC_CROP_SIDE, MOSAIC_PADDING
+
 
 
 KEY_PATH = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
-try:
-    if KEY_PATH is None:
-        logging.error("=" * 50)
-        logging.error(" [오류] .env 파일에 'GOOGLE_APPLICATION_CREDENTIALS'가 설정되지 않았습니다.")
-        logging.error("=" * 50)
-        client = None
-    elif not os.path.exists(KEY_PATH):
-        logging.error("=" * 50)
-        logging.error(f" [오류] .env에 설정된 .json 파일 경로를 찾을 수 없습니다: {KEY_PATH}")
-        logging.error("=" * 50)
-        client = None
-    else:
-        client = vision.ImageAnnotatorClient()
-        logging.info("--- Google Vision 클라이언트 초기화 성공! ---")
+# --- 배치 요청 설정 ---
+# 한 이미지의 모든 알약 크롭을 batch_annotate_images 한 번으로 보내 왕복 지연을 알약 수만큼 지불하지 않습니다.
+# Vision API 동기 요청 한 번에 넣을 수 있는 최대 이미지 수 (API 제한 16)
+VISION_BATCH_SIZE = min(int(os.getenv("VISION_BATCH_SIZE", "16")), 16)
+# 요청 하나에 담을 최대 이미지 바이트 (요청 본문 10MB 제한, base64로 약 4/3배 커짐)
+VISION_BATCH_MAX_BYTES = int(os.getenv("VISION_BATCH_MAX_BYTES", str(7 * 2 ** 20)))
+# 요청 하나의 제한 시간 (초)
+VISION_TIMEOUT = float(os.getenv("VISION_TIMEOUT", "10"))
+# 프로세스 전체에서 동시에 보낼 수 있는 최대 Vision 요청 수
+VISION_MAX_CONCURRENCY = int(os.getenv("VISION_MAX_CONCURRENCY", "4"))
+# Vision 호환 엔드포인트 (예: 로컬 스텁 http://127.0.0.1:8089). 지정하면 인증 없이 REST로 호출
+VISION_ENDPOINT = os.getenv("VISION_ENDPOINT")
+# 1이면 알약 크롭들을 모자이크 한 장으로 묶어 이미지 하나로 텍스트 감지 (ocr_mosaic.py, 이미지당 과금/전송량 절약)
+VISION_MOSAIC = os.getenv("VISION_MOSAIC", "0") == "1"
+
+_VISION_SLOTS = threading.BoundedSemaphore(max(1, VISION_MAX_CONCURRENCY))
 
-except Exception as e:
-    logging.error(f"Google Vision 클라이언트 초기화 오류: {e}")
-    logging.error("1. .env의 .json 파일이 올바른지, 2. Google Cloud에서 'Cloud Vision API'를 '사용 설정'했는지 확인하세요.")
-    client = None
+
+def create_vision_client(endpoint=None):
+    """ Vision 클라이언트를 만듭니다. (인증 정보가 없거나 초기화에 실패하면 None) """
+    if endpoint:
+        from google.auth.credentials import AnonymousCredentials
+        logging.info(f"--- Google Vision 호환 엔드포인트를 사용합니다: {endpoint} ---")
+        return vision.ImageAnnotatorClient(transport="rest", credentials=AnonymousCredentials(),
+                                           client_options={"api_endpoint": endpoint})
+    try:
+        if KEY_PATH is None:
+            logging.error("=" * 50)
+            logging.error(" [오류] .env 파일에 'GOOGLE_APPLICATION_CREDENTIALS'가 설정되지 않았습니다.")
+            logging.error("=" * 50)
+            return None
+        elif not os.path.exists(KEY_PATH):
+            logging.error("=" * 50)
+            logging.error(f" [오류] .env에 설정된 .json 파일 경로를 찾을 수 없습니다: {KEY_PATH}")
+            logging.error("=" * 50)
+            return None
+        else:
+            vision_client = vision.ImageAnnotatorClient()
+            logging.info("--- Google Vision 클라이언트 초기화 성공! ---")
+            return vision_client
+
+    except Exception as e:
+        logging.error(f"Google Vision 클라이언트 초기화 오류: {e}")
+        logging.error("1. .env의 .json 파일이 올바른지, 2. Google Cloud에서 'Cloud Vision API'를 '사용 설정'했는지 확인하세요.")
+        return None
+
+
+client = create_vision_client(VISION_ENDPOINT)
 
 
 # ----------------------------------------------------------------------
 
-def analyze_imprint_google(original_pill_image):
+# 캐시 키에 넣을 엔진 설정 (요청 방식이나 결과 정제 방식이 바뀌면 함께 바꿈)
+GOOGLE_OCR_CACHE_PARAMS = {'feature': 'TEXT_DETECTION', 'encoding': 'jpg', 'clean': 'alnum_upper'}
+
+
+def _clean_text(full_text):
+    # 영숫자만 남기고 대문자화
+    return re.sub(r'[\W_]+', '', full_text).strip().upper()
+
+
+def _split_batches(encoded_images, batch_size=VISION_BATCH_SIZE, max_bytes=VISION_BATCH_MAX_BYTES):
+    """ 이미지 순서를 유지하며 요청당 이미지 수/바이트 제한에 맞게 인덱스 묶음으로 나눕니다. """
+    batches, current, current_bytes = [], [], 0
+    for i, content in enumerate(encoded_images):
+        if current and (len(current) >= batch_size or current_bytes + len(content) > max_bytes):
+            batches.append(current)
+            current, current_bytes = [], 0
+        current.append(i)
+        current_bytes += len(content)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _parse_response(response):
+    """ 이미지 하나의 응답 → (정제된 텍스트, 캐시 가능 여부). API 오류로 얻은 빈 결과는 캐시하지 않음 """
+    if response.error.message:
+        print(f"    - Google API 오류: {response.error.message}")
+        return "", False
+    texts = response.text_annotations
+    # 첫 번째 결과(texts[0])는 이미지의 모든 텍스트를 합친 것입니다.
+    cleaned_text = _clean_text(texts[0].description) if texts else ""
+    print(f"      => 결과: '{cleaned_text}'")
+    return cleaned_text, True
+
+
+def annotate_batch(vision_client, contents, timeout=VISION_TIMEOUT):
+    """ 인코딩된 이미지들을 batch_annotate_images 요청 한 번으로 텍스트 감지 (응답은 요청 순서대로) """
+    requests = [
+        vision.AnnotateImageRequest(image=vision.Image(content=content),
+                                    features=[vision.Feature(type_=vision.Feature.Type.TEXT_DETECTION)])
+        for content in contents
+    ]
+    with _VISION_SLOTS:
+        return vision_client.batch_annotate_images(requests=requests, timeout=timeout).responses
+
+
+def _word_annotations(response):
+    """ 단어별 감지 결과 [(글자, 꼭짓점 [(x, y), ...]), ...] (전체 텍스트인 첫 항목 제외) """
+    return [(annotation.description, [(vertex.x, vertex.y) for vertex in annotation.bounding_poly.vertices])
+            for annotation in response.text_annotations[1:]]
+
+
+def detect_texts_mosaic(images, masks=None, vision_client=None, timeout=VISION_TIMEOUT, crop_side=MOSAIC_CROP_SIDE):
     """
-    YOLO가 잘라낸 '원본' 이미지를 Google Vision API로 분석하여 각인 텍스트를 추출
+    크롭들을 모자이크로 묶어 텍스트 감지를 요청 한 번(보통 이미지 한 장)으로 실행하고,
+    감지된 단어를 위치에 따라 알약별로 나눠 입력 순서대로 (정제된 텍스트, 캐시 가능 여부) 리스트를 반환합니다.
+    """
+    vision_client = vision_client or client
+    results = [("", False)] * len(images)
+    if not images:
+        return results
+
+    mosaics = build_mosaics(images, masks, crop_side)
+    print(f"    - Google Vision API 분석 시도... (알약 {len(images)}개, 모자이크 {len(mosaics)}장)")
+    encoded_images = [cv2.imencode('.jpg', mosaic.image)[1].tobytes() for mosaic in mosaics]
+    for indices in _split_batches(encoded_images):
+        try:
+            responses = annotate_batch(vision_client, [encoded_images[i] for i in indices], timeout)
+        except Exception as e:
+            print(f"    - Google Vision API 호출 오류: {e}")
+            continue
+        for i, response in zip(indices, responses):
+            if response.error.message:
+                print(f"    - Google API 오류: {response.error.message}")
+                continue
+            for index, words in mosaics[i].assign_words(_word_annotations(response)).items():
+                results[index] = (_clean_text(" ".join(words)), True)
+                print(f"      => 알약 #{index + 1} 결과: '{results[index][0]}'")
+    return results
+
+
+def detect_texts_batch(images, vision_client=None, timeout=VISION_TIMEOUT, batch_size=VISION_BATCH_SIZE):
+    """
+    여러 크롭을 배치 요청으로 텍스트 감지하여 입력 순서대로 (정제된 텍스트, 캐시 가능 여부) 리스트를 반환합니다.
+    크롭이 batch_size보다 많으면 요청을 나눠 최대 VISION_MAX_CONCURRENCY개까지 동시에 보냅니다.
+    """
+    vision_client = vision_client or client
+    results = [("", False)] * len(images)
+    if not images:
+        return results
+
+    print(f"    - Google Vision API 분석 시도... (알약 {len(images)}개)")
+    # OpenCV 이미지(numpy)를 Google API가 읽을 수 있는 bytes로 변환
+    encoded_images = [cv2.imencode('.jpg', image)[1].tobytes() for image in images]
+
+    def run(indices):
+        try:
+            responses = annotate_batch(vision_client, [encoded_images[i] for i in indices], timeout)
+        except Exception as e:
+            print(f"    - Google Vision API 호출 오류: {e}")
+            return
+        for i, response in zip(indices, responses):
+            results[i] = _parse_response(response)
+
+    batches = _split_batches(encoded_images, batch_size)
+    if len(batches) == 1:
+        run(batches[0])
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(batches), max(1, VISION_MAX_CONCURRENCY))) as executor:
+            list(executor.map(run, batches))
+    return results
+
+
+def analyze_imprints_google(pill_images, pill_masks=None, bypass_cache=False):
+    """
+    한 이미지에서 잘라낸 모든 알약 크롭의 각인을 Google Vision 배치 요청으로 추출하여 크롭 순서대로 반환합니다.
+    VISION_MOSAIC이면 크롭들을 모자이크 한 장으로 묶어 요청합니다. (pill_masks로 배경을 지움)
+    요청에 쓰이는 입력(배치 요청은 크롭, 모자이크는 크롭과 마스크)이 같은 크롭은 OCR 결과 캐시에서 가져오고,
+    나머지만 요청합니다.
+    (bypass_cache면 모두 요청)
     """
     if client is None:
         logging.error("Google Vision 클라이언트가 초기화되지 않아 OCR을 건너뜁니다.")
-        return ""
+        return [""] * len(pill_images)
 
-    print("    - Google Vision API 분석 시도...")
+    if VISION_MOSAIC:
+        # 축소/배경 제거된 이미지로 인식하므로 크롭별 요청 결과와 캐시를 나눔
+        params = dict(GOOGLE_OCR_CACHE_PARAMS, mosaic=[MOSAIC_CROP_SIDE, MOSAIC_PADDING])
+        return cached_ocr_batch("google_vision", params, pill_images, pill_masks,
+                                lambda images, masks: detect_texts_mosaic(images, masks), bypass=bypass_cache)
+    # 배치 요청은 배경을 지우지 않은 크롭을 그대로 보내므로 마스크 없이 크롭만으로 키를 만듦
+    return cached_ocr_batch("google_vision", GOOGLE_OCR_CACHE_PARAMS, pill_images, None,
+                            lambda images, masks: detect_texts_batch(images), bypass=bypass_cache)
 
-    try:
-        # OpenCV 이미지(numpy)를 Google API가 읽을 수 있는 bytes로 변환
-        _, buffer = cv2.imencode('.jpg', original_pill_image)
-        image_bytes = buffer.tobytes()
-
-        image = vision.Image(content=image_bytes)
-
-        # API 호출 (텍스트 감지)
-        response = client.text_detection(image=image)
-        texts = response.text_annotations
-
-        if response.error.message:
-            print(f"    - Google API 오류: {response.error.message}")
-            return ""
-
-        # 결과 파싱
-        if texts:
-            # 첫 번째 결과(texts[0])는 이미지의 모든 텍스트를 합친 것입니다.
-            full_text = texts[0].description
-            # 영숫자만 남기고 대문자화
-            cleaned_text = re.sub(r'[\W_]+', '', full_text).strip().upper()
-            print(f"      => 결과: '{cleaned_text}'")
-            return cleaned_text
-        else:
-            print("      => 결과: ''")
-            return ""
 
-    except Exception as e:
-        print(f"    - Google Vision API 호출 오류: {e}")
-        return ""
\ No newline at end of file
+def analyze_imprint_google(original_pill_image, pill_mask=None, bypass_cache=False):
+    """
+    YOLO가 잘라낸 '원본' 이미지를 Google Vision API로 분석하여 각인 텍스트를 추출
+    요청에 쓰이는 입력이 같은 크롭은 OCR 결과 캐시에서 가져와 API를 다시 호출하지 않습니다.
+    (bypass_cache면 항상 호출. 여러 알약은 analyze_imprints_google로 한 번에)
+    """
+    return analyze_imprints_google([original_pill_image], [pill_mask], bypass_cache)[0]
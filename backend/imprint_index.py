@@ -0,0 +1,238 @@
+import os
+import threading
+
+import numpy as np
+
+# --- 각인 n-gram 역색인 ---
+# 정규화된 DB 각인(앞, 뒤, 앞+뒤)의 문자 n-gram으로 역색인을 만들어, 인식된 각인과 n-gram이 많이 겹치는
+# 각인만 후보로 골라 fuzz.ratio(레벤슈타인) 점수를 정확히 계산하게 합니다.
+# 나머지 각인은 n-gram 겹침(Dice 계수)으로 추정한 유사도를 사용합니다.
+# 색인은 정렬된 n-gram 배열 + CSR(indptr, field_ids) 배열로만 구성되어 그대로 파일로 저장할 수 있습니다.
+
+# 1-gram은 fuzz.ratio처럼 글자 단위 일치를, 2/3-gram은 글자 순서를 반영
+NGRAM_SIZES = (1, 2, 3)
+# 각인 점수를 정확히 계산할 최대 후보 각인 수 (0이면 색인을 쓰지 않고 전체 계산)
+# 색인으로 고르지 못한 각인은 추정 유사도로 순위가 바뀌므로 기본값은 0(정확한 순위)입니다.
+# benchmarks/check_imprint_recall 기준 pill.csv는 512, 합성 1만 행은 1024에서야 recall@10이 0.99 이상이므로
+# 켜려면 DB 규모에 맞춰 재현율을 확인한 뒤 설정하세요.
+IMPRINT_CANDIDATE_LIMIT = int(os.getenv("IMPRINT_CANDIDATE_LIMIT", "0"))
+
+# 문자열 경계 표시 (2-gram 이상에만 붙임. 정규화된 각인에는 나오지 않는 문자)
+_PAD_START, _PAD_END = '^', '$'
+
+
+def imprint_ngrams(text, sizes=NGRAM_SIZES):
+    """ 각인 문자열의 n-gram 집합 (2-gram 이상은 경계 표시를 붙여 시작/끝 글자를 구분) """
+    if not text:
+        return set()
+    padded = f"{_PAD_START}{text}{_PAD_END}"
+    grams = set()
+    for n in sizes:
+        source = text if n == 1 else padded
+        grams.update(source[i:i + n] for i in range(len(source) - n + 1))
+    return grams
+
+
+def _remap_documents(documents, previous_documents):
+    """
+    (이전 문서 번호 → 새 문서 번호 배열(없어진 문서는 -1), 새 문서 중 이전 색인에 있던 문서 표시) 반환
+    """
+    reused = np.zeros(len(documents), dtype=bool)
+    if previous_documents is None:
+        return np.zeros(0, dtype=np.int32), reused
+    new_ids = {doc: i for i, doc in enumerate(documents)}
+    old_to_new = np.array([new_ids.get(doc, -1) for doc in previous_documents], dtype=np.int32)
+    reused[old_to_new[old_to_new >= 0]] = True
+    return old_to_new, reused
+
+
+def _build_csr(term_column, id_column):
+    """ (용어, 번호) 포스팅 목록으로 (정렬된 용어 배열, indptr, 용어별로 정렬된 번호 배열)을 만듭니다. """
+    if len(term_column) == 0:
+        return np.array([], dtype='<U1'), np.zeros(1, dtype=np.int64), np.array([], dtype=np.int32)
+    order = np.lexsort((id_column, term_column))
+    term_column, id_column = term_column[order], id_column[order]
+    terms, starts = np.unique(term_column, return_index=True)
+    indptr = np.append(starts, len(term_column)).astype(np.int64)
+    return terms, indptr, id_column.astype(np.int32)
+
+
+class ImprintNgramIndex:
+    """
+    각인 필드(문서마다 앞, 뒤, 앞+뒤 중 비어 있지 않은 것)에 대한 n-gram 역색인.
+      - grams: 정렬된 n-gram 배열 (np.str_)
+      - indptr, field_ids: grams[i]를 포함하는 필드 번호는 field_ids[indptr[i]:indptr[i + 1]]
+      - field_docs: 필드별 문서(고유 각인 쌍) 번호
+      - field_gram_counts: 필드별 n-gram 수
+    """
+
+    def __init__(self, grams, indptr, field_ids, field_docs, field_gram_counts, n_docs):
+        self.grams = grams
+        self.indptr = indptr
+        self.field_ids = field_ids
+        self.field_docs = field_docs
+        self.field_gram_counts = field_gram_counts
+        self.n_docs = n_docs
+
+    @classmethod
+    def build(cls, documents, previous=None, previous_documents=None):
+        """
+        documents: 문서별 정규화 각인 (앞, 뒤) 튜플 리스트
+        previous(이전 색인)와 previous_documents를 주면, 그대로 남아 있는 문서의 포스팅은 이전 색인에서 옮겨 오고
+        새로 생긴 문서의 n-gram만 계산합니다. (DB 증분 갱신용. 문서 목록이 그대로면 이전 색인을 그대로 사용)
+        """
+        if previous is not None and previous_documents == documents:
+            return previous
+        old_to_new, reused = _remap_documents(documents, previous_documents)
+        gram_parts, field_parts, doc_parts, count_parts = [], [], [], []
+        n_fields = 0
+        if previous is not None:
+            keep_field = old_to_new[previous.field_docs] >= 0
+            n_fields = int(np.count_nonzero(keep_field))
+            new_field_ids = np.full(len(previous.field_docs), -1, dtype=np.int32)
+            new_field_ids[keep_field] = np.arange(n_fields, dtype=np.int32)
+
+            posting_grams = np.repeat(previous.grams, np.diff(previous.indptr))
+            keep_posting = keep_field[previous.field_ids]
+            gram_parts.append(posting_grams[keep_posting])
+            field_parts.append(new_field_ids[previous.field_ids[keep_posting]])
+            doc_parts.append(old_to_new[previous.field_docs[keep_field]])
+            count_parts.append(np.asarray(previous.field_gram_counts)[keep_field])
+
+        field_grams, field_docs = [], []
+        for doc in np.flatnonzero(~reused):
+            front, back = documents[doc]
+            for field in dict.fromkeys((front, back, front + back)):
+                if field:
+                    field_grams.append(imprint_ngrams(field))
+                    field_docs.append(doc)
+        postings = [(gram, n_fields + field) for field, grams in enumerate(field_grams) for gram in grams]
+        gram_parts.append(np.array([gram for gram, _ in postings], dtype=str))
+        field_parts.append(np.array([field for _, field in postings], dtype=np.int32))
+        doc_parts.append(np.array(field_docs, dtype=np.int32))
+        count_parts.append(np.array([len(g) for g in field_grams], dtype=np.int32))
+
+        grams, indptr, field_ids = _build_csr(np.concatenate(gram_parts), np.concatenate(field_parts))
+        return cls(grams, indptr, field_ids, np.concatenate(doc_parts).astype(np.int32),
+                   np.concatenate(count_parts).astype(np.int32), len(documents))
+
+    def estimate_similarity(self, text):
+        """
+        문서별 추정 유사도(0~100): 필드마다 n-gram Dice 계수를 계산하고, 문서 안에서 가장 높은 값을 사용
+        (fuzz.ratio를 앞/뒤/앞+뒤 중 최댓값으로 쓰는 calculate_imprint_score와 같은 구조)
+        """
+        similarity = np.zeros(self.n_docs, dtype=np.float64)
+        query = np.array(sorted(imprint_ngrams(text)))
+        if len(query) == 0 or len(self.grams) == 0:
+            return similarity
+
+        positions = np.searchsorted(self.grams, query)
+        found = positions < len(self.grams)
+        found[found] = self.grams[positions[found]] == query[found]
+        positions = positions[found]
+        if len(positions) == 0:
+            return similarity
+
+        postings = np.concatenate([self.field_ids[self.indptr[p]:self.indptr[p + 1]] for p in positions])
+        overlap = np.bincount(postings, minlength=len(self.field_docs))
+        dice = 200.0 * overlap / (len(query) + self.field_gram_counts)
+        np.maximum.at(similarity, self.field_docs, dice)
+        return similarity
+
+    def search(self, text, limit):
+        """
+        추정 유사도가 높은 문서 번호를 최대 limit개 골라 (문서 번호 배열, 문서별 추정 유사도)를 반환합니다.
+        (겹치는 n-gram이 없는 문서는 제외)
+        """
+        similarity = self.estimate_similarity(text)
+        matched = np.flatnonzero(similarity)
+        if len(matched) > limit:
+            matched = matched[np.argpartition(-similarity[matched], limit - 1)[:limit]]
+        return matched, similarity
+
+
+# --- OCR 혼동 문자를 접은 정규 각인 키 ---
+# OCR은 0/O, 1/I/L, 5/S, 8/B를 자주 혼동하고 앞/뒤 순서도 알 수 없으므로,
+# 혼동 문자를 한 문자로 접은 키(앞, 뒤, 앞+뒤, 뒤+앞)를 해시 맵에 넣어 두고
+# 인식된 각인의 키가 정확히 일치한 각인 쌍은 n-gram 색인 선택(IMPRINT_CANDIDATE_LIMIT)과 관계없이 항상
+# fuzz.ratio로 정확히 계산합니다. 후보 행 자체는 바꾸지 않으므로, 전체 계산(IMPRINT_CANDIDATE_LIMIT=0)에서는
+# 조회하지 않고 순위도 그대로입니다.
+
+IMPRINT_CANONICAL_KEYS = os.getenv("IMPRINT_CANONICAL_KEYS", "1") == "1"
+
+_CONFUSION_FOLD = str.maketrans({'O': '0', 'I': '1', 'L': '1', 'S': '5', 'B': '8'})
+
+_KEY_STATS = {'hits': 0, 'misses': 0}
+_KEY_STATS_LOCK = threading.Lock()
+
+
+def fold_confusions(text):
+    """ 정규화된 각인의 OCR 혼동 문자를 대표 문자로 바꿉니다. (예: 'SOL10' → '50110') """
+    return text.translate(_CONFUSION_FOLD)
+
+
+def canonical_imprint_keys(front, back):
+    """ 정규화된 DB 각인 (앞, 뒤)의 정규 키 집합 (앞/뒤 순서와 무관하게 찾을 수 있도록 두 순서를 모두 포함) """
+    keys = {front, back, front + back, back + front}
+    return {fold_confusions(key) for key in keys if key}
+
+
+def get_imprint_key_stats():
+    """ 정규 각인 키 조회의 적중/실패 횟수와 적중률을 반환합니다. """
+    with _KEY_STATS_LOCK:
+        stats = dict(_KEY_STATS)
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    return stats
+
+
+class ImprintKeyIndex:
+    """
+    정규 키 → 문서(고유 각인 쌍) 번호 해시 맵.
+    정렬된 키 배열 + CSR(indptr, doc_ids)로 보관하고, 조회용 dict(키 → 키 위치)는 처음 조회할 때 만듭니다.
+    """
+
+    def __init__(self, keys, indptr, doc_ids):
+        self.keys = keys
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self._positions = None
+
+    @classmethod
+    def build(cls, documents, previous=None, previous_documents=None):
+        """
+        documents: 문서별 정규화 각인 (앞, 뒤) 튜플 리스트
+        previous(이전 키 색인)를 주면 남아 있는 문서의 키는 옮겨 오고 새 문서의 키만 계산합니다.
+        (문서 목록이 그대로면 이전 색인을 그대로 사용)
+        """
+        if previous is not None and previous_documents == documents:
+            return previous
+        old_to_new, reused = _remap_documents(documents, previous_documents)
+        key_parts, doc_parts = [], []
+        if previous is not None:
+            posting_keys = np.repeat(previous.keys, np.diff(previous.indptr))
+            posting_docs = old_to_new[previous.doc_ids]
+            keep = posting_docs >= 0
+            key_parts.append(posting_keys[keep])
+            doc_parts.append(posting_docs[keep])
+
+        postings = [(key, doc) for doc in np.flatnonzero(~reused)
+                    for key in canonical_imprint_keys(*documents[doc])]
+        key_parts.append(np.array([key for key, _ in postings], dtype=str))
+        doc_parts.append(np.array([doc for _, doc in postings], dtype=np.int32))
+
+        keys, indptr, doc_ids = _build_csr(np.concatenate(key_parts), np.concatenate(doc_parts))
+        return cls(keys, indptr, doc_ids)
+
+    def lookup(self, text):
+        """ 정규화된 인식 각인의 정규 키와 정확히 일치하는 문서 번호 배열 (없으면 빈 배열) """
+        if self._positions is None:
+            self._positions = {key: i for i, key in enumerate(self.keys.tolist())}
+        position = self._positions.get(fold_confusions(text))
+
+        with _KEY_STATS_LOCK:
+            _KEY_STATS['hits' if position is not None else 'misses'] += 1
+
+        if position is None:
+            return np.array([], dtype=np.int32)
+        return self.doc_ids[self.indptr[position]:self.indptr[position + 1]]
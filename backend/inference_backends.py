@@ -0,0 +1,274 @@
+import abc
+import os
+import logging
+
+import cv2
+import numpy as np
+
+# --- 추론 백엔드 계층 ---
+# 탐지 모델(Ultralytics)과 모양 모델(Keras)을 CPU 전용 런타임(ONNX Runtime / OpenVINO / TFLite)으로
+# 내보낸 파일도 같은 인터페이스로 사용할 수 있게 해줍니다.
+#   - 탐지 백엔드: predict(source, conf=..., ...) -> 이미지별 결과 리스트 (result.boxes[i].xyxy / .conf)
+#   - 모양 백엔드: predict_batch(x) -> (N, 클래스 수) 확률 배열
+# 어떤 파일을 쓸지는 INFERENCE_BACKEND 환경 변수로 선택합니다.
+
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "native")
+
+# 백엔드별 (탐지 모델 경로, 모양 모델 경로). export_models.py가 만드는 파일 이름과 같아야 함
+BACKEND_MODEL_PATHS = {
+    'native': ("weights/detection_model.pt", "weights/shape_model.h5"),
+    'onnx': ("weights/detection_model.onnx", "weights/shape_model.onnx"),
+    'openvino': ("weights/detection_model_openvino_model/detection_model.xml", "weights/shape_model_openvino_model/shape_model.xml"),
+    # TFLite는 모양 모델에만 적용하고, 탐지는 ONNX Runtime으로 실행
+    'tflite': ("weights/detection_model.onnx", "weights/shape_model.tflite"),
+    'tflite-int8': ("weights/detection_model.onnx", "weights/shape_model_int8.tflite"),
+}
+
+DETECTION_IMGSZ = 640
+DETECTION_IOU = 0.7  # Ultralytics 기본 NMS IoU와 동일
+
+
+def resolve_model_paths(backend=None):
+    """ 백엔드 이름에 해당하는 (탐지 모델 경로, 모양 모델 경로)를 반환합니다. """
+    backend = backend or INFERENCE_BACKEND
+    if backend not in BACKEND_MODEL_PATHS:
+        raise ValueError(f"알 수 없는 추론 백엔드입니다: {backend} (사용 가능: {', '.join(BACKEND_MODEL_PATHS)})")
+    return BACKEND_MODEL_PATHS[backend]
+
+
+# ----------------------------------------------------------------------
+# 탐지 백엔드
+# ----------------------------------------------------------------------
+
+class DetectionBox:
+    """ Ultralytics Boxes의 원소와 같은 방식(box.xyxy[0], box.conf[0])으로 접근할 수 있는 박스 """
+
+    def __init__(self, xyxy, conf):
+        self.xyxy = [xyxy]
+        self.conf = [conf]
+
+
+class DetectionResult:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+def letterbox(image, new_size=DETECTION_IMGSZ, color=(114, 114, 114)):
+    """ Ultralytics와 같은 방식으로 비율을 유지하며 정사각형 입력으로 리사이징/패딩합니다. """
+    h, w = image.shape[:2]
+    r = min(new_size / h, new_size / w)
+    new_w, new_h = int(round(w * r)), int(round(h * r))
+    dw, dh = (new_size - new_w) / 2, (new_size - new_h) / 2
+
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return image, r, (left, top)
+
+
+class ExportedYoloDetector(abc.ABC):
+    """
+    내보낸 YOLOv8 탐지 모델을 PyTorch 없이 실행하는 공통 구현.
+    출력 텐서 (N, 4 + 클래스 수, 앵커 수)를 박스로 디코딩하고 원본 좌표로 되돌립니다.
+    """
+
+    def __init__(self, imgsz=DETECTION_IMGSZ):
+        self.imgsz = imgsz
+
+    @abc.abstractmethod
+    def _run(self, batch):
+        """ (N, 3, imgsz, imgsz) 입력 배치를 실행해 (N, 4 + 클래스 수, 앵커 수) 출력을 반환합니다. """
+
+    def _prepare(self, source):
+        image = cv2.imread(source) if isinstance(source, str) else source
+        if image is None:
+            raise ValueError(f"이미지를 불러올 수 없습니다: {source}")
+        padded, ratio, pad = letterbox(image, self.imgsz)
+        tensor = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB).transpose(2, 0, 1).astype(np.float32) / 255.0
+        return tensor, ratio, pad, image.shape[:2]
+
+    def _decode(self, output, ratio, pad, shape, conf):
+        predictions = output.T  # (앵커 수, 4 + 클래스 수)
+        scores = predictions[:, 4:].max(axis=1)
+        keep = scores > conf
+        predictions, scores = predictions[keep], scores[keep]
+        if len(predictions) == 0:
+            return DetectionResult([])
+
+        cx, cy, bw, bh = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+        boxes = np.stack([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2], axis=1)
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / ratio
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / ratio
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, shape[0])
+
+        xywh = [[float(b[0]), float(b[1]), float(b[2] - b[0]), float(b[3] - b[1])] for b in boxes]
+        indices = cv2.dnn.NMSBoxes(xywh, scores.tolist(), score_threshold=conf, nms_threshold=DETECTION_IOU)
+        order = np.array(indices).flatten() if len(indices) > 0 else []
+        return DetectionResult([DetectionBox(boxes[i].tolist(), float(scores[i])) for i in order])
+
+    def predict(self, source, conf=0.25, **kwargs):
+        sources = source if isinstance(source, (list, tuple)) else [source]
+        prepared = [self._prepare(s) for s in sources]
+        outputs = self._run(np.stack([p[0] for p in prepared]))
+        return [
+            self._decode(out, ratio, pad, shape, conf)
+            for out, (_, ratio, pad, shape) in zip(outputs, prepared)
+        ]
+
+
+class OnnxYoloDetector(ExportedYoloDetector):
+    def __init__(self, model_path, imgsz=DETECTION_IMGSZ, num_threads=None):
+        super().__init__(imgsz)
+        self.session = _create_onnx_session(model_path, num_threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVinoYoloDetector(ExportedYoloDetector):
+    def __init__(self, model_path, imgsz=DETECTION_IMGSZ, num_threads=None):
+        super().__init__(imgsz)
+        self.compiled = _compile_openvino(model_path, num_threads)
+
+    def _run(self, batch):
+        return self.compiled(batch)[self.compiled.output(0)]
+
+
+def load_detection_backend(model_path, **options):
+    """
+    경로 확장자에 맞는 탐지 백엔드를 생성합니다.
+    .onnx / .xml 은 PyTorch 없이 직접 실행하고, 그 외(.pt, Ultralytics 내보내기 폴더 등)는 Ultralytics로 로드합니다.
+    """
+    ext = os.path.splitext(model_path)[1].lower()
+    if ext == '.onnx':
+        return OnnxYoloDetector(model_path, **options)
+    if ext == '.xml':
+        return OpenVinoYoloDetector(model_path, **options)
+
+    from ultralytics import YOLO
+    if ext != '.pt':
+        options.setdefault('task', 'detect')
+    return YOLO(model_path, **options)
+
+
+# ----------------------------------------------------------------------
+# 모양 분류 백엔드
+# ----------------------------------------------------------------------
+
+class ShapeBackend(abc.ABC):
+    """ 모양 분류 백엔드 공통 인터페이스 (Keras의 model.predict 호출 형식도 지원) """
+
+    @abc.abstractmethod
+    def predict_batch(self, batch):
+        """ (N, H, W, C) 입력 배치를 실행해 (N, 클래스 수) 확률 배열을 반환합니다. """
+
+    def predict(self, batch, **kwargs):
+        return self.predict_batch(np.asarray(batch, dtype=np.float32))
+
+
+class OnnxShapeBackend(ShapeBackend):
+    def __init__(self, model_path, num_threads=None):
+        self.session = _create_onnx_session(model_path, num_threads)
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict_batch(self, batch):
+        return self.session.run(None, {self.input_name: batch.astype(np.float32)})[0]
+
+
+class OpenVinoShapeBackend(ShapeBackend):
+    def __init__(self, model_path, num_threads=None):
+        self.compiled = _compile_openvino(model_path, num_threads)
+
+    def predict_batch(self, batch):
+        return self.compiled(batch.astype(np.float32))[self.compiled.output(0)]
+
+
+class TFLiteShapeBackend(ShapeBackend):
+    """
+    TFLite 모델 실행 (int8 양자화 모델 포함).
+    가벼운 tflite_runtime이 설치되어 있으면 사용하고, 없으면 TensorFlow의 인터프리터를 사용합니다.
+    인터프리터는 스레드 안전하지 않으므로 모델 레지스트리 핸들의 잠금 아래에서 호출해야 합니다.
+    """
+
+    def __init__(self, model_path, num_threads=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=model_path, num_threads=num_threads)
+        self.input_detail = self.interpreter.get_input_details()[0]
+        self.output_detail = self.interpreter.get_output_details()[0]
+        self._batch_size = None
+
+    def _resize(self, batch_size):
+        if self._batch_size == batch_size:
+            return
+        shape = list(self.input_detail['shape'])
+        shape[0] = batch_size
+        self.interpreter.resize_tensor_input(self.input_detail['index'], shape)
+        self.interpreter.allocate_tensors()
+        self._batch_size = batch_size
+
+    def predict_batch(self, batch):
+        self._resize(len(batch))
+        input_dtype = self.input_detail['dtype']
+        if input_dtype != np.float32:
+            # 정수 양자화 입력: 실수값을 (scale, zero_point)로 양자화
+            scale, zero_point = self.input_detail['quantization']
+            batch = np.clip(np.round(batch / scale + zero_point), np.iinfo(input_dtype).min, np.iinfo(input_dtype).max)
+        self.interpreter.set_tensor(self.input_detail['index'], batch.astype(input_dtype))
+        self.interpreter.invoke()
+
+        output = self.interpreter.get_tensor(self.output_detail['index'])
+        if output.dtype != np.float32:
+            scale, zero_point = self.output_detail['quantization']
+            output = (output.astype(np.float32) - zero_point) * scale
+        return output
+
+
+def load_shape_backend(model_path, **options):
+    """
+    경로 확장자에 맞는 모양 분류 백엔드를 생성합니다.
+    .h5 / .keras 는 Keras 모델을 그대로 반환합니다. (shape_analysis에서 컴파일된 순전파로 실행)
+    """
+    ext = os.path.splitext(model_path)[1].lower()
+    if ext == '.onnx':
+        return OnnxShapeBackend(model_path, **options)
+    if ext == '.xml':
+        return OpenVinoShapeBackend(model_path, **options)
+    if ext == '.tflite':
+        return TFLiteShapeBackend(model_path, **options)
+
+    from tensorflow.keras.models import load_model
+    return load_model(model_path, **options)
+
+
+# ----------------------------------------------------------------------
+# 런타임 헬퍼
+# ----------------------------------------------------------------------
+
+def _create_onnx_session(model_path, num_threads=None):
+    import onnxruntime as ort
+    session_options = ort.SessionOptions()
+    session_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if num_threads:
+        session_options.intra_op_num_threads = num_threads
+    logging.info(f"[추론 백엔드] ONNX Runtime 세션 생성: {model_path}")
+    return ort.InferenceSession(model_path, sess_options=session_options, providers=['CPUExecutionProvider'])
+
+
+def _compile_openvino(model_path, num_threads=None):
+    import openvino as ov
+    core = ov.Core()
+    model = core.read_model(model_path)
+    # 배치 차원을 동적으로 만들어 마이크로 배칭/이미지 내 배치를 그대로 받을 수 있게 함
+    shape = model.input(0).get_partial_shape()
+    shape[0] = -1
+    model.reshape({model.input(0): shape})
+    config = {'INFERENCE_NUM_THREADS': num_threads} if num_threads else {}
+    logging.info(f"[추론 백엔드] OpenVINO 모델 컴파일: {model_path}")
+    return core.compile_model(model, 'CPU', config)
@@ -5,17 +5,19 @@ load_dotenv()
 
 import cv2
 import numpy as np
-from tensorflow.keras.models import load_model
 from PIL import ImageFont, ImageDraw, Image
 
 # 로컬 모듈 임포트
-from object_detection import detect_pills
-from image_preprocessing import remove_background
+from model_registry import get_shape_model
+from inference_backends import resolve_model_paths
+from object_detection import detect_pills_on_working_image
+from detection_input import load_working_image
+from pill_pyramid import PillPyramid, STAGE_LEVELS
 from color_analysis import analyze_pill_colors
-from shape_analysis import classify_shape_with_ai
+from shape_geometry import classify_shapes_with_geometry
 from database_handler import load_database, find_best_match
 from imprint_analysis import get_imprint as get_imprint_tesseract
-from imprint_analysis_google import analyze_imprint_google
+from imprint_analysis_google import analyze_imprints_google
 
 
 # 한글 텍스트를 이미지에 그리는 함수
@@ -37,6 +39,13 @@ def draw_korean_text(image, text, position, font_path, font_size, font_color):
     # -------------------------------------------------------
 
 
+def format_shape_result(shape_result):
+    """ [(모양, 신뢰도), ...] 결과를 '모양 (xx.xx%), ...' 형식의 문자열로 변환합니다. """
+    if not isinstance(shape_result, list) or not shape_result:
+        return shape_result
+    return ", ".join(f"{name} ({conf:.2%})" for name, conf in shape_result)
+
+
 # --- 메인 실행 로직 ---
 if __name__ == "__main__":
     OCR_ENGINE = "google"
@@ -46,8 +55,7 @@ if __name__ == "__main__":
     # ---------------------------------------------------
 
     IMAGE_PATH = "test_image/A11AKP08K005702.jpg"
-    YOLO_MODEL_PATH = 'weights/detection_model.pt'
-    SHAPE_MODEL_PATH = "weights/shape_model.h5"
+    YOLO_MODEL_PATH, SHAPE_MODEL_PATH = resolve_model_paths()
     OUTPUT_DIR = "output_images"
     DB_PATH = "database/pill.csv"
     FONT_PATH = "fonts/NotoSansKR-Medium.ttf"
@@ -55,14 +63,15 @@ if __name__ == "__main__":
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
 
-    original_image = cv2.imread(IMAGE_PATH)
-    if original_image is None:
+    # 탐지는 축소된 작업 해상도 이미지에서 수행 (크롭/결과 저장은 원본 해상도)
+    working_image = load_working_image(IMAGE_PATH)
+    if working_image is None:
         print(f"오류: '{IMAGE_PATH}' 이미지를 찾을 수 없습니다.")
         exit()
 
     shape_model = None
     try:
-        shape_model = load_model(SHAPE_MODEL_PATH)
+        shape_model = get_shape_model(SHAPE_MODEL_PATH)
         print(f"'{SHAPE_MODEL_PATH}' 모양 분류 모델을 성공적으로 불러왔습니다.")
     except Exception as e:
         print(f"오류: '{SHAPE_MODEL_PATH}' 모델을 불러올 수 없습니다. {e}")
@@ -75,12 +84,17 @@ if __name__ == "__main__":
 
     print(f"\n*** [알림] {OCR_ENGINE.upper()} OCR 모드로 실행합니다. ***\n")
 
-    pill_boxes = detect_pills(IMAGE_PATH, YOLO_MODEL_PATH)
+    pill_boxes = detect_pills_on_working_image(working_image, YOLO_MODEL_PATH)
+    original_image = working_image.full
 
     # ---  최종 종합 분석을 위한 정보 수집기 ---
     all_shape_results = []
     all_color_sets = set()
     all_imprint_texts = []
+    shape_masks = []
+    geometries = []
+    # Google Vision은 모든 알약 크롭을 모아 배치 요청 한 번으로 분석
+    google_ocr_inputs = []
     # ------------------------------------------------
 
     for i, box in enumerate(pill_boxes):
@@ -95,88 +109,43 @@ if __name__ == "__main__":
 
         print(f"\n--- 알약 #{i + 1} 개별 분석 시작 ---")
 
-        # 2. 배경 제거 (모양/색상 분석용)
-        pill_without_bg, pill_mask = remove_background(cropped_pill.copy())
+        # 2. 알약별 해상도 피라미드 생성 및 배경 제거 (작업 레벨에서 한 번만 수행)
+        pyramid = PillPyramid(cropped_pill.copy())
+        print(f"  - 배경 분리 단계: {pyramid.segment()}")
+        pill_mask = pyramid.mask(STAGE_LEVELS['ocr'])
 
-        # 색상 분석 (배경 제거된 이미지 사용)
-        rgb_list, color_list = analyze_pill_colors(pill_without_bg)
+        # 색상 분석 (작업 레벨 이미지 + 배경 분리 마스크 사용)
+        color_level = STAGE_LEVELS['color']
+        rgb_list, color_list = analyze_pill_colors(pyramid.image(color_level), mask=pyramid.mask(color_level))
         color_candidates_str = " ".join(sorted(color_list))
         print(f"  - 식별된 색상: {color_candidates_str} (대표 RGB: {rgb_list[0] if rgb_list else 'N/A'})")
         all_color_sets.update(color_list)  # 종합 색상 세트에 추가
 
-        # 모양 분석을 위한 전처리
-        gray_pill = cv2.cvtColor(pill_without_bg, cv2.COLOR_BGR2GRAY)
-        _, binarized_image = cv2.threshold(gray_pill, 1, 255, cv2.THRESH_BINARY)
-
-        smoothed_binarized_image = binarized_image.copy()
-        contours, _ = cv2.findContours(binarized_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        if contours:
-            pill_contour = max(contours, key=cv2.contourArea)
-            perimeter = cv2.arcLength(pill_contour, True)
-            epsilon = 0.005 * perimeter
-            approximated_contour = cv2.approxPolyDP(pill_contour, epsilon, True)
-            smoothed_binarized_image = np.zeros_like(binarized_image)
-            cv2.drawContours(smoothed_binarized_image, [approximated_contour], -1, (255), -1)
-            
-            contour_area = cv2.contourArea(pill_contour)
-            min_rect = cv2.minAreaRect(pill_contour) 
-            box_width, box_height = min_rect[1]
-            box_area = box_width * box_height
-            
-            if box_area > 0:
-                fill_ratio = contour_area / box_area
-        else:
-            fill_ratio = None
-
-
-        # AI로 모양 분석
-        shape_result = "모델 로드 실패"
-        if shape_model:
-            shape_result = classify_shape_with_ai(smoothed_binarized_image, shape_model)
-        
-            if shape_result:
-                primary_prediction = shape_result[0][0]
-                if primary_prediction in ['타원형', '장방형'] and fill_ratio and fill_ratio > 0:
-                    print(f"  --- AI: {primary_prediction}, Fill Ratio: {fill_ratio:.2f} ---")
-
-                    scores_dict = dict(shape_result)
-                    if fill_ratio < 0.89: # 89% 미만이면 타원형
-                        if primary_prediction != '타원형':
-                            if not(scores_dict['장방형'] > 0.9):
-                                temp = scores_dict['타원형']
-                                scores_dict['타원형'] = scores_dict['장방형']
-                                scores_dict['장방형'] = temp
-                    else: # 85% 이상이면 장방형
-                        if primary_prediction != '장방형':
-                            if not(scores_dict['타원형'] > 0.9):
-                                temp = scores_dict['장방형']
-                                scores_dict['장방형'] = scores_dict['타원형']
-                                scores_dict['타원형'] = temp
-                    shape_result_list = list(scores_dict.items())
-                    shape_result_list.sort(key=lambda x: x[1], reverse=True)
-                    formatted_list = [f"{name} ({conf:.2%})" for name, conf in shape_result_list]
-                else:
-                    formatted_list = [f"{name} ({conf:.2%})" for name, conf in shape_result]
-                shape_result = ", ".join(formatted_list)
-        
-                    
-        print(f"  - AI 모양 분석 결과: {shape_result}")
-        all_shape_results.append(shape_result)  #  종합 모양 리스트에 추가
+        # 모양 분석을 위한 전처리 (분류는 모든 알약을 모은 뒤 한 번에 실행)
+        smoothed_binarized_image, _ = pyramid.shape_mask()
+        geometry = pyramid.geometry()
+        if geometry.is_valid:
+            print(f"  - 외곽선 특징: Fill Ratio {geometry.fill_ratio:.2f}, 가로세로 비 {geometry.aspect_ratio:.2f}, "
+                  f"타원 오차 {geometry.ellipse_residual:.3f}, 원형도 {geometry.circularity:.2f}")
+
+        shape_masks.append(smoothed_binarized_image)
+        geometries.append(geometry)
 
         imprint_text = ""
         if OCR_ENGINE == "google":
-            print("  - [Google API] 각인 분석 중...")
-            imprint_text = analyze_imprint_google(cropped_pill.copy())
+            # 각인 분석은 루프가 끝난 뒤 모든 알약을 한 번에
+            google_ocr_inputs.append((cropped_pill, pill_mask))
 
         elif OCR_ENGINE == "tesseract":
             print("  - [Tesseract] 각인 분석 중...")
-            imprint_text = get_imprint_tesseract(cropped_pill.copy(), pill_mask, debug=DEBUG_MODE)
+            imprint_text = get_imprint_tesseract(cropped_pill, pill_mask, debug=DEBUG_MODE)
         else:
             print(f"  - [오류] OCR_ENGINE 설정이 잘못되었습니다: {OCR_ENGINE}")
 
-        print(f"  - 인식된 각인: '{imprint_text}'")
-        if imprint_text:  # 빈 각인이 아니면 종합 리스트에 추가
-            all_imprint_texts.append(imprint_text)
+        if OCR_ENGINE != "google":
+            print(f"  - 인식된 각인: '{imprint_text}'")
+            if imprint_text:  # 빈 각인이 아니면 종합 리스트에 추가
+                all_imprint_texts.append(imprint_text)
         # ---------------------------------------------
 
         #  루프 내에서는 최종 후보를 계산하지 않음.
@@ -185,6 +154,24 @@ if __name__ == "__main__":
 
         print("  ---------------------------------")
 
+    # --- 각인 분석 (Google Vision, 모든 알약을 배치 요청 한 번으로) ---
+    if google_ocr_inputs:
+        print("\n  - [Google API] 각인 분석 중...")
+        imprint_texts = analyze_imprints_google([crop for crop, _ in google_ocr_inputs],
+                                                [mask for _, mask in google_ocr_inputs])
+        for i, imprint_text in enumerate(imprint_texts):
+            print(f"  - 알약 #{i + 1} 인식된 각인: '{imprint_text}'")
+            if imprint_text:  # 빈 각인이 아니면 종합 리스트에 추가
+                all_imprint_texts.append(imprint_text)
+
+    # --- 모양 분석 (기하 규칙으로 판정하지 못한 알약만 AI로, 한 번의 순전파로) ---
+    shape_results = classify_shapes_with_geometry(shape_masks, geometries, shape_model)
+
+    for i, shape_result in enumerate(shape_results):
+        shape_result = format_shape_result(shape_result) if shape_result is not None else "모델 로드 실패"
+        print(f"  - 알약 #{i + 1} AI 모양 분석 결과: {shape_result}")
+        all_shape_results.append(shape_result)  #  종합 모양 리스트에 추가
+
     # --- 모든 알약 분석 후, 종합하여 최종 후보 계산 ---
     print("\n\n---  최종 종합 분석 결과  ---")
 
@@ -0,0 +1,130 @@
+import os
+import threading
+import logging
+
+import numpy as np
+
+# --- 프로세스 단위 모델 레지스트리 ---
+# 같은 경로/옵션의 모델은 프로세스당 한 번만 로드하고, 이후 요청에서는 같은 핸들을 재사용합니다.
+# (Flask 스레드, Celery 워커 자식 프로세스 각각에서 한 번씩만 로딩 비용을 지불)
+
+DEFAULT_DETECTION_MODEL_PATH = "weights/detection_model.pt"
+DEFAULT_SHAPE_MODEL_PATH = "weights/shape_model.h5"
+
+_MODELS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+class ModelHandle:
+    """
+    로드된 모델과 추론용 잠금(lock)을 함께 보관하는 핸들.
+    Ultralytics predictor는 내부 상태를 공유하므로 동시에 predict를 호출하지 않도록 직렬화합니다.
+    """
+
+    def __init__(self, model, key, kind):
+        self.model = model
+        self.key = key
+        self.kind = kind
+        self.lock = threading.Lock()
+        self.warmed_up = False
+
+    def predict(self, *args, **kwargs):
+        with self.lock:
+            return self.model.predict(*args, **kwargs)
+
+    def __repr__(self):
+        return f"ModelHandle(kind={self.kind!r}, path={self.key[0]!r})"
+
+
+def _make_key(kind, model_path, options):
+    return (os.path.abspath(model_path), kind, tuple(sorted(options.items())))
+
+
+def _get_or_load(kind, model_path, options, loader):
+    key = _make_key(kind, model_path, options)
+    handle = _MODELS.get(key)
+    if handle is not None:
+        return handle
+
+    with _REGISTRY_LOCK:
+        # 잠금을 기다리는 동안 다른 스레드가 이미 로드했을 수 있으므로 다시 확인
+        handle = _MODELS.get(key)
+        if handle is None:
+            logging.info(f"[모델 레지스트리] '{model_path}' ({kind}) 모델을 로드합니다.")
+            handle = ModelHandle(loader(model_path, **options), key, kind)
+            _MODELS[key] = handle
+    return handle
+
+
+def _load_detection(model_path, **options):
+    from inference_backends import load_detection_backend
+    return load_detection_backend(model_path, **options)
+
+
+def _load_shape(model_path, **options):
+    from inference_backends import load_shape_backend
+    return load_shape_backend(model_path, **options)
+
+
+def get_detection_model(model_path=DEFAULT_DETECTION_MODEL_PATH, **options):
+    """
+    알약 탐지(YOLO) 모델 핸들을 반환합니다. 처음 요청될 때만 가중치를 로드합니다.
+    (.pt 외에 내보낸 .onnx / OpenVINO .xml 모델도 사용 가능, inference_backends 참고)
+    """
+    return _get_or_load("detection", model_path, options, _load_detection)
+
+
+def get_shape_model(model_path=DEFAULT_SHAPE_MODEL_PATH, **options):
+    """
+    모양 분류 모델 핸들을 반환합니다. 처음 요청될 때만 가중치를 로드합니다.
+    (.h5 외에 내보낸 .onnx / .tflite / OpenVINO .xml 모델도 사용 가능, inference_backends 참고)
+    """
+    return _get_or_load("shape", model_path, options, _load_shape)
+
+
+def warmup_detection_model(handle, imgsz=640):
+    """ 빈 이미지로 한 번 추론하여 레이어 퓨전 등 최초 호출 비용을 미리 지불합니다. """
+    if handle.warmed_up:
+        return handle
+    dummy = np.full((imgsz, imgsz, 3), 255, dtype=np.uint8)
+    handle.predict(source=dummy, save=False, verbose=False)
+    handle.warmed_up = True
+    return handle
+
+
+def warmup_shape_model(handle, target_size=224):
+    if handle.warmed_up:
+        return handle
+    # 요청 경로와 같은 컴파일된 순전파 함수를 미리 트레이싱
+    from shape_analysis import predict_shape_batch
+    dummy = np.zeros((1, target_size, target_size, 3), dtype=np.float32)
+    predict_shape_batch(handle, dummy, target_size)
+    handle.warmed_up = True
+    return handle
+
+
+def warmup_models(detection_model_path=DEFAULT_DETECTION_MODEL_PATH, shape_model_path=DEFAULT_SHAPE_MODEL_PATH):
+    """
+    서버/워커 시작 시 호출하여 탐지 모델과 모양 모델을 로드하고 워밍업합니다.
+    로드에 실패한 모델은 None으로 반환합니다.
+    """
+    detection_model = None
+    shape_model = None
+    try:
+        detection_model = warmup_detection_model(get_detection_model(detection_model_path))
+        print(f"'{detection_model_path}' 탐지 모델을 불러오고 워밍업했습니다.")
+    except Exception as e:
+        print(f"오류: '{detection_model_path}' 탐지 모델을 불러올 수 없습니다. {e}")
+
+    try:
+        shape_model = warmup_shape_model(get_shape_model(shape_model_path))
+        print(f"'{shape_model_path}' 모양 분류 모델을 성공적으로 불러왔습니다.")
+    except Exception as e:
+        print(f"오류: '{shape_model_path}' 모델을 불러올 수 없습니다. {e}")
+
+    return detection_model, shape_model
+
+
+def loaded_models():
+    """ 현재 프로세스에 로드된 모델 키 목록 (디버깅/모니터링용) """
+    return [handle.key for handle in _MODELS.values()]
@@ -1,62 +1,124 @@
 
 import cv2
 import numpy as np
-from ultralytics import YOLO
+
+from model_registry import get_detection_model, DEFAULT_DETECTION_MODEL_PATH
+from batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+
+# YOLO 예측 신뢰도 기준
+DETECTION_CONF = 0.3
+
+
+def create_detection_batcher(model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    """
+    여러 요청의 이미지를 모아 한 번의 YOLO predict로 처리하는 배칭 스케줄러를 생성합니다.
+    각 호출자는 자기 이미지에 해당하는 Results 객체 하나를 돌려받습니다.
+    """
+    def _predict_batch(images):
+        return predict_same_shape_groups(model, images)
+
+    return MicroBatcher(_predict_batch, max_batch_size, max_wait_ms, name="detection")
+
+
+def predict_same_shape_groups(model, images):
+    """
+    이미지들을 크기가 같은 것끼리 묶어 YOLO predict를 실행하고 입력 순서대로 Results를 반환합니다.
+    ultralytics는 크기가 다른 이미지를 한 번에 넣으면 모두 정사각형으로 레터박스하므로(auto=False)
+    단일 이미지 호출과 박스/신뢰도가 달라집니다. 크기가 같은 묶음은 단일 호출과 같은 레터박스를 사용합니다.
+    (파일 경로처럼 크기를 알 수 없는 입력은 하나씩 예측)
+    """
+    images = list(images)
+    groups = {}
+    for i, image in enumerate(images):
+        groups.setdefault(getattr(image, 'shape', ('path', i)), []).append(i)
+    results = [None] * len(images)
+    for indices in groups.values():
+        group_results = model.predict(source=[images[i] for i in indices], save=False, conf=DETECTION_CONF,
+                                      verbose=False)
+        for i, result in zip(indices, group_results):
+            results[i] = result
+    return results
+
+
+def _boxes_from_result(result):
+    """ YOLO 결과 하나에서 박스를 추출하고 수동 NMS로 중복 박스를 제거 """
+    raw_boxes = []
+    confidences = []
+
+    for box in result.boxes:
+        # bounding box 좌표와 신뢰도(confidence)를 추출
+        x1, y1, x2, y2 = map(int, box.xyxy[0])
+        conf = float(box.conf[0])
+
+        # OpenCV NMS 함수 형식에 맞게 (x, y, w, h) 형태로 저장
+        raw_boxes.append([x1, y1, x2 - x1, y2 - y1])
+        confidences.append(conf)
+
+    if not raw_boxes:
+        print("탐지된 알약이 없습니다.")
+        return []
+
+    # OpenCV의 NMSBoxes 함수를 사용하여 중복 박스 제거
+    #    score_threshold: 이 신뢰도 이하의 박스는 고려하지 않음
+    #    nms_threshold: 이 iou 값 이상 겹치는 박스는 중복으로 보고 제거
+    indices = cv2.dnn.NMSBoxes(raw_boxes, confidences, score_threshold=0.25, nms_threshold=0.4)
+
+    final_boxes = []
+    if len(indices) > 0:
+        for i in indices.flatten():
+            x, y, w, h = raw_boxes[i]
+            final_boxes.append([x, y, x + w, y + h])
+
+    print(f"총 {len(final_boxes)}개의 알약이 탐지되었습니다. (중복 제거 완료)")
+    return final_boxes
+
 
 # 알약 탐지 함수
-def detect_pills(image_path, model_path='weights/detection_model.pt'):
+def detect_pills(image_path, model_path=DEFAULT_DETECTION_MODEL_PATH, model=None, batcher=None):
     """
     YOLOv8 모델을 사용하여 이미지에서 알약 객체를 탐지,
     수동 NMS(비최대 억제)를 적용하여 중복 박스를 확실하게 제거
+
+    image_path에는 파일 경로 또는 이미 디코딩된 이미지(numpy 배열)를 넘길 수 있습니다.
+    model에 이미 로드된 모델 핸들을 넘기면 그대로 사용하고, 없으면 모델 레지스트리에서
+    model_path에 해당하는 모델을 가져옵니다. (프로세스당 한 번만 로드)
+    batcher가 주어지면 다른 요청과 함께 배치로 추론합니다.
     """
     try:
-        # 모델 불러오기
-        model_path = 'weights/detection_model.pt'
-        model = YOLO(model_path)
-
-        # YOLO 예측 실행
-        results = model.predict(source=image_path, save=False, conf=0.3)
-
-        raw_boxes = []
-        confidences = []
+        if batcher is not None:
+            # 배칭 스케줄러를 통해 다른 요청과 함께 추론
+            return _boxes_from_result(batcher.infer(image_path))
 
-        if len(results) > 0:
-            for box in results[0].boxes:
-                # bounding box 좌표와 신뢰도(confidence)를 추출
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                conf = float(box.conf[0])
+        # 모델 불러오기 (레지스트리 캐시 사용)
+        if model is None:
+            model = get_detection_model(model_path)
 
-                # OpenCV NMS 함수 형식에 맞게 (x, y, w, h) 형태로 저장
-                raw_boxes.append([x1, y1, x2 - x1, y2 - y1])
-                confidences.append(conf)
+        # YOLO 예측 실행
+        results = model.predict(source=image_path, save=False, conf=DETECTION_CONF)
 
-        if not raw_boxes:
+        if len(results) == 0:
             print("탐지된 알약이 없습니다.")
             return []
-
-        # OpenCV의 NMSBoxes 함수를 사용하여 중복 박스 제거
-        #    score_threshold: 이 신뢰도 이하의 박스는 고려하지 않음
-        #    nms_threshold: 이 iou 값 이상 겹치는 박스는 중복으로 보고 제거
-        indices = cv2.dnn.NMSBoxes(raw_boxes, confidences, score_threshold=0.25, nms_threshold=0.4)
-
-        final_boxes = []
-        if len(indices) > 0:
-            for i in indices.flatten():
-                x, y, w, h = raw_boxes[i]
-                final_boxes.append([x, y, x + w, y + h])
-
-        print(f"총 {len(final_boxes)}개의 알약이 탐지되었습니다. (중복 제거 완료)")
-        return final_boxes
+        return _boxes_from_result(results[0])
 
     # 예외처리
     except Exception as e:
         print(f"Error loading YOLOv8 model: {e}")
         print("YOLOv8 모델 로딩에 실패했습니다. 'best.pt' 파일 경로를 확인하세요.")
         print("임시로 더미 바운딩 박스를 반환합니다.")
-        dummy_image = cv2.imread(image_path)
+        dummy_image = image_path if isinstance(image_path, np.ndarray) else cv2.imread(image_path)
         if dummy_image is None:
             dummy_image = np.full((600, 800, 3), 255, dtype=np.uint8)
         h, w, _ = dummy_image.shape
         return [
             [int( w *0.1), int( h *0.1), int( w *0.4), int( h *0.4)],
         ]
+
+
+def detect_pills_on_working_image(working_image, model_path=DEFAULT_DETECTION_MODEL_PATH, model=None, batcher=None):
+    """
+    detection_input.WorkingImage의 축소된 작업 이미지에서 알약을 탐지하고,
+    박스를 원본 해상도 좌표로 되돌려 반환합니다.
+    """
+    boxes = detect_pills(working_image.working, model_path, model=model, batcher=batcher)
+    return [working_image.to_full_box(box) for box in boxes]
@@ -0,0 +1,434 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import contextlib
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+# --- OCR 결과 캐시 ---
+# 같은 알약 크롭이 반복해서 들어오는 경우(재촬영, QA 재실행, 중복 업로드)에 OCR을 다시 실행하지 않도록
+# (엔진, 엔진 설정, OCR에 넘기는 크롭 픽셀과 마스크 전체의 SHA-1)을 키로 인식 결과를 저장합니다.
+# 1단계는 프로세스 메모리 LRU, 2단계는 여러 프로세스/재시작 간에 공유되는 디스크 또는 Redis (TTL, 크기 제한)입니다.
+# 저해상도 지각 해시는 글자 하나만 다른 각인(예: '5'와 'S', 'K1'과 'K7')을 구분하지 못하므로 키로 쓰지 않습니다.
+# 배경(마스크 밖) 픽셀도 키에 넣습니다. Tesseract 전처리의 블러/적응 이진화는 배경 픽셀까지 섞어 계산하고,
+# Google Vision 배치 요청은 배경을 지우지 않은 크롭을 보내므로 배경만 달라도 인식 결과가 달라질 수 있습니다.
+# (OCR_CACHE_MAX_DISTANCE를 켜면 메모리 LRU에서 지각 해시가 가까운 항목도 같은 크롭으로 봄. 다른 각인의 결과를 돌려줄 수 있음)
+# Google Vision처럼 호출마다 비용이 드는 엔진에서 특히 효과가 큽니다.
+
+# 캐시 사용 여부 (0이면 항상 OCR 실행)
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE", "1") == "1"
+# 메모리 LRU에 유지할 최대 결과 수
+OCR_CACHE_MEMORY_SIZE = int(os.getenv("OCR_CACHE_MEMORY_SIZE", "1024"))
+# 영구 저장소: disk / redis / none
+OCR_CACHE_BACKEND = os.getenv("OCR_CACHE_BACKEND", "disk")
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "ocr"))
+OCR_CACHE_REDIS_URL = os.getenv("OCR_CACHE_REDIS_URL", "redis://localhost:6379/1")
+# 영구 저장소 항목 유효 기간 (초, 기본 7일)
+OCR_CACHE_TTL = int(os.getenv("OCR_CACHE_TTL", str(7 * 24 * 3600)))
+# 디스크 캐시 최대 크기 (바이트). 넘으면 오래된 항목부터 삭제
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(64 * 2 ** 20)))
+# Redis 캐시 최대 항목 수. 넘으면 오래된 항목부터 삭제
+OCR_CACHE_MAX_ENTRIES = int(os.getenv("OCR_CACHE_MAX_ENTRIES", "100000"))
+# 근사 일치용 지각 해시 크기 (hash_size² 비트)
+OCR_CACHE_HASH_SIZE = 16
+# 메모리 LRU에서 같은 크롭으로 볼 최대 지각 해시 해밍 거리 (0이면 픽셀이 같은 크롭만 적중, 기본값)
+# 재압축은 보통 2비트 이하지만, 작은 글씨의 한 글자 차이(5/S 등)는 0비트일 수도 있어 켜면 오답을 돌려줄 수 있음
+# (benchmarks/check_ocr_cache로 확인)
+OCR_CACHE_MAX_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "0"))
+
+# 디스크 캐시 정리(만료/크기 초과 삭제)를 몇 번의 저장마다 실행할지
+_DISK_EVICT_EVERY = 64
+_REDIS_KEY_PREFIX = "ocr_cache:"
+_REDIS_INDEX_KEY = "ocr_cache:index"
+
+
+def crop_digest(image, mask=None):
+    """
+    OCR 입력 전체(크롭 픽셀과 마스크, 각각의 크기/형식 포함)의 SHA-1.
+    OCR 결과는 이 두 배열만으로 정해지므로, 값이 같으면 같은 입력입니다. (픽셀이 하나라도 다르면 다른 값)
+    """
+    digest = hashlib.sha1()
+    for array in (image, mask):
+        if array is None:
+            digest.update(b"none;")
+            continue
+        array = np.ascontiguousarray(array)
+        digest.update(f"{array.shape}{array.dtype.str};".encode('ascii'))
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+def perceptual_hash(image, mask=None, hash_size=OCR_CACHE_HASH_SIZE):
+    """
+    크롭 이미지의 DCT 지각 해시(16진수 문자열). 마스크 밖(배경)은 0으로 지운 뒤 계산합니다.
+    JPEG 재압축이나 약간의 밝기 변화에는 같거나 가까운 해시가 나오지만, 작은 글씨의 글자 하나 차이는
+    저주파 성분에 남지 않아 같은 해시가 될 수 있습니다. (근사 일치에만 사용)
+    원본 크롭의 가로세로 비율을 함께 넣어 크기 조정으로 같아지는 서로 다른 크롭을 구분합니다.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    if mask is not None:
+        gray = np.where(mask > 0, gray, 0).astype(np.uint8)
+    size = hash_size * 4
+    small = cv2.resize(gray, (size, size), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:hash_size, :hash_size].ravel()
+    # 직류 성분(평균 밝기)은 제외하고 중앙값 기준으로 비트화
+    bits = low > np.median(low[1:])
+    height, width = gray.shape[:2]
+    return f"{np.packbits(bits).tobytes().hex()}:{width / max(height, 1):.1f}"
+
+
+def hash_distance(hash_a, hash_b):
+    """ 두 지각 해시의 해밍 거리 (가로세로 비율이 다르면 None) """
+    bits_a, ratio_a = hash_a.split(":")
+    bits_b, ratio_b = hash_b.split(":")
+    if ratio_a != ratio_b or len(bits_a) != len(bits_b):
+        return None
+    return bin(int(bits_a, 16) ^ int(bits_b, 16)).count("1")
+
+
+def ocr_cache_key(engine, params, image, mask=None, near_match=None):
+    """
+    캐시 키 (설정 구분자, 크롭 SHA-1, 지각 해시).
+    설정 구분자는 (엔진 이름, 엔진/전처리 설정 dict)의 해시이며, 크롭 SHA-1은 크롭과 마스크 전체에서 계산합니다.
+    지각 해시는 근사 일치를 쓸 때만 계산합니다. (near_match: 기본값은 OCR_CACHE_MAX_DISTANCE > 0, 아니면 None)
+    """
+    namespace = hashlib.sha1(json.dumps([engine, params], sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    near_match = OCR_CACHE_MAX_DISTANCE > 0 if near_match is None else near_match
+    return namespace, crop_digest(image, mask), perceptual_hash(image, mask) if near_match else None
+
+
+def _storage_key(key):
+    """ 영구 저장소/메모리 LRU에서 사용하는 문자열 키 (설정 구분자와 크롭 SHA-1로만 만듦) """
+    namespace, digest, _ = key
+    return hashlib.sha1(f"{namespace}:{digest}".encode('utf-8')).hexdigest()
+
+
+class DiskCacheTier:
+    """ 키마다 JSON 파일 하나로 저장하는 영구 캐시 (여러 프로세스가 같은 폴더를 공유) """
+    name = "disk"
+
+    def __init__(self, directory=OCR_CACHE_DIR, ttl=OCR_CACHE_TTL, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires', 0) < time.time():
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            return None
+        return entry['value']
+
+    def put(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 다른 프로세스가 쓰다 만 파일을 읽지 않도록 임시 파일에 쓴 뒤 교체
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'expires': time.time() + self.ttl, 'value': value}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % _DISK_EVICT_EVERY == 0
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """ 만료된 항목을 지우고, 전체 크기가 max_bytes를 넘으면 오래된(수정 시각 기준) 항목부터 삭제 """
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if stat.st_mtime + self.ttl < now:
+                    self._remove(path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        with contextlib.suppress(OSError):
+            os.remove(path)
+            self.evictions += 1
+
+    def stats(self):
+        return {'backend': self.name, 'directory': self.directory, 'ttl': self.ttl, 'max_bytes': self.max_bytes,
+                'evictions': self.evictions}
+
+
+class RedisCacheTier:
+    """ Redis 영구 캐시. 항목마다 TTL을 두고, 저장 시각 색인(sorted set)으로 최대 항목 수를 유지합니다. """
+    name = "redis"
+
+    def __init__(self, url=OCR_CACHE_REDIS_URL, ttl=OCR_CACHE_TTL, max_entries=OCR_CACHE_MAX_ENTRIES):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.url = url
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evictions = 0
+
+    def get(self, key):
+        value = self.client.get(_REDIS_KEY_PREFIX + key)
+        return json.loads(value) if value is not None else None
+
+    def put(self, key, value):
+        pipe = self.client.pipeline()
+        pipe.setex(_REDIS_KEY_PREFIX + key, self.ttl, json.dumps(value, ensure_ascii=False))
+        pipe.zadd(_REDIS_INDEX_KEY, {key: time.time()})
+        # TTL이 지난 키는 Redis가 지우므로 색인에서도 제거
+        pipe.zremrangebyscore(_REDIS_INDEX_KEY, 0, time.time() - self.ttl)
+        pipe.zcard(_REDIS_INDEX_KEY)
+        overflow = pipe.execute()[-1] - self.max_entries
+        if overflow > 0:
+            oldest = [k.decode() if isinstance(k, bytes) else k for k, _ in self.client.zpopmin(_REDIS_INDEX_KEY, overflow)]
+            if oldest:
+                self.client.delete(*[_REDIS_KEY_PREFIX + k for k in oldest])
+                self.evictions += len(oldest)
+
+    def stats(self):
+        return {'backend': self.name, 'url': self.url, 'ttl': self.ttl, 'max_entries': self.max_entries,
+                'evictions': self.evictions}
+
+
+_PERSISTENT_TIERS = {
+    'disk': DiskCacheTier,
+    'redis': RedisCacheTier,
+}
+
+
+class OcrCache:
+    """
+    2단계 OCR 결과 캐시 (메모리 LRU → 영구 저장소). 키는 ocr_cache_key의 (설정 구분자, 크롭 SHA-1, 지각 해시)입니다.
+    크롭 SHA-1이 같은 항목을 찾고, max_distance > 0이면 메모리 LRU에서 같은 설정의 항목 중
+    지각 해시의 해밍 거리가 max_distance 이하인 가장 가까운 항목도 사용합니다. (영구 저장소는 정확히 같은 크롭만) 영구 저장소에서 찾은 결과는 메모리 LRU에도 올립니다.
+    영구 저장소 오류는 캐시 미스로 처리하고 OCR은 그대로 진행합니다.
+    """
+
+    def __init__(self, memory_size=OCR_CACHE_MEMORY_SIZE, persistent=None, max_distance=OCR_CACHE_MAX_DISTANCE):
+        self.memory_size = max(0, memory_size)
+        self.persistent = persistent
+        self.max_distance = max_distance
+        # 저장 키 -> (설정 구분자, 지각 해시, 결과)  (지각 해시는 근사 일치를 쓰지 않으면 None)
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'memory_hits': 0, 'near_hits': 0, 'persistent_hits': 0, 'misses': 0, 'bypasses': 0,
+                       'stores': 0, 'memory_evictions': 0, 'persistent_errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _remember(self, key, value):
+        if self.memory_size == 0:
+            return
+        storage_key = _storage_key(key)
+        with self._lock:
+            self._memory[storage_key] = (key[0], key[2], value)
+            self._memory.move_to_end(storage_key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+                self._stats['memory_evictions'] += 1
+
+    def _nearest_in_memory(self, key):
+        """ 같은 설정의 메모리 항목 중 해밍 거리가 가장 가까운 항목의 저장 키 (max_distance 초과면 None) """
+        namespace, _, phash = key
+        if phash is None:
+            return None
+        best_key, best_distance = None, self.max_distance + 1
+        for storage_key, (entry_namespace, entry_hash, _) in self._memory.items():
+            if entry_namespace != namespace or entry_hash is None:
+                continue
+            distance = hash_distance(phash, entry_hash)
+            if distance is not None and distance < best_distance:
+                best_key, best_distance = storage_key, distance
+        return best_key
+
+    def get(self, key):
+        """ 저장된 결과 (없으면 None) """
+        storage_key = _storage_key(key)
+        with self._lock:
+            hit = storage_key in self._memory
+            if not hit and self.max_distance > 0:
+                storage_key = self._nearest_in_memory(key)
+                if storage_key is not None:
+                    self._stats['near_hits'] += 1
+                    hit = True
+            if hit:
+                self._memory.move_to_end(storage_key)
+                self._stats['memory_hits'] += 1
+                return self._memory[storage_key][2]
+        value = None
+        if self.persistent is not None:
+            try:
+                value = self.persistent.get(_storage_key(key))
+            except Exception as e:
+                logging.warning(f"[OCR 캐시] {self.persistent.name} 조회 오류: {e}")
+                self._count('persistent_errors')
+        if value is None:
+            self._count('misses')
+            return None
+        self._count('persistent_hits')
+        self._remember(key, value)
+        return value
+
+    def put(self, key, value):
+        """ 결과를 저장합니다. (JSON으로 저장 가능한 값) """
+        self._remember(key, value)
+        self._count('stores')
+        if self.persistent is not None:
+            try:
+                self.persistent.put(_storage_key(key), value)
+            except Exception as e:
+                logging.warning(f"[OCR 캐시] {self.persistent.name} 저장 오류: {e}")
+                self._count('persistent_errors')
+
+    def get_or_compute(self, key, compute, bypass=False):
+        """
+        캐시된 결과를 반환하고, 없으면 compute()를 실행해 저장합니다.
+        compute는 (결과, 캐시 가능 여부)를 반환합니다. (OCR 오류로 얻은 빈 결과는 저장하지 않도록)
+        bypass면 캐시를 조회/저장하지 않고 항상 compute를 실행합니다.
+        """
+        if bypass:
+            self._count('bypasses')
+            return compute()[0]
+        value = self.get(key)
+        if value is not None:
+            return value
+        value, cacheable = compute()
+        if cacheable:
+            self.put(key, value)
+        return value
+
+    def get_or_compute_batch(self, keys, compute_batch, bypass=False):
+        """
+        여러 키의 결과를 반환합니다. 캐시에 없는 항목의 위치만 모아 compute_batch(위치 리스트)를 한 번 호출하고,
+        compute_batch는 그 순서대로 (결과, 캐시 가능 여부) 리스트를 반환합니다.
+        """
+        if bypass:
+            with self._lock:
+                self._stats['bypasses'] += len(keys)
+            return [value for value, _ in compute_batch(list(range(len(keys))))]
+        values = [self.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            for i, (value, cacheable) in zip(missing, compute_batch(missing)):
+                values[i] = value
+                if cacheable:
+                    self.put(keys[i], value)
+        return values
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        """ 적중률과 저장소별 지표 """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+        lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['persistent_hits']) / lookups if lookups else 0.0
+        stats['memory_size'] = self.memory_size
+        stats['max_distance'] = self.max_distance
+        stats['persistent'] = self.persistent.stats() if self.persistent is not None else None
+        return stats
+
+
+def create_persistent_tier(backend=None):
+    """ OCR_CACHE_BACKEND에 해당하는 영구 저장소 (none이거나 사용할 수 없으면 None, 메모리 캐시만 사용) """
+    backend = backend or OCR_CACHE_BACKEND
+    if backend == 'none':
+        return None
+    if backend not in _PERSISTENT_TIERS:
+        raise ValueError(f"알 수 없는 OCR 캐시 저장소입니다: {backend} (사용 가능: none, {', '.join(_PERSISTENT_TIERS)})")
+    try:
+        return _PERSISTENT_TIERS[backend]()
+    except Exception as e:
+        logging.warning(f"[OCR 캐시] {backend} 저장소를 사용할 수 없어 메모리 캐시만 사용합니다: {e}")
+        return None
+
+
+_CACHE = None
+_CACHE_PID = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_ocr_cache():
+    """
+    현재 프로세스의 OCR 캐시 (처음 호출할 때 생성). Redis 연결은 fork 후 공유할 수 없으므로 프로세스마다 만듭니다.
+    OCR_CACHE=0이면 None
+    """
+    global _CACHE, _CACHE_PID
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _CACHE is not None and _CACHE_PID == os.getpid():
+        return _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE_PID != os.getpid():
+            _CACHE = OcrCache(OCR_CACHE_MEMORY_SIZE, create_persistent_tier())
+            _CACHE_PID = os.getpid()
+    return _CACHE
+
+
+def cached_ocr(engine, params, image, mask, compute, bypass=False):
+    """
+    OCR 결과를 캐시를 거쳐 얻습니다. (캐시를 끈 경우 compute를 그대로 실행)
+    compute()는 (결과, 캐시 가능 여부)를 반환합니다.
+    """
+    cache = get_ocr_cache()
+    if cache is None:
+        return compute()[0]
+    key = None if bypass else ocr_cache_key(engine, params, image, mask)
+    return cache.get_or_compute(key, compute, bypass=bypass)
+
+
+def cached_ocr_batch(engine, params, images, masks, compute_batch, bypass=False):
+    """
+    여러 크롭의 OCR 결과를 캐시를 거쳐 입력 순서대로 얻습니다.
+    캐시에 없는 크롭만 모아 compute_batch(이미지 리스트, 마스크 리스트)를 한 번 호출합니다.
+    compute_batch는 (결과, 캐시 가능 여부) 리스트를 반환합니다. masks는 크롭별 마스크 리스트 (None이면 마스크 없음)
+    """
+    if not images:
+        return []
+    masks = masks if masks is not None else [None] * len(images)
+    cache = get_ocr_cache()
+    if cache is None:
+        return [value for value, _ in compute_batch(images, masks)]
+    keys = [None] * len(images) if bypass else [ocr_cache_key(engine, params, image, mask)
+                                                for image, mask in zip(images, masks)]
+    return cache.get_or_compute_batch(
+        keys, lambda indices: compute_batch([images[i] for i in indices], [masks[i] for i in indices]), bypass=bypass)
+
+
+def get_ocr_cache_stats():
+    """ OCR 캐시 지표 (캐시를 끄거나 아직 만들지 않았으면 None) """
+    if _CACHE is None or _CACHE_PID != os.getpid():
+        return None
+    return _CACHE.stats()
@@ -0,0 +1,247 @@
+import os
+import time
+import queue
+import logging
+import threading
+import contextlib
+from collections import deque
+
+import numpy as np
+
+# --- Tesseract 엔진 풀 ---
+# 각인 OCR을 호출할 때마다 tesseract CLI를 실행하면, 임시 이미지 파일을 쓰고 프로세스를 띄운 뒤
+# eng traineddata를 다시 읽는 비용을 매번 지불합니다.
+# 여기서는 초기화된 Tesseract API 핸들(tesserocr, C API 바인딩)을 프로세스마다 유지하고,
+# NumPy 버퍼를 임시 파일 없이 그대로 넘겨 인식합니다. 한 번 빌린 핸들로 여러 전처리 결과를 연속으로 인식합니다.
+# tesserocr가 설치되어 있지 않으면 기존 pytesseract(CLI) 방식으로 동작합니다.
+
+# 엔진 선택: auto(가능하면 tesserocr) / tesserocr / cli
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto")
+# 프로세스당 유지할 최대 엔진(핸들) 수 (동시에 OCR을 실행할 수 있는 스레드 수)
+OCR_POOL_SIZE = int(os.getenv("OCR_POOL_SIZE", "2"))
+
+OCR_LANG = "eng"
+# --psm 6: 이미지를 단일 텍스트 블록으로 간주
+OCR_PSM = 6
+OCR_CHAR_WHITELIST = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+
+# 지연 백분위 계산에 사용할 최근 호출 수
+_LATENCY_WINDOW = 1024
+
+
+class TesserocrEngine:
+    """ 초기화된 Tesseract API 핸들 하나. 같은 핸들로 여러 이미지를 재초기화 없이 인식합니다. """
+    name = "tesserocr"
+
+    def __init__(self, lang=OCR_LANG, psm=OCR_PSM, whitelist=OCR_CHAR_WHITELIST):
+        import tesserocr
+        self.api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+        self.api.SetVariable("tessedit_char_whitelist", whitelist)
+
+    def recognize(self, image):
+        """ 흑백(H, W) 또는 BGR(H, W, 3) uint8 배열의 텍스트 (메모리 버퍼를 그대로 전달) """
+        if image.ndim == 3:
+            image = image[..., ::-1]  # Tesseract는 RGB 순서
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        self.api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, bytes_per_pixel * width)
+        return self.api.GetUTF8Text()
+
+    def recognize_with_confidence(self, image):
+        """ (텍스트, 단어별 신뢰도 평균 0~100) """
+        text = self.recognize(image)
+        return text, _mean_confidence(self.api.AllWordConfidences())
+
+    def close(self):
+        self.api.End()
+
+
+class CliEngine:
+    """ pytesseract로 tesseract CLI를 실행하는 기존 방식 (tesserocr가 없을 때 사용) """
+    name = "cli"
+
+    def __init__(self, lang=OCR_LANG, psm=OCR_PSM, whitelist=OCR_CHAR_WHITELIST):
+        import pytesseract
+        # Tesseract OCR 경로 설정 (필요시 환경에 맞게 수정)
+        # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+        self._pytesseract = pytesseract
+        self.lang = lang
+        self.config = f"--psm {psm} -c tessedit_char_whitelist={whitelist}"
+
+    def recognize(self, image):
+        return self._pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+
+    def recognize_with_confidence(self, image):
+        """ (텍스트, 단어별 신뢰도 평균 0~100). 단어 단위 결과(image_to_data)로 한 번만 실행 """
+        data = self._pytesseract.image_to_data(image, lang=self.lang, config=self.config,
+                                               output_type=self._pytesseract.Output.DICT)
+        words = [(word, float(conf)) for word, conf in zip(data['text'], data['conf']) if str(word).strip()]
+        return " ".join(word for word, _ in words), _mean_confidence([conf for _, conf in words])
+
+    def close(self):
+        pass
+
+
+def _mean_confidence(confidences):
+    # Tesseract는 단어가 아닌 항목의 신뢰도를 -1로 표시
+    confidences = [float(c) for c in confidences if float(c) >= 0]
+    return sum(confidences) / len(confidences) if confidences else 0.0
+
+
+OCR_ENGINES = {
+    'tesserocr': TesserocrEngine,
+    'cli': CliEngine,
+}
+
+
+def resolve_engine_factory(engine=None):
+    """ 엔진 이름에 해당하는 엔진 클래스를 반환합니다. auto면 tesserocr가 설치되어 있는지 확인 후 결정 """
+    engine = engine or OCR_ENGINE
+    if engine == 'auto':
+        try:
+            import tesserocr  # noqa: F401
+            return TesserocrEngine
+        except ImportError as e:
+            logging.info(f"[OCR 엔진] tesserocr를 사용할 수 없어 tesseract CLI를 사용합니다: {e}")
+            return CliEngine
+    if engine not in OCR_ENGINES:
+        raise ValueError(f"알 수 없는 OCR 엔진입니다: {engine} (사용 가능: auto, {', '.join(OCR_ENGINES)})")
+    return OCR_ENGINES[engine]
+
+
+class OcrEnginePool:
+    """
+    OCR 엔진 핸들 풀. 필요할 때 최대 size개까지 만들고, 반납된 핸들은 다음 호출에서 재사용합니다.
+    모든 핸들이 사용 중이면 반납될 때까지 기다립니다. (Tesseract 핸들은 스레드 간 동시 사용 불가)
+    """
+
+    def __init__(self, factory, size=OCR_POOL_SIZE):
+        self.factory = factory
+        self.size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._created_at = time.perf_counter()
+        # 지표
+        self._calls = 0
+        self._call_seconds = 0.0
+        self._busy_seconds = 0.0
+        self._waits = 0
+        self._latencies = deque(maxlen=_LATENCY_WINDOW)
+
+    @property
+    def engine_name(self):
+        return getattr(self.factory, 'name', getattr(self.factory, '__name__', str(self.factory)))
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+            else:
+                self._waits += 1
+        if not create:
+            return self._idle.get()
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    @contextlib.contextmanager
+    def engine(self):
+        """ 엔진 하나를 빌려 씁니다. (블록이 끝나면 반납) """
+        engine = self._acquire()
+        with self._lock:
+            self._in_use += 1
+        start = time.perf_counter()
+        try:
+            yield engine
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._busy_seconds += time.perf_counter() - start
+            self._idle.put(engine)
+
+    def recognize(self, images, with_confidence=False):
+        """
+        이미지 리스트를 같은 엔진으로 연속 인식하여 텍스트 리스트를 반환합니다.
+        with_confidence면 (텍스트, 신뢰도 0~100) 리스트를 반환합니다.
+        """
+        texts = []
+        with self.engine() as engine:
+            for image in images:
+                start = time.perf_counter()
+                texts.append(engine.recognize_with_confidence(image) if with_confidence else engine.recognize(image))
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self._calls += 1
+                    self._call_seconds += elapsed
+                    self._latencies.append(elapsed)
+        return texts
+
+    def close(self):
+        """ 반납된 엔진을 모두 닫습니다. """
+        while True:
+            try:
+                engine = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            engine.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        """ 호출당 지연과 풀 사용률 지표를 반환합니다. """
+        with self._lock:
+            latencies = np.array(self._latencies) * 1000.0
+            uptime = time.perf_counter() - self._created_at
+            return {
+                'engine': self.engine_name,
+                'pool_size': self.size,
+                'engines_created': self._created,
+                'in_use': self._in_use,
+                'waits': self._waits,
+                'calls': self._calls,
+                'avg_call_ms': (self._call_seconds / self._calls * 1000.0) if self._calls else 0.0,
+                'p50_call_ms': float(np.percentile(latencies, 50)) if len(latencies) else 0.0,
+                'p99_call_ms': float(np.percentile(latencies, 99)) if len(latencies) else 0.0,
+                # 풀 전체 용량(size × 경과 시간) 중 엔진을 빌려 쓴 시간의 비율
+                'utilisation': self._busy_seconds / (uptime * self.size) if uptime > 0 else 0.0,
+            }
+
+
+_POOL = None
+_POOL_PID = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_ocr_pool():
+    """
+    현재 프로세스의 OCR 엔진 풀을 반환합니다. (처음 호출할 때 생성)
+    Tesseract 핸들은 fork 후 공유할 수 없으므로 prefork 워커는 프로세스마다 자신의 풀을 만듭니다.
+    """
+    global _POOL, _POOL_PID
+    if _POOL is not None and _POOL_PID == os.getpid():
+        return _POOL
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_PID != os.getpid():
+            factory = resolve_engine_factory()
+            logging.info(f"[OCR 엔진] {factory.name} 엔진 풀을 만듭니다. (최대 {OCR_POOL_SIZE}개)")
+            _POOL = OcrEnginePool(factory, OCR_POOL_SIZE)
+            _POOL_PID = os.getpid()
+    return _POOL
+
+
+def get_ocr_stats():
+    """ OCR 엔진 풀 지표 (풀을 아직 만들지 않았으면 None) """
+    if _POOL is None or _POOL_PID != os.getpid():
+        return None
+    return _POOL.stats()
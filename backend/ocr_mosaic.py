@@ -0,0 +1,145 @@
+import os
+import math
+
+import cv2
+import numpy as np
+
+# --- 알약 크롭 모자이크 ---
+# 한 요청의 알약 크롭들을 여백을 두고 이미지 한 장에 배치해 텍스트 감지를 한 번만 호출합니다.
+# (Vision은 배치 요청이어도 이미지마다 과금/디코딩하며, 작은 크롭도 원본 크기 그대로 JPEG로 보내게 됨)
+# 각 크롭은 배경(마스크 밖)을 지우고, 각인을 읽을 수 있는 최소 해상도로 줄인 뒤 배치하며,
+# 배치 정보(layout)로 감지된 단어의 위치를 원래 알약에 되돌려 줍니다.
+
+# 크롭의 짧은 변을 이 길이로 줄임 (원본이 더 작으면 그대로).
+# benchmarks/bench_vision_mosaic의 합성 알약에서 192 미만이면 각인 일부를 읽지 못함 (실제 Vision 결과로 다시 확인 권장)
+MOSAIC_CROP_SIDE = int(os.getenv("MOSAIC_CROP_SIDE", "192"))
+# 크롭 사이 여백 (서로 다른 알약의 글자가 한 단어로 묶이지 않도록)
+MOSAIC_PADDING = int(os.getenv("MOSAIC_PADDING", "32"))
+# 모자이크 한 장의 최대 변 길이 (넘으면 여러 장으로 나눔)
+MOSAIC_MAX_SIDE = int(os.getenv("MOSAIC_MAX_SIDE", "4096"))
+# 배경/여백 색 (흰색: 배경 무늬가 글자로 인식되지 않도록)
+MOSAIC_FILL = 255
+
+
+class MosaicTile:
+    """ 모자이크 안에 놓인 크롭 하나 (index: 입력 순서, x/y/width/height: 모자이크 좌표, scale: 원본 대비 배율) """
+
+    def __init__(self, index, x, y, width, height, scale):
+        self.index = index
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.scale = scale
+
+    def overlap(self, x1, y1, x2, y2):
+        """ 사각형 (x1, y1)-(x2, y2)와 겹치는 면적 """
+        width = min(x2, self.x + self.width) - max(x1, self.x)
+        height = min(y2, self.y + self.height) - max(y1, self.y)
+        return max(width, 0) * max(height, 0)
+
+    def as_dict(self):
+        return {'index': self.index, 'x': self.x, 'y': self.y, 'width': self.width, 'height': self.height,
+                'scale': self.scale}
+
+
+class Mosaic:
+    """ 모자이크 이미지 한 장과 배치 정보 """
+
+    def __init__(self, image, tiles):
+        self.image = image
+        self.tiles = tiles
+
+    def tile_for_polygon(self, vertices):
+        """ 단어 외곽 꼭짓점 [(x, y), ...]와 가장 많이 겹치는 타일 (여백에만 걸쳐 있으면 None) """
+        xs = [x for x, _ in vertices]
+        ys = [y for _, y in vertices]
+        x1, y1, x2, y2 = min(xs), min(ys), max(xs), max(ys)
+        best, best_area = None, 0
+        for tile in self.tiles:
+            area = tile.overlap(x1, y1, max(x2, x1 + 1), max(y2, y1 + 1))
+            if area > best_area:
+                best, best_area = tile, area
+        return best
+
+    def assign_words(self, words):
+        """
+        감지된 단어 [(글자, 꼭짓점), ...]를 타일(알약)별로 나눠 {입력 순서: [글자, ...]}로 반환합니다.
+        (감지 결과의 단어 순서를 유지)
+        """
+        assigned = {tile.index: [] for tile in self.tiles}
+        for text, vertices in words:
+            tile = self.tile_for_polygon(vertices)
+            if tile is not None:
+                assigned[tile.index].append(text)
+        return assigned
+
+
+def normalize_crop(image, mask=None, crop_side=MOSAIC_CROP_SIDE):
+    """ 마스크 밖을 지우고 짧은 변이 crop_side가 되도록 줄인 크롭과 배율 (확대는 하지 않음) """
+    if mask is not None:
+        image = image.copy()
+        image[mask == 0] = MOSAIC_FILL
+    height, width = image.shape[:2]
+    scale = min(1.0, crop_side / max(min(height, width), 1))
+    if scale < 1.0:
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    return image, scale
+
+
+def _shelf_layout(sizes, padding, max_side):
+    """
+    (너비, 높이) 목록을 선반(행) 방식으로 배치합니다. 높이가 큰 순서로 행을 채우고,
+    행 너비는 전체 면적의 제곱근 근처로 맞춰 모자이크가 정사각형에 가깝게 합니다.
+    반환값: 모자이크별 [(입력 순서, x, y), ...] 리스트
+    """
+    area = sum((w + padding) * (h + padding) for w, h in sizes)
+    widest = max(w for w, _ in sizes) + 2 * padding
+    row_width = min(max_side, max(widest, int(math.ceil(math.sqrt(area)))))
+    order = sorted(range(len(sizes)), key=lambda i: sizes[i][1], reverse=True)
+
+    mosaics, placements = [], []
+    x, y, row_height = padding, padding, 0
+    for i in order:
+        width, height = sizes[i]
+        if x + width + padding > row_width and x > padding:
+            x, y = padding, y + row_height + padding
+            row_height = 0
+        if y + height + padding > max_side and placements:
+            mosaics.append(placements)
+            placements = []
+            x, y, row_height = padding, padding, 0
+        placements.append((i, x, y))
+        x += width + padding
+        row_height = max(row_height, height)
+    if placements:
+        mosaics.append(placements)
+    return mosaics
+
+
+def build_mosaics(images, masks=None, crop_side=MOSAIC_CROP_SIDE, padding=MOSAIC_PADDING, max_side=MOSAIC_MAX_SIDE):
+    """
+    크롭들(마스크가 있으면 배경을 지움)을 정규화해 모자이크 이미지로 배치합니다.
+    보통 한 장이며, max_side를 넘으면 여러 장으로 나눕니다. 반환값: [Mosaic, ...]
+    """
+    if not images:
+        return []
+    masks = masks if masks is not None else [None] * len(images)
+    normalized = [normalize_crop(image, mask, crop_side) for image, mask in zip(images, masks)]
+    sizes = [(crop.shape[1], crop.shape[0]) for crop, _ in normalized]
+
+    mosaics = []
+    for placements in _shelf_layout(sizes, padding, max_side):
+        width = max(x + sizes[i][0] for i, x, _ in placements) + padding
+        height = max(y + sizes[i][1] for i, _, y in placements) + padding
+        canvas = np.full((height, width, 3), MOSAIC_FILL, dtype=np.uint8)
+        tiles = []
+        for i, x, y in placements:
+            crop, scale = normalized[i]
+            if crop.ndim == 2:
+                crop = cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR)
+            canvas[y:y + crop.shape[0], x:x + crop.shape[1]] = crop
+            tiles.append(MosaicTile(i, x, y, crop.shape[1], crop.shape[0], scale))
+        mosaics.append(Mosaic(canvas, tiles))
+    return mosaics
@@ -0,0 +1,115 @@
+"""
+내보낸 추론 백엔드의 결과가 기준 모델(.pt / .h5)과 일치하는지 test_image/로 검사하는 스크립트.
+
+사용 예:
+    python parity_check.py --backend onnx
+    python parity_check.py --backend tflite-int8 --prob-tol 0.1
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from inference_backends import BACKEND_MODEL_PATHS
+from model_registry import get_detection_model, get_shape_model
+from object_detection import detect_pills
+from shape_analysis import predict_shape_batch
+from export_models import collect_shape_inputs, REFERENCE_DETECTION_PATH, REFERENCE_SHAPE_PATH
+
+
+def box_iou(a, b):
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, ix2 - ix1) * max(0, iy2 - iy1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def match_boxes(reference, candidate):
+    """ 기준 박스마다 IoU가 가장 큰 후보 박스를 탐욕적으로 매칭하여 IoU 리스트를 반환 """
+    remaining = list(candidate)
+    ious = []
+    for ref in reference:
+        if not remaining:
+            ious.append(0.0)
+            continue
+        scores = [box_iou(ref, c) for c in remaining]
+        best = int(np.argmax(scores))
+        ious.append(scores[best])
+        remaining.pop(best)
+    return ious
+
+
+def check_detection(backend, image_dir, min_iou):
+    reference_model = get_detection_model(REFERENCE_DETECTION_PATH)
+    backend_model = get_detection_model(BACKEND_MODEL_PATHS[backend][0])
+
+    ok = True
+    ref_times, backend_times = [], []
+    print(f"\n[탐지] 기준: {REFERENCE_DETECTION_PATH} / 백엔드: {BACKEND_MODEL_PATHS[backend][0]}")
+    for image_path in sorted(glob.glob(os.path.join(image_dir, "*"))):
+        image = cv2.imread(image_path)
+        if image is None:
+            continue
+        start = time.perf_counter()
+        ref_boxes = detect_pills(image, model=reference_model)
+        ref_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        backend_boxes = detect_pills(image, model=backend_model)
+        backend_times.append(time.perf_counter() - start)
+
+        ious = match_boxes(ref_boxes, backend_boxes)
+        worst = min(ious) if ious else 1.0
+        passed = len(ref_boxes) == len(backend_boxes) and worst >= min_iou
+        ok &= passed
+        print(f"  {'OK  ' if passed else 'FAIL'} {os.path.basename(image_path)}: "
+              f"박스 {len(ref_boxes)} vs {len(backend_boxes)}, 최소 IoU {worst:.3f}")
+
+    if ref_times:
+        print(f"  평균 지연: 기준 {np.mean(ref_times) * 1000:.1f}ms / 백엔드 {np.mean(backend_times) * 1000:.1f}ms")
+    return ok
+
+
+def check_shape(backend, image_dir, prob_tol):
+    samples = collect_shape_inputs(image_dir)
+    print(f"\n[모양] 기준: {REFERENCE_SHAPE_PATH} / 백엔드: {BACKEND_MODEL_PATHS[backend][1]} (샘플 {len(samples)}개)")
+    if not samples:
+        print("  검사할 알약 샘플이 없습니다.")
+        return False
+
+    batch = np.stack(samples)
+    reference = predict_shape_batch(get_shape_model(REFERENCE_SHAPE_PATH), batch)
+    start = time.perf_counter()
+    candidate = predict_shape_batch(get_shape_model(BACKEND_MODEL_PATHS[backend][1]), batch)
+    elapsed = time.perf_counter() - start
+
+    max_diff = float(np.abs(reference - candidate).max())
+    top1_agreement = float(np.mean(reference.argmax(axis=1) == candidate.argmax(axis=1)))
+    passed = max_diff <= prob_tol and top1_agreement == 1.0
+    print(f"  {'OK  ' if passed else 'FAIL'} 최대 확률 차이 {max_diff:.4f} (허용 {prob_tol}), "
+          f"top-1 일치율 {top1_agreement:.2%}, 백엔드 배치 추론 {elapsed * 1000:.1f}ms")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="추론 백엔드와 기준 모델의 결과를 비교합니다.")
+    parser.add_argument('--backend', required=True, choices=[b for b in BACKEND_MODEL_PATHS if b != 'native'])
+    parser.add_argument('--image-dir', default="test_image")
+    parser.add_argument('--min-iou', type=float, default=0.9, help="탐지 박스 최소 IoU")
+    parser.add_argument('--prob-tol', type=float, default=0.02, help="모양 확률 최대 허용 차이 (int8은 0.1 정도 권장)")
+    args = parser.parse_args()
+
+    detection_ok = check_detection(args.backend, args.image_dir, args.min_iou)
+    shape_ok = check_shape(args.backend, args.image_dir, args.prob_tol)
+
+    print(f"\n결과: 탐지 {'통과' if detection_ok else '실패'}, 모양 {'통과' if shape_ok else '실패'}")
+    sys.exit(0 if detection_ok and shape_ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,11 +7,12 @@ import numpy as np
 from PIL import ImageFont, Image, ImageDraw
 
 # 로컬 모듈 임포트
-from image_preprocessing import remove_background
-from color_analysis import get_dominant_color
-from shape_analysis import classify_shape_with_ai
-from database_handler import find_best_match
-from imprint_analysis import get_imprint
+from pill_pyramid import PillPyramid, STAGE_LEVELS
+from color_analysis import analyze_pill_colors
+from shape_geometry import classify_shapes_with_geometry
+from database_handler import find_best_match_batch
+from imprint_analysis import get_imprint_with_confidence
+from detection_input import WorkingImage
 
 # --- ✨ 유틸리티 함수를 app.py에서 여기로 이동 ---
 def draw_korean_text_on_image(image, text, position, pil_font):
@@ -30,55 +31,73 @@ def draw_korean_text_on_image(image, text, position, pil_font):
     
     return cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
 
-def analyze_single_pill(cropped_pill_image, shape_model, pill_db):
+def extract_pill_features(cropped_pill_image):
+    """
+    하나의 잘라낸 알약 이미지에서 색상/각인과 모양 분류용 마스크를 추출 (모양 분류 자체는 제외)
+    배경 분리는 피라미드의 작업 레벨에서 한 번만 하고, 마스크를 각 단계의 해상도로 전파합니다.
+    """
+    pyramid = PillPyramid(cropped_pill_image)
+
+    color_level = STAGE_LEVELS['color']
+    _, color_list = analyze_pill_colors(pyramid.image(color_level), mask=pyramid.mask(color_level))
+    color_candidates = " ".join(sorted(color_list))
+
+    shape_mask, _ = pyramid.shape_mask()
+    geometry = pyramid.geometry()
+
+    imprint_text, imprint_confidence = get_imprint_with_confidence(pyramid.full, pyramid.mask(STAGE_LEVELS['ocr']))
+
+    return {'colors': color_candidates, 'shape_mask': shape_mask, 'geometry': geometry, 'imprint': imprint_text,
+            'imprint_confidence': imprint_confidence}
+
+
+def analyze_pills(cropped_pill_images, shape_model, pill_db, shape_batcher=None):
+    """
+    한 이미지에서 잘라낸 모든 알약에 대해 분석 파이프라인을 실행.
+    모양은 외곽선 기하 특징으로 먼저 판정하고, 판정하지 못한 알약의 마스크만 묶어 한 번의 순전파로 처리합니다.
+    """
+    features = [extract_pill_features(crop) for crop in cropped_pill_images]
+
+    shape_results = classify_shapes_with_geometry(
+        [f['shape_mask'] for f in features], [f['geometry'] for f in features], shape_model, batcher=shape_batcher)
+
+    # DB 매칭도 모든 알약을 한 번에
+    return find_best_match_batch(
+        pill_db, [(shape_result, f['colors'], f['imprint'], f['imprint_confidence']) for f, shape_result in zip(features, shape_results)])
+
+
+def analyze_single_pill(cropped_pill_image, shape_model, pill_db, shape_batcher=None):
     """ 하나의 잘라낸 알약 이미지에 대해 전체 분석 파이프라인을 실행 """
-    
-    pill_without_bg, pill_mask = remove_background(cropped_pill_image.copy())
-    
-    _, color_candidates = get_dominant_color(pill_without_bg)
-    
-    gray_pill = cv2.cvtColor(pill_without_bg, cv2.COLOR_BGR2GRAY)
-    
-    _, binarized_image = cv2.threshold(gray_pill, 10, 255, cv2.THRESH_BINARY)
-    
-    smoothed_binarized_image = binarized_image.copy()
-    
-    contours, _ = cv2.findContours(binarized_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    if contours:
-        pill_contour = max(contours, key=cv2.contourArea)
-        perimeter = cv2.arcLength(pill_contour, True)
-        epsilon = 0.005 * perimeter
-        approximated_contour = cv2.approxPolyDP(pill_contour, epsilon, True)
-        smoothed_binarized_image = np.zeros_like(binarized_image)
-        cv2.drawContours(smoothed_binarized_image, [approximated_contour], -1, (255), -1)
-        
-    shape_result = classify_shape_with_ai(smoothed_binarized_image, shape_model) if shape_model else None
-    
-    imprint_text = get_imprint(cropped_pill_image.copy(), pill_mask)
-    
-    candidate_pills = find_best_match(pill_db, shape_result, color_candidates, imprint_text)
-    
-    return candidate_pills
+    return analyze_pills([cropped_pill_image], shape_model, pill_db, shape_batcher)[0]
 
 # --- ✨ app.py의 for 루프 로직을 담당할 새로운 메인 함수 ---
-def process_and_visualize_pills(original_image, pill_boxes, shape_model, pill_db, pil_font):
+def process_and_visualize_pills(original_image, pill_boxes, shape_model, pill_db, pil_font, shape_batcher=None):
     """
     탐지된 모든 알약을 분석하고, 결과를 원본 이미지에 시각화
+    (shape_batcher가 주어지면 모양 분류를 다른 요청과 함께 배치로 추론)
+
+    original_image에 detection_input.WorkingImage를 넘기면 크롭은 원본 해상도에서 잘라내고,
+    결과는 작업 해상도 이미지에 그립니다. (pill_boxes는 원본 좌표)
     
     Returns:
         tuple: (결과가 그려진 이미지, 후보 알약 데이터 리스트)
     """
     candidates_by_box = []
-    # 원본 이미지를 복사하여 여기에 그림
-    image_with_results = original_image.copy()
+    if isinstance(original_image, WorkingImage):
+        cropped_pills = original_image.crop_boxes(pill_boxes)
+        draw_boxes = [original_image.to_working_box(box) for box in pill_boxes]
+        image_with_results = original_image.working.copy()
+    else:
+        cropped_pills = [original_image[y1:y2, x1:x2] for x1, y1, x2, y2 in pill_boxes]
+        draw_boxes = pill_boxes
+        # 원본 이미지를 복사하여 여기에 그림
+        image_with_results = original_image.copy()
+
+    # 모든 알약을 한 번에 분석 (모양 분류는 배치로 실행)
+    candidates_list = analyze_pills(cropped_pills, shape_model, pill_db, shape_batcher)
 
-    for box in pill_boxes:
+    for box, candidate_pills in zip(draw_boxes, candidates_list):
         x1, y1, x2, y2 = box
-        cropped_pill = original_image[y1:y2, x1:x2]
-        
-        # 각 알약 분석
-        candidate_pills = analyze_single_pill(cropped_pill, shape_model, pill_db)
         
         # 분석 결과를 이미지에 그리고 응답 데이터 구성
         if candidate_pills:
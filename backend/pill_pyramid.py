@@ -0,0 +1,95 @@
+import cv2
+import numpy as np
+
+from image_preprocessing import segment_pill
+from shape_analysis import smooth_binary_mask
+from shape_geometry import PillGeometry
+
+# --- 알약 크롭별 작업 해상도 피라미드 ---
+# 알약 박스마다 한 번 만들고, 각 단계는 자신이 필요한 해상도 레벨을 사용합니다.
+#   - 'work' : 배경 분리/색상 분석 (긴 변 WORK_SIDE 이하의 고정 크기)
+#   - 'shape': 모양 분류 (긴 변 SHAPE_SIDE, 모델 입력 크기)
+#   - 'full' : 각인 OCR (원본 크롭 해상도)
+# 마스크는 'work' 레벨에서 한 번만 계산하고 다른 레벨로 전파합니다.
+# 따라서 알약당 비용은 사용자가 카메라를 얼마나 가까이 댔는지와 무관하게 일정합니다.
+
+WORK_SIDE = 128
+SHAPE_SIDE = 224
+
+# 단계별 사용 레벨
+STAGE_LEVELS = {
+    'segmentation': 'work',
+    'color': 'work',
+    'shape': 'shape',
+    'ocr': 'full',
+}
+
+
+def _resize_to_side(image, side, allow_upscale=False):
+    h, w = image.shape[:2]
+    scale = side / max(h, w)
+    if scale >= 1.0 and not allow_upscale:
+        return image
+    size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+    interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+    return cv2.resize(image, size, interpolation=interpolation)
+
+
+class PillPyramid:
+    """ 알약 크롭 하나의 레벨별 이미지와 전파된 마스크를 보관합니다. """
+
+    def __init__(self, cropped_pill_image, work_side=WORK_SIDE, shape_side=SHAPE_SIDE):
+        self.full = cropped_pill_image
+        self.work = _resize_to_side(cropped_pill_image, work_side)
+        self.shape_side = shape_side
+        self.segmentation_tier = None
+        self._masks = {}
+        self._shape_mask = None
+        self._images = {'full': self.full, 'work': self.work}
+
+    def image(self, level):
+        if level not in self._images:
+            if level != 'shape':
+                raise ValueError(f"알 수 없는 피라미드 레벨입니다: {level}")
+            self._images[level] = _resize_to_side(self.full, self.shape_side, allow_upscale=True)
+        return self._images[level]
+
+    def size(self, level):
+        if level == 'shape':
+            h, w = self.full.shape[:2]
+            scale = self.shape_side / max(h, w)
+            return max(1, int(round(h * scale))), max(1, int(round(w * scale)))
+        return self.image(level).shape[:2]
+
+    def segment(self):
+        """ 'work' 레벨에서 배경을 분리하고 사용된 단계('fast'/'grabcut' 등)를 반환합니다. """
+        if 'work' not in self._masks:
+            _, mask, self.segmentation_tier = segment_pill(self.work)
+            self._masks['work'] = mask
+        return self.segmentation_tier
+
+    def mask(self, level):
+        """ 레벨 크기에 맞는 0/1 마스크. 'work' 마스크를 선형 보간 후 다시 이진화하여 전파합니다. """
+        self.segment()
+        if level not in self._masks:
+            h, w = self.size(level)
+            upsampled = cv2.resize(self._masks['work'].astype(np.float32), (w, h), interpolation=cv2.INTER_LINEAR)
+            self._masks[level] = (upsampled >= 0.5).astype(np.uint8)
+        return self._masks[level]
+
+    def without_background(self, level):
+        """ 해당 레벨의 이미지에 마스크를 적용한 결과 (배경은 검은색) """
+        return self.image(level) * self.mask(level)[:, :, np.newaxis]
+
+    def shape_mask(self):
+        """
+        모양 분류용 스무딩 마스크(긴 변 SHAPE_SIDE)와 가장 큰 외곽선을 반환합니다.
+        마스크는 다시 계산하지 않고 'work' 레벨에서 전파된 것을 사용합니다.
+        """
+        if self._shape_mask is None:
+            self._shape_mask = smooth_binary_mask(self.mask('shape') * 255)
+        return self._shape_mask
+
+    def geometry(self):
+        """ 모양 레벨 외곽선의 기하 특징 (PillGeometry) """
+        return PillGeometry.from_contour(self.shape_mask()[1])
@@ -0,0 +1,197 @@
+"""
+알약 DB 스냅샷 (매칭 인덱스의 바이너리 캐시).
+CSV를 파싱해 만든 PillIndex의 배열과 문자열 테이블을 .npy 파일로 저장해 두고,
+다음 실행부터는 CSV 파싱 없이 메모리 매핑으로 읽습니다. (prefork 워커들은 페이지 캐시를 읽기 전용으로 공유)
+CSV의 수정 시각/크기가 바뀌면(크기가 같으면 내용 해시까지 확인) 스냅샷을 무효화합니다.
+
+backend/ 폴더에서 미리 생성:
+    python pill_snapshot.py [--db database/pill.csv] [--force]
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+
+import numpy as np
+
+PILL_DB_SNAPSHOT = os.getenv("PILL_DB_SNAPSHOT", "1") == "1"
+# 스냅샷 디렉터리 (지정하지 않으면 CSV 옆의 snapshot/<CSV 이름>/)
+PILL_DB_SNAPSHOT_DIR = os.getenv("PILL_DB_SNAPSHOT_DIR")
+
+# 저장 형식이나 PillIndex의 사전 계산 내용이 바뀌면 올려서 기존 스냅샷을 무효화
+# (2: 메타에 DB 버전 추가)
+SNAPSHOT_FORMAT_VERSION = 2
+_META_FILE = "meta.json"
+
+
+class StringTable:
+    """
+    UTF-8 바이트 묶음(blob) + 시작 위치(offsets)로 저장한 문자열 배열.
+    두 배열 모두 메모리 매핑할 수 있고, 문자열은 접근할 때만 디코딩합니다.
+    """
+
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [str(s).encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+        blob = np.frombuffer(b"".join(encoded), dtype=np.uint8) if encoded else np.zeros(0, dtype=np.uint8)
+        return cls(offsets, blob)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def tolist(self):
+        return list(self)
+
+
+def default_snapshot_dir(db_path):
+    if PILL_DB_SNAPSHOT_DIR:
+        return os.path.join(PILL_DB_SNAPSHOT_DIR, os.path.splitext(os.path.basename(db_path))[0])
+    db_dir, db_file = os.path.split(os.path.abspath(db_path))
+    return os.path.join(db_dir, "snapshot", os.path.splitext(db_file)[0])
+
+
+def _file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_fingerprint(db_path, with_hash=True):
+    stat = os.stat(db_path)
+    fingerprint = {'mtime': stat.st_mtime, 'size': stat.st_size}
+    if with_hash:
+        fingerprint['sha1'] = _file_sha1(db_path)
+    return fingerprint
+
+
+def read_source(db_path):
+    """
+    CSV 내용(bytes)과 그 내용의 지문(수정 시각, 크기, SHA-1)을 함께 반환합니다.
+    수정 시각은 읽기 전에 열린 파일에서 구하므로, 읽는 도중 파일이 바뀌면 지문이 현재 파일과 달라져
+    이 내용으로 만든 스냅샷은 다음 확인에서 무효가 됩니다.
+    """
+    with open(db_path, 'rb') as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    return data, {'mtime': stat.st_mtime, 'size': len(data), 'sha1': hashlib.sha1(data).hexdigest()}
+
+
+def _is_fresh(source, db_path):
+    """ 수정 시각과 크기가 같으면 유효. 시각만 바뀌었으면(예: touch, 재배포) 내용 해시로 확인 """
+    current = source_fingerprint(db_path, with_hash=False)
+    if current['size'] != source.get('size'):
+        return False
+    if current['mtime'] == source.get('mtime'):
+        return True
+    return _file_sha1(db_path) == source.get('sha1')
+
+
+def save_snapshot(db_path, arrays, strings, meta, snapshot_dir=None, source=None):
+    """
+    arrays(이름 → ndarray)와 strings(이름 → 문자열 리스트), meta(JSON으로 저장할 값)를 스냅샷으로 저장합니다.
+    임시 디렉터리에 모두 쓴 뒤 교체하므로, 읽는 쪽은 완성된 스냅샷만 보게 됩니다.
+    source: 인덱스를 만든 CSV 내용의 지문 (read_source). 주지 않으면 저장 시점의 파일 지문을 사용하므로,
+    파싱 이후 CSV가 바뀌었을 수 있으면 반드시 넘겨야 합니다.
+    """
+    snapshot_dir = snapshot_dir or default_snapshot_dir(db_path)
+    tmp_dir = f"{snapshot_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(array))
+    for name, values in strings.items():
+        table = StringTable.from_strings(values)
+        np.save(os.path.join(tmp_dir, f"{name}.offsets.npy"), table.offsets)
+        np.save(os.path.join(tmp_dir, f"{name}.blob.npy"), table.blob)
+
+    header = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'source': dict(source or source_fingerprint(db_path), path=os.path.abspath(db_path)),
+        'arrays': list(arrays),
+        'strings': list(strings),
+        'meta': meta,
+    }
+    with open(os.path.join(tmp_dir, _META_FILE), 'w', encoding='utf-8') as f:
+        json.dump(header, f, ensure_ascii=False, indent=2)
+
+    old_dir = f"{snapshot_dir}.old-{os.getpid()}"
+    if os.path.exists(snapshot_dir):
+        os.replace(snapshot_dir, old_dir)
+    os.replace(tmp_dir, snapshot_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return snapshot_dir
+
+
+def _load_array(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # 크기가 0인 배열은 메모리 매핑할 수 없으므로 그대로 읽음
+        return np.load(path)
+
+
+def load_snapshot(db_path, snapshot_dir=None):
+    """
+    유효한 스냅샷이 있으면 (arrays, strings, meta)를 반환합니다. 없거나 CSV가 바뀌었으면 None.
+    배열은 메모리 매핑(읽기 전용)되고, 문자열은 StringTable로 반환됩니다.
+    """
+    snapshot_dir = snapshot_dir or default_snapshot_dir(db_path)
+    if not os.path.exists(os.path.join(snapshot_dir, _META_FILE)):
+        return None
+    try:
+        with open(os.path.join(snapshot_dir, _META_FILE), encoding='utf-8') as f:
+            header = json.load(f)
+        if header.get('format_version') != SNAPSHOT_FORMAT_VERSION or not _is_fresh(header['source'], db_path):
+            return None
+
+        arrays = {name: _load_array(os.path.join(snapshot_dir, f"{name}.npy")) for name in header['arrays']}
+        strings = {
+            name: StringTable(_load_array(os.path.join(snapshot_dir, f"{name}.offsets.npy")),
+                              _load_array(os.path.join(snapshot_dir, f"{name}.blob.npy")))
+            for name in header['strings']
+        }
+        return arrays, strings, header['meta']
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"DB 스냅샷을 읽지 못했습니다 (CSV에서 다시 생성): {e}")
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="알약 DB 스냅샷 미리 생성")
+    parser.add_argument('--db', default="database/pill.csv")
+    parser.add_argument('--snapshot-dir', default=None)
+    parser.add_argument('--force', action='store_true', help="유효한 스냅샷이 있어도 다시 생성")
+    args = parser.parse_args()
+
+    from database_handler import build_database_index
+
+    snapshot_dir = args.snapshot_dir or default_snapshot_dir(args.db)
+    if not args.force and load_snapshot(args.db, snapshot_dir) is not None:
+        print(f"스냅샷이 최신 상태입니다: {snapshot_dir}")
+        return
+
+    pill_index = build_database_index(args.db)
+    arrays, strings, meta = pill_index.to_snapshot()
+    save_snapshot(args.db, arrays, strings, meta, snapshot_dir, source=pill_index.source)
+    print(f"스냅샷을 생성했습니다: {snapshot_dir} ({len(pill_index)}개)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,67 +1,160 @@
+import weakref
+
 import cv2
 import numpy as np
-from tensorflow.keras.preprocessing.image import img_to_array
 
+from batching import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
 
+SHAPE_MAP = {0: '원형', 1: '타원형', 2: '장방형'}  # 모델 학습 시 클래스 순서와 동일해야 함
+SHAPE_FAILURE_MESSAGE = "AI 모델 분석 실패 (임시)"
 
-# --- AI 모양 분류 (모든 신뢰도 출력 및 비율 유지) ---
-def classify_shape_with_ai(binarized_image, model, target_size=224):
+# Keras 모델별로 컴파일된 추론 함수 캐시 (model(x, training=False)를 tf.function으로 감쌈)
+_COMPILED_FORWARD = weakref.WeakKeyDictionary()
+
+
+def build_shape_mask(pill_without_bg, threshold=10):
     """
-    학습된 AI 모델을 사용하여 이미지 모양을 분류하고, 모든 클래스의 신뢰도를 반환
-    (가로세로 비율을 유지하고 패딩을 추가하여 왜곡 방지)
+    배경이 제거된 알약 이미지를 이진화하고, 가장 큰 외곽선을 근사(approxPolyDP)하여 채운
+    모양 분류용 마스크를 만듭니다.
+
+    Returns:
+        tuple: (스무딩된 이진 마스크, 가장 큰 외곽선 또는 None)
+    """
+    gray_pill = cv2.cvtColor(pill_without_bg, cv2.COLOR_BGR2GRAY)
+    _, binarized_image = cv2.threshold(gray_pill, threshold, 255, cv2.THRESH_BINARY)
+    return smooth_binary_mask(binarized_image)
+
+
+def smooth_binary_mask(binarized_image):
+    """
+    0/255 이진 마스크에서 가장 큰 외곽선을 근사(approxPolyDP)하여 채운 마스크를 만듭니다.
+
+    Returns:
+        tuple: (스무딩된 이진 마스크, 가장 큰 외곽선 또는 None)
+    """
+    smoothed_binarized_image = binarized_image.copy()
+    pill_contour = None
+    contours, _ = cv2.findContours(binarized_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if contours:
+        pill_contour = max(contours, key=cv2.contourArea)
+        perimeter = cv2.arcLength(pill_contour, True)
+        epsilon = 0.005 * perimeter
+        approximated_contour = cv2.approxPolyDP(pill_contour, epsilon, True)
+        smoothed_binarized_image = np.zeros_like(binarized_image)
+        cv2.drawContours(smoothed_binarized_image, [approximated_contour], -1, (255), -1)
+
+    return smoothed_binarized_image, pill_contour
+
+
+def letterbox_mask(binarized_image, target_size=224):
+    """
+    가로세로 비율을 유지하며 리사이징한 뒤 검은색 정사각형 배경 중앙에 배치하고,
+    모델 입력 형식(target_size x target_size x 3, 0~1 범위)으로 변환합니다.
+    """
+    # 1. 원본 이미지의 가로, 세로 길이 확인
+    h, w = binarized_image.shape
+
+    # 2. 가로세로 비율을 유지하며 리사이징
+    scale = target_size / max(h, w)
+    new_w, new_h = int(w * scale), int(h * scale)
+    resized_image = cv2.resize(binarized_image, (new_w, new_h))
+
+    # 3. 검은색 정사각형 배경(패드) 생성
+    pad = np.zeros((target_size, target_size), dtype=np.uint8)
+
+    # 4. 리사이징된 이미지를 배경 중앙에 배치
+    top_left_x = (target_size - new_w) // 2
+    top_left_y = (target_size - new_h) // 2
+    pad[top_left_y:top_left_y + new_h, top_left_x:top_left_x + new_w] = resized_image
+
+    # 5. 모델 입력에 맞게 3채널(RGB)로 변환 및 전처리
+    #    (TensorFlow 없이도 동작하도록 img_to_array 대신 float32 변환을 직접 수행)
+    input_image_rgb = cv2.cvtColor(pad, cv2.COLOR_GRAY2RGB)
+    input_array = input_image_rgb.astype(np.float32)
+    return input_array / 255.0
+
+
+def _get_compiled_forward(keras_model, target_size):
+    """ predict()의 호출당 준비 비용을 피하기 위해 model(x, training=False)를 한 번만 트레이싱 """
+    forward = _COMPILED_FORWARD.get(keras_model)
+    if forward is None:
+        import tensorflow as tf
+        forward = tf.function(
+            lambda x: keras_model(x, training=False),
+            input_signature=[tf.TensorSpec([None, target_size, target_size, 3], tf.float32)],
+        )
+        _COMPILED_FORWARD[keras_model] = forward
+    return forward
+
+
+def predict_shape_batch(model, batch, target_size=224):
+    """
+    (N, target_size, target_size, 3) 배열을 한 번의 순전파로 추론하여 (N, 클래스 수) 배열을 반환합니다.
+    model에는 Keras 모델, inference_backends의 모양 백엔드(ONNX/OpenVINO/TFLite)
+    또는 모델 레지스트리의 핸들을 넘길 수 있습니다.
+    """
+    batch = np.asarray(batch, dtype=np.float32)
+    backend = getattr(model, 'model', model)
+    if hasattr(backend, 'predict_batch'):
+        forward = backend.predict_batch
+    else:
+        forward = _get_compiled_forward(backend, target_size)
+
+    lock = getattr(model, 'lock', None)
+    if lock is not None:
+        with lock:
+            return np.asarray(forward(batch))
+    return np.asarray(forward(batch))
+
+
+def _to_sorted_results(predictions):
+    results_list = []
+    for i, confidence in enumerate(predictions):
+        shape_name = SHAPE_MAP.get(i, f"unknown_{i}")
+        results_list.append((shape_name, float(confidence)))  # 튜플로 저장
+
+    # 신뢰도가 높은 순으로 리스트 정렬
+    results_list.sort(key=lambda x: x[1], reverse=True)
+    return results_list
+
+
+def create_shape_batcher(model, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+    """
+    여러 요청의 224x224 입력을 모아 한 번의 순전파로 처리하는 배칭 스케줄러를 생성합니다.
+    각 호출자는 자기 입력에 해당하는 클래스별 신뢰도 배열을 돌려받습니다.
     """
+    def _predict_batch(arrays):
+        return list(predict_shape_batch(model, np.stack(arrays)))
+
+    return MicroBatcher(_predict_batch, max_batch_size, max_wait_ms, name="shape")
+
+
+# --- AI 모양 분류 (한 이미지의 모든 알약을 한 번에) ---
+def classify_shapes_batch(masks, model, target_size=224, batcher=None):
+    """
+    여러 알약의 스무딩된 이진 마스크를 하나의 텐서로 묶어 한 번의 순전파로 분류합니다.
+    알약마다 (모양, 신뢰도) 튜플 리스트를 신뢰도 내림차순으로 반환합니다.
+    batcher가 주어지면 다른 요청의 입력과 함께 배치로 추론합니다.
+    """
+    if not masks:
+        return []
     try:
+        inputs = [letterbox_mask(mask, target_size) for mask in masks]
+        if batcher is not None:
+            predictions = batcher.infer_many(inputs)
+        else:
+            predictions = predict_shape_batch(model, np.stack(inputs), target_size)
+        return [_to_sorted_results(p) for p in predictions]
 
-        # 1. 원본 이미지의 가로, 세로 길이 확인
-        h, w = binarized_image.shape
-
-        # 2. 가로세로 비율을 유지하며 리사이징
-        scale = target_size / max(h, w)
-        new_w, new_h = int(w * scale), int(h * scale)
-        resized_image = cv2.resize(binarized_image, (new_w, new_h))
-
-        # 3. 검은색 정사각형 배경(패드) 생성
-        pad = np.zeros((target_size, target_size), dtype=np.uint8)
-
-        # 4. 리사이징된 이미지를 배경 중앙에 배치
-        top_left_x = (target_size - new_w) // 2
-        top_left_y = (target_size - new_h) // 2
-        pad[top_left_y:top_left_y + new_h, top_left_x:top_left_x + new_w] = resized_image
-
-        # 5. 모델 입력에 맞게 3채널(RGB)로 변환 및 전처리
-        input_image_rgb = cv2.cvtColor(pad, cv2.COLOR_GRAY2RGB)
-        input_array = img_to_array(input_image_rgb)
-        scaled_array = input_array / 255.0
-
-        # 6. 예측 실행
-        predictions = model.predict(scaled_array[np.newaxis, ...])[0]
-
-        shape_map = {0: '원형', 1: '타원형', 2: '장방형'}  # 모델 학습 시 클래스 순서와 동일해야 함
-        """
-        # 모든 클래스에 대한 신뢰도 문자열 생성
-        results = []
-        for i, confidence in enumerate(predictions):
-            shape_name = shape_map.get(i, f"클래스 {i}")
-            results.append((shape_name, confidence))
-
-        # 신뢰도가 높은 순으로 정렬
-        results.sort(key=lambda x: x[1], reverse=True)
-
-        # 문자열로 변환하여 반환
-        return ", ".join([f"{name} ({conf:.2%})" for name, conf in results])
-        """
-        results_list = []
-        for i, confidence in enumerate(predictions):
-            shape_name = shape_map.get(i, f"unknown_{i}")
-            results_list.append((shape_name, float(confidence))) # 튜플로 저장
-            
-        # [수정] 신뢰도가 높은 순으로 리스트 정렬
-        results_list.sort(key=lambda x: x[1], reverse=True)
-
-        return results_list
-        
-    
     except Exception as e:
         print(f"    - 모양 분류 모델 로딩 또는 예측 실패: {e}")
+        return [SHAPE_FAILURE_MESSAGE for _ in masks]
+
 
-        return "AI 모델 분석 실패 (임시)"
+# --- AI 모양 분류 (모든 신뢰도 출력 및 비율 유지) ---
+def classify_shape_with_ai(binarized_image, model, target_size=224, batcher=None):
+    """
+    학습된 AI 모델을 사용하여 이미지 모양을 분류하고, 모든 클래스의 신뢰도를 반환
+    (가로세로 비율을 유지하고 패딩을 추가하여 왜곡 방지)
+    """
+    return classify_shapes_batch([binarized_image], model, target_size, batcher)[0]
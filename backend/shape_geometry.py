@@ -0,0 +1,177 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from shape_analysis import SHAPE_MAP, classify_shapes_batch
+
+# --- 외곽선 기하 특징 기반 모양 분류 (CNN 생략 경로) ---
+# 알약마다 한 번 외곽선 특징(채움 비율, 가로세로 비율, 타원 적합 오차, 원형도)을 계산하고,
+# 규칙으로 확실히 판단되는 알약은 CNN을 호출하지 않고 모양 확률을 반환합니다.
+# 나머지는 기존처럼 CNN으로 분류한 뒤 채움 비율로 타원형/장방형을 보정합니다.
+# 규칙 판정은 CNN 확률 분포 대신 고정 신뢰도를 돌려주므로 결과가 달라질 수 있어 기본값은 꺼짐입니다.
+# (켜기 전에 benchmarks/bench_shape_fast_path로 탐지 크롭에서 CNN과의 일치율을 확인)
+
+SHAPE_FAST_PATH = os.getenv("SHAPE_FAST_PATH", "0") == "1"
+FAST_PATH_CONFIDENCE = 0.95  # 규칙으로 판정한 모양의 신뢰도 (나머지 클래스는 남은 값을 균등 분배)
+
+ROUND_MAX_ASPECT = 1.10        # 원형: 가로세로 비율 상한
+ROUND_MIN_CIRCULARITY = 0.85   # 원형: 원형도 하한
+ELONGATED_MIN_ASPECT = 1.25    # 타원형/장방형: 가로세로 비율 하한
+ELLIPSE_MAX_RESIDUAL = 0.05    # 원형/타원형: 타원 적합 오차 상한
+OVAL_MAX_FILL_RATIO = 0.85     # 타원형: 채움 비율 상한 (이상적인 타원은 pi/4 = 0.785)
+OBLONG_MIN_FILL_RATIO = 0.92   # 장방형: 채움 비율 하한
+OBLONG_MIN_RESIDUAL = 0.08     # 장방형: 타원 적합 오차 하한
+
+# CNN 결과 보정 기준: 채움 비율이 이 값 미만이면 타원형, 이상이면 장방형 쪽으로 보정
+FILL_RATIO_OVAL_THRESHOLD = 0.89
+
+_FAST_PATH_STATS = {'fast_path': 0, 'model': 0}
+_STATS_LOCK = threading.Lock()
+
+
+def get_shape_fast_path_stats():
+    """ 기하 규칙으로 판정한 알약 수, 실제로 CNN에 넣은 알약 수와 적중률을 반환합니다. """
+    with _STATS_LOCK:
+        stats = dict(_FAST_PATH_STATS)
+    total = stats['fast_path'] + stats['model']
+    stats['hit_rate'] = stats['fast_path'] / total if total else 0.0
+    return stats
+
+
+class PillGeometry:
+    """
+    알약 외곽선 하나의 기하 특징. (해상도와 무관한 비율 값만 보관)
+      - fill_ratio: 외곽선 면적 / 최소 외접 회전 사각형 면적
+      - aspect_ratio: 최소 외접 회전 사각형의 긴 변 / 짧은 변 (1 이상)
+      - ellipse_residual: 1 - IoU(외곽선 내부, 적합 타원 내부)
+      - circularity: 4 * pi * 면적 / (볼록 껍질 둘레)^2
+    """
+
+    def __init__(self, fill_ratio=None, aspect_ratio=None, ellipse_residual=None, circularity=None):
+        self.fill_ratio = fill_ratio
+        self.aspect_ratio = aspect_ratio
+        self.ellipse_residual = ellipse_residual
+        self.circularity = circularity
+
+    @property
+    def is_valid(self):
+        return None not in (self.fill_ratio, self.aspect_ratio, self.ellipse_residual, self.circularity)
+
+    def as_dict(self):
+        return {
+            'fill_ratio': self.fill_ratio,
+            'aspect_ratio': self.aspect_ratio,
+            'ellipse_residual': self.ellipse_residual,
+            'circularity': self.circularity,
+        }
+
+    @classmethod
+    def from_contour(cls, contour):
+        """ 외곽선에서 특징을 계산합니다. 외곽선이 없거나 너무 작으면 값이 None인 객체를 반환 """
+        if contour is None or len(contour) < 5:
+            return cls()
+        area = cv2.contourArea(contour)
+        if area <= 0:
+            return cls()
+
+        (_, _), (rect_w, rect_h), _ = cv2.minAreaRect(contour)
+        if rect_w <= 0 or rect_h <= 0:
+            return cls()
+        fill_ratio = area / (rect_w * rect_h)
+        aspect_ratio = max(rect_w, rect_h) / min(rect_w, rect_h)
+
+        hull_perimeter = cv2.arcLength(cv2.convexHull(contour), True)
+        circularity = 4 * np.pi * area / (hull_perimeter ** 2) if hull_perimeter > 0 else 0.0
+
+        return cls(fill_ratio, aspect_ratio, _ellipse_residual(contour), circularity)
+
+
+def _ellipse_residual(contour):
+    """ 외곽선 내부와 fitEllipse로 적합한 타원 내부의 1 - IoU (외곽선 경계 상자 크기의 캔버스에서 계산) """
+    x, y, w, h = cv2.boundingRect(contour)
+    margin = max(w, h) // 4 + 2
+    canvas_size = (h + 2 * margin, w + 2 * margin)
+    shifted = contour - np.array([x - margin, y - margin], dtype=contour.dtype)
+
+    contour_mask = np.zeros(canvas_size, dtype=np.uint8)
+    cv2.drawContours(contour_mask, [shifted], -1, 1, -1)
+    ellipse_mask = np.zeros(canvas_size, dtype=np.uint8)
+    cv2.ellipse(ellipse_mask, cv2.fitEllipse(shifted), 1, -1)
+
+    union = np.count_nonzero(contour_mask | ellipse_mask)
+    if union == 0:
+        return 1.0
+    return 1.0 - np.count_nonzero(contour_mask & ellipse_mask) / union
+
+
+def _confident_result(shape_name):
+    """ 규칙으로 판정한 모양을 CNN 결과와 같은 [(모양, 신뢰도), ...] 형식으로 변환 """
+    others = [name for name in SHAPE_MAP.values() if name != shape_name]
+    rest = (1.0 - FAST_PATH_CONFIDENCE) / len(others)
+    return [(shape_name, FAST_PATH_CONFIDENCE)] + [(name, rest) for name in others]
+
+
+def classify_shape_by_geometry(geometry):
+    """ 기하 규칙으로 확실히 판단되면 [(모양, 신뢰도), ...]를, 아니면 None을 반환합니다. """
+    if geometry is None or not geometry.is_valid:
+        return None
+    g = geometry
+    if (g.aspect_ratio <= ROUND_MAX_ASPECT and g.circularity >= ROUND_MIN_CIRCULARITY
+            and g.ellipse_residual <= ELLIPSE_MAX_RESIDUAL):
+        return _confident_result('원형')
+    if g.aspect_ratio >= ELONGATED_MIN_ASPECT:
+        if g.ellipse_residual <= ELLIPSE_MAX_RESIDUAL and g.fill_ratio < OVAL_MAX_FILL_RATIO:
+            return _confident_result('타원형')
+        if g.fill_ratio >= OBLONG_MIN_FILL_RATIO and g.ellipse_residual >= OBLONG_MIN_RESIDUAL:
+            return _confident_result('장방형')
+    return None
+
+
+def correct_with_fill_ratio(shape_result, fill_ratio):
+    """
+    CNN이 타원형/장방형으로 예측한 결과를 채움 비율로 보정합니다.
+    채움 비율이 기준 미만인데 장방형이면(또는 그 반대면) 두 클래스의 신뢰도를 맞바꿉니다.
+    (반대쪽 신뢰도가 0.9를 넘으면 모델 결과를 그대로 둠)
+    """
+    if not isinstance(shape_result, list) or not shape_result:
+        return shape_result
+
+    primary_prediction = shape_result[0][0]
+    if primary_prediction not in ['타원형', '장방형'] or not fill_ratio or fill_ratio <= 0:
+        return shape_result
+
+    scores_dict = dict(shape_result)
+    if fill_ratio < FILL_RATIO_OVAL_THRESHOLD:
+        if primary_prediction != '타원형' and not (scores_dict['장방형'] > 0.9):
+            scores_dict['타원형'], scores_dict['장방형'] = scores_dict['장방형'], scores_dict['타원형']
+    else:
+        if primary_prediction != '장방형' and not (scores_dict['타원형'] > 0.9):
+            scores_dict['장방형'], scores_dict['타원형'] = scores_dict['타원형'], scores_dict['장방형']
+
+    corrected = list(scores_dict.items())
+    corrected.sort(key=lambda x: x[1], reverse=True)
+    return corrected
+
+
+def classify_shapes_with_geometry(masks, geometries, model, target_size=224, batcher=None, fast_path=None):
+    """
+    알약별 기하 특징으로 먼저 판정하고, 판정하지 못한 알약만 모아 CNN으로 한 번에 분류합니다.
+    CNN 결과는 채움 비율로 보정합니다. model이 없으면 CNN으로 넘길 알약의 결과는 None입니다.
+    """
+    fast_path = SHAPE_FAST_PATH if fast_path is None else fast_path
+    results = [classify_shape_by_geometry(g) if fast_path else None for g in geometries]
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    sent_to_model = pending if model else []
+    with _STATS_LOCK:
+        _FAST_PATH_STATS['fast_path'] += len(results) - len(pending)
+        _FAST_PATH_STATS['model'] += len(sent_to_model)
+
+    if sent_to_model:
+        model_results = classify_shapes_batch([masks[i] for i in pending], model, target_size, batcher)
+        for i, result in zip(pending, model_results):
+            fill_ratio = geometries[i].fill_ratio if geometries[i] is not None else None
+            results[i] = correct_with_fill_ratio(result, fill_ratio)
+    return results
@@ -5,12 +5,16 @@ import cv2
 import base64
 import numpy as np
 from celery import Celery
-from tensorflow.keras.models import load_model
 from PIL import ImageFont
 
 # 로컬 모듈 임포트
-from database_handler import load_database
-from object_detection import detect_pills
+from model_registry import warmup_models
+from inference_backends import resolve_model_paths
+from catalogue import CatalogueManager
+from object_detection import detect_pills_on_working_image, create_detection_batcher
+from detection_input import load_working_image_from_bytes
+from shape_analysis import create_shape_batcher
+from color_analysis import warmup_color_lut
 from pill_analyzer import process_and_visualize_pills # 이전에 만든 메인 처리 함수
 
 # --- 1. Celery 설정 ---
@@ -32,14 +36,21 @@ celery_app.conf.update(
 # --- 2. 모델, DB, 폰트 미리 로드 ---
 # Celery 워커가 시작될 때 딱 한 번만 모델을 로드하여 효율성을 높입니다.
 print("Loading models and database for Celery worker...")
-SHAPE_MODEL_PATH = "weights/shape_model.h5"
 DB_PATH = "database/pill.csv"
-YOLO_MODEL_PATH = "weights/detection_model.pt"
+# INFERENCE_BACKEND 환경 변수에 따라 모델 파일 선택 (CPU 전용 노드에서는 onnx/openvino 권장)
+YOLO_MODEL_PATH, SHAPE_MODEL_PATH = resolve_model_paths()
 FONT_PATH_BOLD = "fonts/malgunbd.ttf"
 FONT_SIZE = 18
 
-PILL_DB = load_database(DB_PATH)
-SHAPE_MODEL = load_model(SHAPE_MODEL_PATH)
+# DB는 워커 프로세스마다 CSV 변경을 감시하여 무중단 갱신 (작업마다 CATALOGUE.current를 한 번 받아 사용)
+CATALOGUE = CatalogueManager(DB_PATH)
+DETECTION_MODEL, SHAPE_MODEL = warmup_models(YOLO_MODEL_PATH, SHAPE_MODEL_PATH)
+warmup_color_lut()
+# threads/gevent 풀로 워커를 실행하면 동시 작업의 추론이 배치로 묶입니다.
+# (스케줄러 스레드는 첫 추론 시점에 시작되므로 prefork 자식 프로세스에서도 안전)
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "1") == "1"
+DETECTION_BATCHER = create_detection_batcher(DETECTION_MODEL) if INFERENCE_BATCHING and DETECTION_MODEL else None
+SHAPE_BATCHER = create_shape_batcher(SHAPE_MODEL) if INFERENCE_BATCHING and SHAPE_MODEL else None
 PIL_FONT = ImageFont.truetype(FONT_PATH_BOLD, FONT_SIZE)
 print("Models and database loaded successfully.")
 
@@ -50,16 +61,18 @@ def analyze_pill_image_task(image_string):
     """
     Base64 인코딩된 이미지 문자열을 받아 알약 분석을 수행하는 Celery Task.
     """
-    # Base64 문자열을 다시 이미지(numpy array)로 디코딩
-    npimg = np.frombuffer(base64.b64decode(image_string), np.uint8)
-    original_image = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+    # Base64 문자열을 다시 이미지로 디코딩 (탐지용 작업 해상도로 축소 디코딩)
+    working_image = load_working_image_from_bytes(base64.b64decode(image_string))
+    if working_image is None:
+        return {'error': '이미지를 읽을 수 없습니다.'}
 
-    # 알약 탐지
-    pill_boxes = detect_pills(original_image, YOLO_MODEL_PATH)
+    # 알약 탐지 (박스는 원본 해상도 좌표)
+    pill_boxes = detect_pills_on_working_image(working_image, YOLO_MODEL_PATH, model=DETECTION_MODEL, batcher=DETECTION_BATCHER)
 
     # 분석 및 시각화 (시간이 오래 걸리는 부분)
+    pill_db = CATALOGUE.current
     processed_image, candidates = process_and_visualize_pills(
-        original_image, pill_boxes, SHAPE_MODEL, PILL_DB, PIL_FONT
+        working_image, pill_boxes, SHAPE_MODEL, pill_db, PIL_FONT, shape_batcher=SHAPE_BATCHER
     )
 
     # 결과 이미지를 다시 Base64 문자열로 인코딩